@@ -8,6 +8,7 @@
     "website": "https://www.novobi.com/",
     'depends': [
         'stock',
+        'sale',
         'phd_inventory'
     ],
     "data": [
@@ -20,6 +21,7 @@
         'views/assets.xml',
         'views/demand_forecast_item_views.xml',
         'views/product_product_views.xml',
+        'views/res_config_settings_views.xml',
     ],
     "qweb": [
         'static/src/xml/*.xml',
@@ -1,6 +1,11 @@
 # Copyright © 2021 Novobi, LLC
 # See LICENSE file for full copyright and licensing details.
 
+# res.company first, its week start is read when the demand tables are built
+from . import res_company
 from . import demand_forecast_item
+from . import demand_forecast_accuracy
 from . import product_product
 from . import demand_forecast_report
+from . import sale_order
+from . import res_config_settings
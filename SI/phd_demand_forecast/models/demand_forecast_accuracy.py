@@ -0,0 +1,59 @@
+# Copyright © 2021 Novobi, LLC
+# See LICENSE file for full copyright and licensing details.
+
+from odoo import api, fields, models, _
+
+
+class DemandForecastAccuracy(models.Model):
+    _name = 'demand.forecast.accuracy'
+    _description = "Demand Forecast Accuracy"
+    _rec_name = 'product_id'
+    _order = 'wape desc, product_id'
+
+    product_id = fields.Many2one('product.product', string='Product', required=True, ondelete='cascade')
+    product_default_code = fields.Char(string='SKU', related='product_id.default_code')
+    product_uom_id = fields.Many2one(string='Unit of Measure', related='product_id.uom_id')
+    backtest_weeks = fields.Integer(string='Back-test Weeks', readonly=True)
+    actual_qty = fields.Float(string='Actual Demand', digits='Product Unit of Measure', readonly=True)
+    forecasted_qty = fields.Float(string='Forecasted Demand', digits='Product Unit of Measure', readonly=True)
+    bias = fields.Float(string='Bias', digits='Product Unit of Measure', readonly=True,
+                        help='Forecasted demand minus actual demand over the back-test weeks')
+    mae = fields.Float(string='MAE', digits='Product Unit of Measure', readonly=True,
+                       help='Mean absolute error per week')
+    rmse = fields.Float(string='RMSE', digits='Product Unit of Measure', readonly=True,
+                        help='Root mean squared error per week')
+    wape = fields.Float(string='WAPE', readonly=True,
+                        help='Sum of the absolute errors divided by the actual demand')
+    date = fields.Datetime(string='Computed On', readonly=True)
+
+    _sql_constraints = [
+        ('unique_product', 'unique (product_id)', 'The forecast accuracy of a product must be unique!')
+    ]
+
+    @api.model
+    def _store_accuracy(self, product_ids, metrics, backtest_weeks):
+        """
+        Upsert the accuracy of the products
+        :param product_ids: ids of the forecasted products
+        :param metrics: dictionary of metric arrays in the order of `product_ids`
+        :param backtest_weeks: number of weeks the metrics were measured on
+        """
+        params = {key: values.tolist() for key, values in metrics.items()}
+        params.update(product_ids=product_ids, backtest_weeks=backtest_weeks, uid=self.env.uid)
+        self.flush()
+        self.env.cr.execute("""
+            INSERT INTO demand_forecast_accuracy (product_id, backtest_weeks, actual_qty, forecasted_qty, bias, mae,
+                                                  rmse, wape, date, create_uid, create_date, write_uid, write_date)
+            SELECT acc.product_id, %(backtest_weeks)s, acc.actual_qty, acc.forecasted_qty, acc.bias, acc.mae,
+                acc.rmse, acc.wape, now() at time zone 'UTC',
+                %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+            FROM unnest(%(product_ids)s::int[], %(actual_qty)s::float[], %(forecasted_qty)s::float[],
+                        %(bias)s::float[], %(mae)s::float[], %(rmse)s::float[], %(wape)s::float[])
+                acc(product_id, actual_qty, forecasted_qty, bias, mae, rmse, wape)
+            ON CONFLICT (product_id) DO UPDATE SET
+                backtest_weeks = EXCLUDED.backtest_weeks, actual_qty = EXCLUDED.actual_qty,
+                forecasted_qty = EXCLUDED.forecasted_qty, bias = EXCLUDED.bias, mae = EXCLUDED.mae,
+                rmse = EXCLUDED.rmse, wape = EXCLUDED.wape, date = EXCLUDED.date,
+                write_uid = EXCLUDED.write_uid, write_date = EXCLUDED.write_date;
+        """, params)
+        self.invalidate_cache()
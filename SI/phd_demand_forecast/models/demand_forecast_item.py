@@ -1,8 +1,18 @@
 # Copyright © 2021 Novobi, LLC
 # See LICENSE file for full copyright and licensing details.
 
+import numpy as np
+from dateutil.relativedelta import relativedelta
+
 from odoo import api, fields, models, _
 from odoo.exceptions import ValidationError
+from ..utils.forecast_engine import FORECAST_METHODS, MOVING_AVERAGE, EXPONENTIAL_SMOOTHING, SEASONAL_NAIVE, \
+    fit_forecast_parallel, accuracy_by_group
+
+HISTORY_WEEKS = 104
+FORECAST_HORIZON = 12
+BACKTEST_WEEKS = 4
+DEFAULT_FORECAST_WORKERS = 4
 
 
 class DemandForecastItem(models.Model):
@@ -16,6 +26,11 @@ class DemandForecastItem(models.Model):
     partner_id = fields.Many2one('res.partner', string='Customer', required=True)
     week_end_date = fields.Date(string='End Date of Week', required=True)
     demand_qty = fields.Float(string='Forecasted Demand', default=0, digits='Product Unit of Measure', required=True)
+    forecast_method = fields.Selection([
+        (MOVING_AVERAGE, 'Moving Average'),
+        (EXPONENTIAL_SMOOTHING, 'Exponential Smoothing'),
+        (SEASONAL_NAIVE, 'Seasonal Naive'),
+    ], string='Forecast Method', readonly=True, help='Empty when the forecasted demand is imported')
     
     _sql_constraints = [
         ('unique_demand', 'unique (product_id, week_end_date, partner_id)',
@@ -25,6 +40,97 @@ class DemandForecastItem(models.Model):
     @api.constrains('week_end_date')
     def _check_end_date_of_week(self):
         for item in self:
-            week_end_day = (int(self.env['res.lang']._lang_get(self.env.user.lang).week_start) - 2) % 7
+            week_end_day = (int(self.env.company.demand_week_start) - 2) % 7
             if item.week_end_date.weekday() != week_end_day:
                 raise ValidationError(_("The end date of week is invalid."))
+
+    @api.model
+    def _get_demand_history(self, end_date):
+        """
+        Load the weekly demand of the products which can be forecasted as a matrix
+        :param end_date: end date of the last week of the history
+        :return: (product id, partner id) of every series, demand of every series (series x weeks)
+        :rtype: tuple
+        """
+        self.env['product.product'].flush(['forecasted_demand_ok', 'active'])
+        start_date = end_date - relativedelta(weeks=HISTORY_WEEKS - 1)
+        self.env.cr.execute("""
+            SELECT asd.product_id, asd.partner_id, (asd.week_end_date - %(start_date)s) / 7 as week_index,
+                SUM(asd.sale_qty) as sale_qty
+            FROM actual_sales_demand asd
+            JOIN product_product pp ON asd.product_id = pp.id
+            WHERE pp.forecasted_demand_ok AND pp.active AND asd.partner_id IS NOT NULL
+                AND asd.week_end_date >= %(start_date)s AND asd.week_end_date <= %(end_date)s
+            GROUP BY asd.product_id, asd.partner_id, asd.week_end_date
+        """, {'start_date': start_date, 'end_date': end_date})
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return np.zeros((0, 2), dtype=int), np.zeros((0, HISTORY_WEEKS))
+        product_ids, partner_ids, week_indexes, quantities = (np.array(values) for values in zip(*rows))
+        keys, series_indexes = np.unique(np.column_stack([product_ids, partner_ids]), axis=0, return_inverse=True)
+        history = np.zeros((len(keys), HISTORY_WEEKS))
+        np.add.at(history, (series_indexes.ravel(), week_indexes.astype(int)), quantities.astype(float))
+        return keys, history
+
+    @api.model
+    def _write_generated_items(self, keys, forecast, best_methods, last_week_end_date):
+        """
+        Replace the generated forecasted demand of the next weeks, the imported demand is kept
+        """
+        horizon = forecast.shape[1]
+        week_end_dates = [last_week_end_date + relativedelta(weeks=week) for week in range(1, horizon + 1)]
+        series_indexes = np.repeat(np.arange(len(keys)), horizon)
+        params = {
+            'product_ids': keys[series_indexes, 0].tolist(),
+            'partner_ids': keys[series_indexes, 1].tolist(),
+            'week_end_dates': week_end_dates * len(keys),
+            'quantities': forecast.ravel().tolist(),
+            'methods': np.array(FORECAST_METHODS)[best_methods][series_indexes].tolist(),
+            'last_week_end_date': last_week_end_date,
+            'uid': self.env.uid,
+        }
+        self.flush()
+        self.env.cr.execute("""
+            DELETE FROM demand_forecast_item
+            WHERE forecast_method IS NOT NULL AND week_end_date > %(last_week_end_date)s
+                AND product_id = ANY(%(product_ids)s);
+
+            INSERT INTO demand_forecast_item (product_id, partner_id, week_end_date, demand_qty, forecast_method,
+                                              create_uid, create_date, write_uid, write_date)
+            SELECT item.product_id, item.partner_id, item.week_end_date, item.demand_qty, item.forecast_method,
+                %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+            FROM (
+                SELECT item.product_id, item.partner_id, item.week_end_date, item.forecast_method,
+                    ROUND(item.demand_qty::numeric, -log(puom.rounding)::int) as demand_qty
+                FROM unnest(%(product_ids)s::int[], %(partner_ids)s::int[], %(week_end_dates)s::date[],
+                            %(quantities)s::float[], %(methods)s::varchar[])
+                    item(product_id, partner_id, week_end_date, demand_qty, forecast_method)
+                JOIN product_product pp ON item.product_id = pp.id
+                JOIN product_template pt ON pp.product_tmpl_id = pt.id
+                JOIN uom_uom puom ON pt.uom_id = puom.id
+            ) item
+            WHERE item.demand_qty > 0
+            ON CONFLICT (product_id, week_end_date, partner_id) DO NOTHING;
+        """, params)
+        self.invalidate_cache()
+
+    @api.model
+    def _cron_generate_forecast(self):
+        """
+        Forecast the demand of the next weeks of every product and customer from the actual demand, with the
+        statistical method which fitted the last weeks best
+        """
+        last_week_end_date = self.env['demand.forecast.report'].get_period_dates('actual')[1]
+        keys, history = self._get_demand_history(last_week_end_date)
+        if not len(keys):
+            return
+        max_workers = int(self.env['ir.config_parameter'].sudo().get_param(
+            'phd_demand_forecast.forecast_workers', DEFAULT_FORECAST_WORKERS))
+        forecast, best_methods, backtest = fit_forecast_parallel(history, FORECAST_HORIZON, BACKTEST_WEEKS,
+                                                                 max_workers)
+        self._write_generated_items(keys, forecast, best_methods, last_week_end_date)
+
+        product_ids, product_indexes = np.unique(keys[:, 0], return_inverse=True)
+        metrics = accuracy_by_group(history[:, -BACKTEST_WEEKS:], backtest, product_indexes.ravel(),
+                                    len(product_ids))
+        self.env['demand.forecast.accuracy']._store_accuracy(product_ids.tolist(), metrics, BACKTEST_WEEKS)
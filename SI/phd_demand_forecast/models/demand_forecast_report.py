@@ -5,8 +5,10 @@ from odoo import api, fields, models, _
 from dateutil.relativedelta import relativedelta
 from odoo.exceptions import UserError
 import pytz
+import numpy as np
 from datetime import datetime, date
 from odoo.tools import DEFAULT_SERVER_DATETIME_FORMAT, float_round
+from odoo.tools.sql import index_exists
 from math import log10
 from ..utils.data_util import format_report_data, format_header_data, format_body_data, \
     format_quantity_description_data, format_table_data, format_header_cell, format_content_cell, format_datetime, \
@@ -19,14 +21,6 @@ class DemandForecastReport(models.AbstractModel):
     _name = 'demand.forecast.report'
     _description = "Forecasted Demand Report"
 
-    open_mos_data = {}
-    open_sos_data = {}
-    forecasted_demand = {}
-    product_id = False
-    factor = 0
-    float_format = (lambda number: f'{number:,.2f}')
-    labels = []
-
     def init(self):
         create_actual_demand_stmt = """
            CREATE TABLE IF NOT EXISTS actual_sales_demand (
@@ -51,6 +45,18 @@ class DemandForecastReport(models.AbstractModel):
         create_table_stmt =  create_actual_demand_stmt + create_daily_demand_stmt
         self.env.cr.execute(create_table_stmt)
 
+        # The weekly demand is kept in the UoM of the product, one row per product, partner and week, so that
+        # the confirmed and cancelled orders can be added to it with an upsert
+        if not index_exists(self.env.cr, 'actual_sales_demand_key_index'):
+            self.env.cr.execute("""
+                TRUNCATE actual_sales_demand, actual_daily_sales_demand;
+                CREATE UNIQUE INDEX actual_sales_demand_key_index
+                    ON actual_sales_demand (product_id, partner_id, week_end_date);
+                CREATE UNIQUE INDEX IF NOT EXISTS actual_daily_sales_demand_key_index
+                    ON actual_daily_sales_demand (date_order, product_id, partner_id, sale_uom_id);
+            """)
+            self._rebuild_sales_demand()
+
     @api.model
     def get_last_updated_time(self):
         last_updated = self.env['ir.config_parameter'].sudo().get_param('phd_demand_forecast.last_updated')
@@ -61,87 +67,125 @@ class DemandForecastReport(models.AbstractModel):
             return ''
 
     @api.model
-    def compute_sales_demand_data(self):
-        params = self.env['ir.config_parameter'].sudo()
-        has_intialize_data = params.get_param('phd_demand_forecast.has_initialized_data') == 'True'
+    def _get_week_start_offset(self):
+        """
+        The weeks start on the day set on the company, not on the language of the user, so that every user
+        sees and updates the same weeks
+        """
+        return 8 - int(self.env.company.demand_week_start)
+
+    @api.model
+    def _update_sales_demand(self, order_ids=None, line_ids=None, sign=1):
+        """
+        Add the quantities of the confirmed sale order lines to the daily and weekly demand
+        :param order_ids: only add the lines of these orders
+        :param line_ids: only add these lines
+        :param sign: 1 to add the quantities, -1 to remove them
+        """
+        self.env['sale.order'].flush(['state', 'date_order', 'partner_id', 'company_id'])
+        self.env['res.company'].flush(['demand_week_start'])
+        self.env['sale.order.line'].flush(['order_id', 'product_id', 'product_uom_qty', 'product_uom'])
         where_stmt = ""
-        where_order_stmt = ""
-        week_start_offset = 8 - int(self.env['res.lang']._lang_get(self.env.user.lang).week_start)
-        daily_where_stmt = ""
-        daily_order_stmt = ""
-        if has_intialize_data:
-            start_date, end_date = self.get_period_dates(demand_type='recompute')
-            where_stmt = "WHERE week_end_date >= '{}' AND week_end_date <= '{}'".format(start_date, end_date)
-            daily_where_stmt = "WHERE date_order >= (CURRENT_DATE - interval '30 days')::date AND date_order <= CURRENT_DATE"
-            where_order_stmt = "AND date_order::date >= '{}' AND date_order::date <= '{}'".format(start_date, end_date)
-            daily_order_stmt = "AND date_order::date >= (CURRENT_DATE - interval '30 days')::date AND date_order::date <= CURRENT_DATE"
-        query_actual_demand_stmt = """
-            DELETE FROM actual_sales_demand {where_stmt};
-            INSERT INTO actual_sales_demand (week_end_date, product_id, partner_id, sale_qty, sale_uom_id)
-            SELECT (date_trunc('week', date_order + {interval})::date - {interval} + interval '6 days')::date as week_end_date,
-                product_id, partner_id, SUM(sale_qty) as sale_qty, sale_uom_id
-            FROM actual_daily_sales_demand demand
-            GROUP BY date_trunc('week', date_order + {interval})::date - {interval}, product_id, partner_id, sale_uom_id
-            ORDER BY week_end_date desc;
-        """.format(where_stmt=where_stmt, interval=week_start_offset, where_order_stmt=where_order_stmt)
-
-        query_daily_demand_stmt = """
-            DELETE FROM actual_daily_sales_demand {where_stmt};
-            INSERT INTO actual_daily_sales_demand (date_order, product_id, partner_id, sale_qty, sale_uom_id)
+        if order_ids is not None:
+            where_stmt += " AND so.id IN %(order_ids)s"
+        if line_ids is not None:
+            where_stmt += " AND sol.id IN %(line_ids)s"
+        params = {
+            'order_ids': tuple(order_ids or [0]),
+            'line_ids': tuple(line_ids or [0]),
+            'sign': sign,
+        }
+        query_stmt = """
+            INSERT INTO actual_daily_sales_demand AS demand (date_order, product_id, partner_id, sale_qty, sale_uom_id)
             SELECT so.date_order::date as date_order,
-                sol.product_id, so.partner_id, SUM(sol.product_uom_qty) as sale_qty, suom.id as sale_uom_id
+                sol.product_id, so.partner_id, %(sign)s * SUM(sol.product_uom_qty) as sale_qty, sol.product_uom
+            FROM sale_order_line sol
+            JOIN sale_order so ON sol.order_id = so.id
+            WHERE so.state IN ('sale', 'done') AND sol.product_id IS NOT NULL {where_stmt}
+            GROUP BY so.date_order::date, sol.product_id, so.partner_id, sol.product_uom
+            ON CONFLICT (date_order, product_id, partner_id, sale_uom_id)
+            DO UPDATE SET sale_qty = demand.sale_qty + EXCLUDED.sale_qty;
+
+            INSERT INTO actual_sales_demand AS demand (week_end_date, product_id, partner_id, sale_qty, sale_uom_id)
+            SELECT date_trunc('week', so.date_order::date + (8 - company.demand_week_start::int))::date
+                    - (8 - company.demand_week_start::int) + 6 as week_end_date,
+                sol.product_id, so.partner_id,
+                %(sign)s * SUM(CASE WHEN suom.factor = 0 OR suom.factor IS NULL
+                               THEN sol.product_uom_qty
+                               ELSE (sol.product_uom_qty * COALESCE(puom.factor, 1) / suom.factor) END) as sale_qty,
+                puom.id as sale_uom_id
             FROM sale_order_line sol
-            JOIN (
-                SELECT id, date_order, partner_id
-                FROM sale_order
-                WHERE state IN ('sale', 'done') {where_order_stmt}
-            ) so ON sol.order_id = so.id
+            JOIN sale_order so ON sol.order_id = so.id
+            JOIN res_company company ON so.company_id = company.id
+            JOIN product_product pp ON sol.product_id = pp.id
+            JOIN product_template pt ON pp.product_tmpl_id = pt.id
+            JOIN uom_uom puom ON pt.uom_id = puom.id
             JOIN uom_uom suom ON sol.product_uom = suom.id
-            GROUP BY so.date_order::date, sol.product_id, so.partner_id, suom.id
-            ORDER BY date_order desc;
-        """.format(where_stmt=daily_where_stmt, where_order_stmt=daily_order_stmt)
+            WHERE so.state IN ('sale', 'done') AND puom.category_id = suom.category_id {where_stmt}
+            GROUP BY 1, sol.product_id, so.partner_id, puom.id
+            ON CONFLICT (product_id, partner_id, week_end_date)
+            DO UPDATE SET sale_qty = demand.sale_qty + EXCLUDED.sale_qty;
+        """.format(where_stmt=where_stmt)
+        self.env.cr.execute(query_stmt, params)
+
+    @api.model
+    def _rebuild_sales_demand(self):
+        self.env.cr.execute("TRUNCATE actual_sales_demand, actual_daily_sales_demand")
+        self._update_sales_demand()
 
-        query_stmt = query_daily_demand_stmt + query_actual_demand_stmt
-        self.env.cr.execute(query_stmt)
-        # Update parameter
+    @api.model
+    def compute_sales_demand_data(self):
+        """
+        The demand is kept up to date by the sale orders, it is only built here the first time
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        has_intialize_data = params.get_param('phd_demand_forecast.has_initialized_data') == 'True'
         if not has_intialize_data:
+            self._rebuild_sales_demand()
             params.set_param('phd_demand_forecast.has_initialized_data', 'True')
         params.set_param('phd_demand_forecast.last_updated',
                          datetime.now(pytz.utc).strftime(DEFAULT_SERVER_DATETIME_FORMAT))
 
     @api.model
-    def get_sales_demand_query_stmt(self, product_id, demand_type='actual'):
-        if not product_id:
+    def get_sales_demand_by_products(self, product_ids, demand_type='actual'):
+        """
+        Get sales demand of products in the past, in one query
+        :param product_ids: ids of products which will be forecasted
+        :param demand_type: `actual` or `historical`
+        :return: a dictionary contains the sales demand data of each product
+        """
+        if not product_ids:
             raise UserError(_("Product ID is invalid."))
         start_date, end_date = self.get_period_dates(demand_type)
         query_stmt = """
-            SELECT ts.week_end_date, COALESCE(demand_qty, 0) as demand_qty
-            FROM (
+            SELECT p.product_id, ts.week_end_date,
+                COALESCE(ROUND(actual_demand.demand_qty::numeric, -log(puom.rounding)::int), 0) as demand_qty
+            FROM unnest(%(product_ids)s) p(product_id)
+            CROSS JOIN (
                 SELECT ts::date as week_end_date
-                FROM generate_series('{start_date}', '{end_date}', '7 day'::interval) ts) ts
+                FROM generate_series(%(start_date)s::timestamp, %(end_date)s::timestamp, '7 day'::interval) ts) ts
+            JOIN product_product pp ON p.product_id = pp.id
+            JOIN product_template pt ON pp.product_tmpl_id = pt.id
+            JOIN uom_uom puom ON pt.uom_id = puom.id
             LEFT JOIN (
-                SELECT week_end_date, ROUND(COALESCE(SUM(demand_qty), 0)::numeric, rounding::int) as demand_qty
-                FROM
-                    (SELECT week_end_date,
-                         (CASE WHEN suom.factor = 0 OR suom.factor IS NULL
-                            THEN demand.sale_qty
-                            ELSE (demand.sale_qty * COALESCE(puom.factor, 1) / suom.factor) END) as demand_qty,
-                        -log(puom.rounding) as rounding
-                    FROM (
-                        SELECT *
-                        FROM actual_sales_demand
-                        WHERE product_id = {product_id}
-                            AND week_end_date >= '{start_date}' AND week_end_date <= '{end_date}') demand
-                        JOIN product_product pp ON demand.product_id = pp.id
-                        JOIN product_template pt ON pp.product_tmpl_id = pt.id
-                        JOIN uom_uom puom ON pt.uom_id = puom.id
-                        JOIN uom_uom suom ON demand.sale_uom_id = suom.id
-                    WHERE puom.category_id = suom.category_id) t
-                GROUP BY week_end_date, rounding
+                SELECT product_id, week_end_date, SUM(sale_qty) as demand_qty
+                FROM actual_sales_demand
+                WHERE product_id = ANY(%(product_ids)s)
+                    AND week_end_date >= %(start_date)s AND week_end_date <= %(end_date)s
+                GROUP BY product_id, week_end_date
             ) actual_demand ON ts.week_end_date = actual_demand.week_end_date
-            ORDER BY week_end_date ASC;
-        """.format(start_date=start_date, end_date=end_date, product_id=product_id)
-        return query_stmt
+                AND p.product_id = actual_demand.product_id
+            ORDER BY p.product_id, ts.week_end_date ASC;
+        """
+        self.env.cr.execute(query_stmt, {'product_ids': list(product_ids), 'start_date': start_date,
+                                         'end_date': end_date})
+        week_numbers = [i for i in range(-4, 13) if i != 0]
+        result = {product_id: [] for product_id in product_ids}
+        for period in self.env.cr.dictfetchall():
+            product_demand = result[period.pop('product_id')]
+            period['week'] = week_numbers[len(product_demand)]
+            product_demand.append(period)
+        return result
 
     @api.model
     def get_sales_demand(self, product_id, demand_type='actual'):
@@ -151,37 +195,50 @@ class DemandForecastReport(models.AbstractModel):
         :param demand_type: `actual` or `historical`
         :return: a dictionary contains the data for sales demand
         """
-        query_stmt = self.get_sales_demand_query_stmt(product_id, demand_type)
-        self.env.cr.execute(query_stmt)
-        result = self.env.cr.dictfetchall()
-        week_numbers = [i for i in range(-4, 13) if i != 0]
-        week_index = 0
-        for period in result:
-            period['week'] = week_numbers[week_index]
-            week_index += 1
-        return result
-
-    @api.model
-    def get_forecasted_demand_query_stmt(self, product_id):
         if not product_id:
             raise UserError(_("Product ID is invalid."))
-        start_date, end_date = self.get_period_dates(demand_type='forecast')
-        # Query data
+        return self.get_sales_demand_by_products([product_id], demand_type)[product_id]
+
+    @api.model
+    def get_forecasted_demand_query_stmt(self):
         query_stmt = """
-            SELECT ts.week_end_date, COALESCE(demand_qty, 0) as forecasted_demand_qty
-            FROM (
+            SELECT p.product_id, ts.week_end_date, COALESCE(demand_qty, 0) as forecasted_demand_qty
+            FROM unnest(%(product_ids)s) p(product_id)
+            CROSS JOIN (
                 SELECT ts::date as week_end_date
-                FROM generate_series('{start_date}', '{end_date}', '7 day'::interval) ts) ts
+                FROM generate_series(%(start_date)s::timestamp, %(end_date)s::timestamp, '7 day'::interval) ts) ts
             LEFT JOIN (
-                SELECT week_end_date, sum(demand_qty) as demand_qty
+                SELECT product_id, week_end_date, sum(demand_qty) as demand_qty
                 FROM demand_forecast_item
-                WHERE product_id = {product_id} AND week_end_date >= '{start_date}' AND week_end_date <= '{end_date}'
-                GROUP BY week_end_date
-            ) demand ON ts.week_end_date = demand.week_end_date
-            ORDER BY week_end_date asc;
-        """.format(product_id=product_id, start_date=start_date, end_date=end_date)
+                WHERE product_id = ANY(%(product_ids)s)
+                    AND week_end_date >= %(start_date)s AND week_end_date <= %(end_date)s
+                GROUP BY product_id, week_end_date
+            ) demand ON ts.week_end_date = demand.week_end_date AND p.product_id = demand.product_id
+            ORDER BY p.product_id, ts.week_end_date asc;
+        """
         return query_stmt
 
+    @api.model
+    def get_forecasted_demand_by_products(self, product_ids):
+        """
+        Get imported forecasted demand data of products, in one query
+        :param product_ids: ids of products which will be forecasted
+        :return: Dictionary contains forecasted demand data of each product for 16 week from week #-4 to week #12
+        """
+        if not product_ids:
+            raise UserError(_("Product ID is invalid."))
+        self.env['demand.forecast.item'].flush(['product_id', 'week_end_date', 'demand_qty'])
+        start_date, end_date = self.get_period_dates(demand_type='forecast')
+        self.env.cr.execute(self.get_forecasted_demand_query_stmt(), {
+            'product_ids': list(product_ids), 'start_date': start_date, 'end_date': end_date})
+        week_numbers = [i for i in range(-4, 13) if i != 0]
+        result = {product_id: [] for product_id in product_ids}
+        for period in self.env.cr.dictfetchall():
+            product_demand = result[period.pop('product_id')]
+            period['week'] = week_numbers[len(product_demand)]
+            product_demand.append(period)
+        return result
+
     @api.model
     def get_forecasted_demand(self, product_id):
         """
@@ -189,20 +246,66 @@ class DemandForecastReport(models.AbstractModel):
         :param product_id: id of product which will be forecasted
         :return: Dictionary contains forecasted demand data for 16 week from week #-4 to week #12
         """
-        query_stmt = self.get_forecasted_demand_query_stmt(product_id)
-        self.env.cr.execute(query_stmt)
-        result = self.env.cr.dictfetchall()
-        week_numbers = [i for i in range(-4, 13) if i != 0]
-        week_index = 0
-        for period in result:
-            period['week'] = week_numbers[week_index]
-            week_index += 1
-        return result
+        if not product_id:
+            raise UserError(_("Product ID is invalid."))
+        return self.get_forecasted_demand_by_products([product_id])[product_id]
+
+    @api.model
+    def get_demand_series_by_products(self, product_ids):
+        """
+        Get the actual, historical and forecasted demand of products, the number of queries does not depend on
+        the number of products
+        :param product_ids: ids of products which will be forecasted
+        :return: {product_id: {'actual': [...], 'historical': [...], 'forecast': [...]}}
+        """
+        product_ids = list(product_ids)
+        actual_demand = self.get_sales_demand_by_products(product_ids, 'actual')
+        historical_demand = self.get_sales_demand_by_products(product_ids, 'historical')
+        forecasted_demand = self.get_forecasted_demand_by_products(product_ids)
+        return {product_id: {
+            'actual': actual_demand[product_id],
+            'historical': historical_demand[product_id],
+            'forecast': forecasted_demand[product_id],
+        } for product_id in product_ids}
+
+    @api.model
+    def compare_forecast_with_actual(self, product_ids, demand_series=None):
+        """
+        Compare the forecasted demand with the actual demand of the last 4 weeks for all products at once
+        :param product_ids: ids of products which will be compared
+        :param demand_series: result of `get_demand_series_by_products`, fetched if not given
+        :return: {product_id: {'actual_qty', 'forecasted_qty', 'bias', 'mae', 'rmse', 'wape'}}
+        """
+        product_ids = list(product_ids)
+        if not product_ids:
+            return {}
+        if demand_series is None:
+            demand_series = self.get_demand_series_by_products(product_ids)
+        actual = np.array([[period['demand_qty'] for period in demand_series[product_id]['actual']]
+                           for product_id in product_ids], dtype=float)
+        # The forecast starts on the same week as the actual demand, only the past weeks can be compared
+        forecast = np.array([[period['forecasted_demand_qty'] for period in demand_series[product_id]['forecast']]
+                             for product_id in product_ids], dtype=float)[:, :actual.shape[1]]
+        error = forecast - actual
+        abs_error = np.abs(error)
+        actual_qty = actual.sum(axis=1)
+        absolute_error_qty = abs_error.sum(axis=1)
+        wape = np.divide(absolute_error_qty, actual_qty, out=np.zeros_like(actual_qty), where=actual_qty != 0)
+        metrics = {
+            'actual_qty': actual_qty,
+            'forecasted_qty': forecast.sum(axis=1),
+            'bias': error.sum(axis=1),
+            'mae': abs_error.mean(axis=1),
+            'rmse': np.sqrt((error ** 2).mean(axis=1)),
+            'wape': wape,
+        }
+        return {product_id: {key: float(values[index]) for key, values in metrics.items()}
+                for index, product_id in enumerate(product_ids)}
 
     @api.model
     def get_period_dates(self, demand_type='actual'):
         today = datetime.now(pytz.utc).date()
-        week_start_offset = 8 - int(self.env['res.lang']._lang_get(self.env.user.lang).week_start)
+        week_start_offset = self._get_week_start_offset()
         base_date = today + relativedelta(days=week_start_offset)
         # The end date of last week
         last_week_end_date = base_date - relativedelta(days=base_date.weekday() + week_start_offset + 1)
@@ -229,7 +332,7 @@ class DemandForecastReport(models.AbstractModel):
         return start_date, end_date
 
     @api.model
-    def get_open_mo_query_stmt(self, product_id):
+    def get_open_mo_query_stmt(self):
         query_stmt = """
             SELECT mo.id, product_id, mo.name, mo.date_planned_finished,
                 ROUND((CASE WHEN muom.factor = 0 OR muom.factor IS NULL
@@ -238,26 +341,33 @@ class DemandForecastReport(models.AbstractModel):
             FROM (
                 SELECT id, name, product_id, product_qty, product_uom_id, date_planned_finished
                 FROM mrp_production
-                WHERE product_id={} AND state not in ('done', 'cancel')
+                WHERE product_id = ANY(%(product_ids)s) AND state not in ('done', 'cancel')
             ) mo JOIN product_product pp ON mo.product_id = pp.id
             JOIN product_template pt ON pp.product_tmpl_id = pt.id
             JOIN uom_uom puom ON pt.uom_id = puom.id
             JOIN uom_uom muom ON mo.product_uom_id = muom.id
             ORDER BY mo.date_planned_finished asc
-        """.format(product_id)
+        """
         return query_stmt
 
+    @api.model
+    def get_open_manufacturing_orders_by_products(self, product_ids):
+        result = {product_id: [] for product_id in product_ids}
+        if not product_ids:
+            return result
+        self.env.cr.execute(self.get_open_mo_query_stmt(), {'product_ids': list(product_ids)})
+        for row in self.env.cr.dictfetchall():
+            result[row['product_id']].append(row)
+        return result
+
     @api.model
     def get_open_manufacturing_orders(self, product_id):
         if not product_id:
             return {}
-        query_stmt = self.get_open_mo_query_stmt(product_id)
-        self.env.cr.execute(query_stmt)
-        result = self.env.cr.dictfetchall()
-        return result
+        return self.get_open_manufacturing_orders_by_products([product_id])[product_id]
 
     @api.model
-    def get_open_so_query_stmt(self, product_id):
+    def get_open_so_query_stmt(self):
         query_stmt = """
             SELECT so.id, so.name, osol.product_id, so.partner_id, rp.name as partner_name, so.commitment_date, osol.quantity
             FROM (
@@ -272,7 +382,7 @@ class DemandForecastReport(models.AbstractModel):
                         FROM stock_move
                         WHERE sale_line_id IS NOT NULL
                             AND state not in ('cancel', 'done')
-                            AND product_id = {product_id}) sm
+                            AND product_id = ANY(%(product_ids)s)) sm
                     JOIN (
                         SELECT id
                         FROM stock_picking_type
@@ -283,7 +393,7 @@ class DemandForecastReport(models.AbstractModel):
                         SELECT id, order_id, product_id
                         FROM sale_order_line
                         WHERE state NOT IN ('draft', 'sent', 'cancel')
-                            AND product_id = {product_id}
+                            AND product_id = ANY(%(product_ids)s)
                     ) sol ON move.sale_line_id = sol.id
                     JOIN product_product pp ON sol.product_id = pp.id
                     JOIN product_template pt ON pp.product_tmpl_id = pt.id
@@ -294,69 +404,50 @@ class DemandForecastReport(models.AbstractModel):
             JOIN sale_order so ON osol.order_id = so.id
             JOIN res_partner rp ON rp.id = so.partner_id
             ORDER BY so.commitment_date asc
-        """.format(product_id=product_id)
+        """
         return query_stmt
 
+    @api.model
+    def get_open_sale_orders_by_products(self, product_ids):
+        result = {product_id: [] for product_id in product_ids}
+        if not product_ids:
+            return result
+        self.env.cr.execute(self.get_open_so_query_stmt(), {'product_ids': list(product_ids)})
+        for row in self.env.cr.dictfetchall():
+            result[row['product_id']].append(row)
+        return result
+
     @api.model
     def get_open_sale_orders(self, product_id):
         if not product_id:
             return {}
-        query_stmt = self.get_open_so_query_stmt(product_id)
-        self.env.cr.execute(query_stmt)
-        result = self.env.cr.dictfetchall()
-        return result
-
-    def __get_quantity_on_hand(self):
-        return self.float_format(self.product_id.qty_available)
-
-    def __get_quantity_available(self):
-        return self.float_format(self.product_id.free_qty)
-
-    def __get_quantity_in_open_mos(self):
-        open_mos_data = self.open_mos_data or {}
-        if not len(open_mos_data):
-            open_mos_data = self.get_open_manufacturing_orders(self.product_id.id)
-        open_mos = [row.get('quantity', 0) for row in open_mos_data]
-        return self.float_format(sum(open_mos))
+        return self.get_open_sale_orders_by_products([product_id])[product_id]
 
-    def __get_quantity_in_open_sos(self):
-        open_sos_data = self.open_sos_data or {}
-        if not len(open_sos_data):
-            open_sos_data = self.get_open_manufacturing_orders(self.product_id.id)
-        open_sos = [row.get('quantity', 0) for row in open_sos_data]
-        return self.float_format(sum(open_sos))
-
-    def get_quantity_description(self):
+    def get_quantity_description(self, report):
+        product = report['product']
+        float_format = report['float_format']
         res_lst = list()
-        if self.product_id.type == 'product':
-            res_lst.append(format_quantity_description_data("On Hand", self.__get_quantity_on_hand()))
-            res_lst.append(format_quantity_description_data("Available", self.__get_quantity_available()))
-        res_lst.append(format_quantity_description_data("Under Production", self.__get_quantity_in_open_mos()))
-        res_lst.append(format_quantity_description_data("In Sales", self.__get_quantity_in_open_sos()))
+        if product.type == 'product':
+            res_lst.append(format_quantity_description_data("On Hand", float_format(product.qty_available)))
+            res_lst.append(format_quantity_description_data("Available", float_format(product.free_qty)))
+        res_lst.append(format_quantity_description_data(
+            "Under Production", float_format(sum(row.get('quantity', 0) for row in report['open_mos']))))
+        res_lst.append(format_quantity_description_data(
+            "In Sales", float_format(sum(row.get('quantity', 0) for row in report['open_sos']))))
+        res_lst.append(format_quantity_description_data(
+            "Forecast Bias (4 Weeks)", float_format(report['accuracy']['bias'])))
         return res_lst
 
-    def _get_header_content(self):
-        quantity_description = self.get_quantity_description()
-        product_id = self.product_id
+    def _get_header_content(self, report):
+        quantity_description = self.get_quantity_description(report)
+        product_id = report['product']
         return format_header_data(product_id.id, product_id._name, product_id.display_name, quantity_description,
                                   self.get_last_updated_time(), product_id.uom_id.name)
 
-    def _get_chart_content(self):
-        product_id = self.product_id.id
-        actual_demand = self.get_sales_demand(product_id, 'actual')
-        historical_demand = self.get_sales_demand(product_id, 'historical')
-        forecasted_demand = self.get_forecasted_demand(product_id)
-        labels, tooltip_extend_labels = [], []
-        if len(actual_demand) != 0 and len(historical_demand) != 0 and len(forecasted_demand) != 0:
-            max_week = max(actual_demand[-1].get('week'), historical_demand[-1].get('week'),
-                           forecasted_demand[-1].get('week'))
-            min_week = max(actual_demand[0].get('week'), historical_demand[0].get('week'),
-                           forecasted_demand[0].get('week'))
-            labels = list(map(lambda x: f'Week {x if x < 0 else x + 1}', range(min_week, max_week)))
-            tooltip_extend_labels = [format_datetime(x['week_end_date']) for x in forecasted_demand]
-
-        self.forecasted_demand = forecasted_demand
-        self.labels = labels
+    def _get_chart_content(self, report):
+        actual_demand = report['actual']
+        historical_demand = report['historical']
+        forecasted_demand = report['forecast']
         chart_type = 'line'
         element_config = [
             graph.get_chart_element_config('Actual',
@@ -377,20 +468,20 @@ class DemandForecastReport(models.AbstractModel):
         y_axis = graph.get_chart_axis_config(stacked=False)
         chart_config = graph.get_chart_config_from(chart_type='line', element_configs=element_config,
                                                    title_config=title_config, legend_config=legend_config,
-                                                   tooltip_config=tooltip_config, axis_labels=labels,
-                                                   tooltip_extend_labels=tooltip_extend_labels,
+                                                   tooltip_config=tooltip_config, axis_labels=report['labels'],
+                                                   tooltip_extend_labels=report['tooltip_extend_labels'],
                                                    x_axis_configs=x_axis, y_axis_configs=y_axis)
 
         return format_body_data(chart_config)
 
-    def _get_table_contents(self):
+    def _get_table_contents(self, report):
         table_lst = list()
-        table_lst.append(self._get_forecasted_table_content())
-        table_lst.append(self._get_mos_table_content())
-        table_lst.append(self._get_sos_table_content())
+        table_lst.append(self._get_forecasted_table_content(report))
+        table_lst.append(self._get_mos_table_content(report))
+        table_lst.append(self._get_sos_table_content(report))
         return table_lst
 
-    def _get_forecasted_table_content(self, ):
+    def _get_forecasted_table_content(self, report):
         # Extract Header
         week_key, forecasted_date_key, forecasted_demand_key = 'week_key', 'forecasted_date', 'forecasted_demand'
         headers = {
@@ -399,21 +490,20 @@ class DemandForecastReport(models.AbstractModel):
             **format_header_cell(forecasted_demand_key, 'Forecasted Demand', is_number=True, sequence=3)
         }
 
-        forecasted_demand = self.forecasted_demand or {}
-        if not len(forecasted_demand):
-            forecasted_demand = self.get_sales_demand(self.product_id.id, 'historical')
+        forecasted_demand = report['forecast']
+        float_format = report['float_format']
         # Extract Content
-        labels = self.labels
+        labels = report['labels']
         if not labels:
             labels = ['' for _ in range(len(forecasted_demand))]
         content = [{
             week_key: format_content_cell(label),
             forecasted_date_key: format_content_cell(format_datetime(row.get('week_end_date'))),
-            forecasted_demand_key: format_content_cell(self.float_format(row.get('forecasted_demand_qty')))
+            forecasted_demand_key: format_content_cell(float_format(row.get('forecasted_demand_qty')))
         } for row, label in zip(forecasted_demand, labels)] or {}
         return format_table_data("Forecasted Demand", "None", headers, content, size=4)
 
-    def _get_mos_table_content(self):
+    def _get_mos_table_content(self, report):
         # Extract Header
         mo_nbr, mo_qty, mo_ready_date = 'mo_number', 'mo_qty', 'mo_ready_date'
         headers = dict()
@@ -423,16 +513,15 @@ class DemandForecastReport(models.AbstractModel):
                    **format_header_cell(mo_ready_date, 'Ready Date', sequence=3)
                    }
         # Extract Content
-        open_mos_data = self.get_open_manufacturing_orders(self.product_id.id)
-        self.open_mos_data = open_mos_data
+        float_format = report['float_format']
         content = [{
             mo_nbr: format_content_cell(row.get('name'), row.get('id')),
-            mo_qty: format_content_cell(self.float_format(row.get('quantity'))),
+            mo_qty: format_content_cell(float_format(row.get('quantity'))),
             mo_ready_date: format_content_cell(format_datetime(row.get('date_planned_finished')))
-        } for row in open_mos_data] or {}
+        } for row in report['open_mos']] or {}
         return format_table_data("Open MOs", "mrp.production", headers, content, size=4)
 
-    def _get_sos_table_content(self):
+    def _get_sos_table_content(self, report):
         # Extract Header
         customer_key, so_nbr_key, so_qty_key, so_confirmed_key = 'customer', 'so_number', 'so_qty', 'so_confirmed_date'
         headers = dict()
@@ -443,32 +532,85 @@ class DemandForecastReport(models.AbstractModel):
                    **format_header_cell(so_confirmed_key, 'Commitment Date', sequence=4)
                    }
         # Extract Content
-        open_sos_data = self.get_open_sale_orders(self.product_id.id)
-        self.open_sos_data = open_sos_data
+        float_format = report['float_format']
         content = [{
             customer_key: format_content_cell(row.get('partner_name'), row.get('partner_id'),
                                               **{'model': 'res.partner'}),
             so_nbr_key: format_content_cell(row.get('name'), row.get('id')),
-            so_qty_key: format_content_cell(self.float_format(row.get('quantity'))),
+            so_qty_key: format_content_cell(float_format(row.get('quantity'))),
             so_confirmed_key: format_content_cell(format_datetime(row.get('commitment_date')))
-        } for row in open_sos_data] or {}
+        } for row in report['open_sos']] or {}
         return format_table_data("Open SOs", "sale.order", headers, content, size=4)
 
-    def get_initial_request_data(self):
-        if self._context.get('report_product_id', False):
-            self.product_id = self.env['product.product'].browse(self._context.get('report_product_id', -1))
-            # self.factor = int(abs(log10(self.product_id.uom_id.rounding)))
-            self.float_format = lambda number: f'{number:,.{self.factor}f}'
-        else:
-            raise UserError(_('Please provide specific product!'))
+    @api.model
+    def _get_chart_labels(self, demand_series):
+        actual_demand = demand_series['actual']
+        historical_demand = demand_series['historical']
+        forecasted_demand = demand_series['forecast']
+        labels, tooltip_extend_labels = [], []
+        if len(actual_demand) != 0 and len(historical_demand) != 0 and len(forecasted_demand) != 0:
+            max_week = max(actual_demand[-1].get('week'), historical_demand[-1].get('week'),
+                           forecasted_demand[-1].get('week'))
+            min_week = max(actual_demand[0].get('week'), historical_demand[0].get('week'),
+                           forecasted_demand[0].get('week'))
+            labels = list(map(lambda x: f'Week {x if x < 0 else x + 1}', range(min_week, max_week)))
+            tooltip_extend_labels = [format_datetime(x['week_end_date']) for x in forecasted_demand]
+        return labels, tooltip_extend_labels
 
     @api.model
-    def get_forecasted_report_data(self):
-        self.get_initial_request_data()
-        body = self._get_chart_content()
-        footer = self._get_table_contents()
-        header = self._get_header_content()
+    def get_initial_request_data(self, product_ids):
+        """
+        Load the data of the reports of products, everything the report needs is kept in the returned
+        dictionaries so that nothing is shared between requests
+        :param product_ids: ids of products of the reports
+        :return: {product_id: report data}
+        """
+        factor = 0
+        demand_series = self.get_demand_series_by_products(product_ids)
+        accuracy = self.compare_forecast_with_actual(product_ids, demand_series)
+        open_mos = self.get_open_manufacturing_orders_by_products(product_ids)
+        open_sos = self.get_open_sale_orders_by_products(product_ids)
+        reports = {}
+        for product in self.env['product.product'].browse(product_ids):
+            labels, tooltip_extend_labels = self._get_chart_labels(demand_series[product.id])
+            reports[product.id] = {
+                **demand_series[product.id],
+                'product': product,
+                'factor': factor,
+                'float_format': lambda number: f'{number:,.{factor}f}',
+                'labels': labels,
+                'tooltip_extend_labels': tooltip_extend_labels,
+                'open_mos': open_mos[product.id],
+                'open_sos': open_sos[product.id],
+                'accuracy': accuracy[product.id],
+            }
+        return reports
+
+    @api.model
+    def _get_report_config(self, report):
+        body = self._get_chart_content(report)
+        footer = self._get_table_contents(report)
+        header = self._get_header_content(report)
 
         config = format_report_data(header, body, footer)
-        config['formatFactor'] = self.factor
+        config['formatFactor'] = report['factor']
         return config
+
+    @api.model
+    def get_forecasted_reports_data(self, product_ids):
+        """
+        Get the configuration of the forecasted demand reports of products in a fixed number of queries
+        :param product_ids: ids of products of the reports
+        :return: {product_id: report configuration}
+        """
+        if not product_ids:
+            raise UserError(_('Please provide specific product!'))
+        reports = self.get_initial_request_data(product_ids)
+        return {product_id: self._get_report_config(report) for product_id, report in reports.items()}
+
+    @api.model
+    def get_forecasted_report_data(self):
+        product_id = self._context.get('report_product_id', False)
+        if not product_id:
+            raise UserError(_('Please provide specific product!'))
+        return self.get_forecasted_reports_data([product_id])[product_id]
@@ -2,6 +2,7 @@
 # See LICENSE file for full copyright and licensing details.
 
 from odoo import api, fields, models, _
+from odoo.exceptions import UserError
 
 
 class ProductProduct(models.Model):
@@ -16,7 +17,10 @@ class ProductProduct(models.Model):
         self.forecasted_demand_ok = False
     
     def action_product_forecasted_demand_report(self):
-        self.ensure_one()
+        """ Open the forecasted demand reports of the products, the reports of all the products are loaded at once """
+        products = self.filtered('forecasted_demand_ok') if len(self) > 1 else self
+        if not products:
+            raise UserError(_('None of the selected products can be forecasted.'))
         action = self.env.ref('phd_demand_forecast.stock_forcasted_demand_product_product_action').read()[0]
-        action['context'] = {'default_product_id': self.id}
+        action['context'] = {'default_product_id': products[0].id, 'report_product_ids': products.ids}
         return action
@@ -0,0 +1,30 @@
+# Copyright © 2021 Novobi, LLC
+# See LICENSE file for full copyright and licensing details.
+
+from odoo import api, fields, models, _
+
+WEEK_DAYS = [
+    ('1', 'Monday'),
+    ('2', 'Tuesday'),
+    ('3', 'Wednesday'),
+    ('4', 'Thursday'),
+    ('5', 'Friday'),
+    ('6', 'Saturday'),
+    ('7', 'Sunday'),
+]
+
+
+class Company(models.Model):
+    _inherit = 'res.company'
+
+    demand_week_start = fields.Selection(WEEK_DAYS, string='Demand Week Start', default='7', required=True,
+                                         help='First day of the weeks of the sales demand and forecasted demand')
+
+    def write(self, vals):
+        week_start_changed = 'demand_week_start' in vals and any(
+            company.demand_week_start != vals['demand_week_start'] for company in self)
+        res = super(Company, self).write(vals)
+        if week_start_changed:
+            # The weekly demand is kept by week, it has to be built again with the new weeks
+            self.env['demand.forecast.report']._rebuild_sales_demand()
+        return res
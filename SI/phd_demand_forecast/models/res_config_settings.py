@@ -0,0 +1,10 @@
+# Copyright © 2021 Novobi, LLC
+# See LICENSE file for full copyright and licensing details.
+
+from odoo import api, fields, models, _
+
+
+class ResConfigSettings(models.TransientModel):
+    _inherit = 'res.config.settings'
+
+    demand_week_start = fields.Selection(related='company_id.demand_week_start', readonly=False, required=True)
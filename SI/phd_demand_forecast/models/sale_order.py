@@ -0,0 +1,53 @@
+# Copyright © 2021 Novobi, LLC
+# See LICENSE file for full copyright and licensing details.
+
+from odoo import api, fields, models, _
+
+DEMAND_ORDER_FIELDS = {'state', 'date_order', 'partner_id', 'company_id'}
+DEMAND_ORDER_LINE_FIELDS = {'order_id', 'product_id', 'product_uom_qty', 'product_uom'}
+
+
+class SaleOrder(models.Model):
+    _inherit = 'sale.order'
+
+    def write(self, vals):
+        if not DEMAND_ORDER_FIELDS.intersection(vals):
+            return super(SaleOrder, self).write(vals)
+        # Remove the demand of the confirmed orders as it was, then add it back as it is, the lines written
+        # with the orders are part of this delta
+        self._update_sales_demand(sign=-1)
+        res = super(SaleOrder, self.with_context(sales_demand_order_delta=True)).write(vals)
+        self._update_sales_demand()
+        return res
+
+    def _update_sales_demand(self, sign=1):
+        if self.ids:
+            self.env['demand.forecast.report']._update_sales_demand(order_ids=self.ids, sign=sign)
+
+
+class SaleOrderLine(models.Model):
+    _inherit = 'sale.order.line'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        # The lines of an order created as confirmed are added here as well
+        lines = super(SaleOrderLine, self).create(vals_list)
+        lines._update_sales_demand()
+        return lines
+
+    def write(self, vals):
+        if not DEMAND_ORDER_LINE_FIELDS.intersection(vals) or self.env.context.get('sales_demand_order_delta'):
+            return super(SaleOrderLine, self).write(vals)
+        self._update_sales_demand(sign=-1)
+        res = super(SaleOrderLine, self).write(vals)
+        self._update_sales_demand()
+        return res
+
+    def unlink(self):
+        self._update_sales_demand(sign=-1)
+        return super(SaleOrderLine, self).unlink()
+
+    def _update_sales_demand(self, sign=1):
+        # The lines written with their orders are updated by the orders
+        if self.ids and not self.env.context.get('sales_demand_order_delta'):
+            self.env['demand.forecast.report']._update_sales_demand(line_ids=self.ids, sign=sign)
@@ -22,21 +22,30 @@ odoo.define('phd_demand_forecast.ForecastedDemandReport', function (require) {
             this._super.apply(this, arguments);
             this.renderReport()
         },
-        __getReportData: async function () {
+        __getProductIds: function () {
+            let context = this.controlPanelParams.context;
+            return context.report_product_ids || [context.active_id];
+        },
+        __getReportsData: async function (productIds) {
             return await this._rpc({
                 model: 'demand.forecast.report',
-                method: 'get_forecasted_report_data',
-                context: {'report_product_id': this.controlPanelParams.context.active_id}
+                method: 'get_forecasted_reports_data',
+                args: [productIds],
             })
         },
 
         renderReport: async function () {
-            let res = await this.__getReportData();
-            res.canvasID = _.uniqueId('canvas');
-            res['headerContent'].lastUpdate = this._formatDatetime(res['headerContent'].lastUpdate);
-            this.$('.o_content').html($(QWeb.render('ForecastedDemandReportTemplate', {widget: res})));
-            this.factor = res['formatFactor'];
-            this.renderChart(res['bodyContent'].chartConfig, res.canvasID)
+            let productIds = this.__getProductIds();
+            let reports = await this.__getReportsData(productIds);
+            this.$('.o_content').empty();
+            for (let productId of productIds) {
+                let res = reports[productId];
+                res.canvasID = _.uniqueId('canvas');
+                res['headerContent'].lastUpdate = this._formatDatetime(res['headerContent'].lastUpdate);
+                this.$('.o_content').append($(QWeb.render('ForecastedDemandReportTemplate', {widget: res})));
+                this.factor = res['formatFactor'];
+                this.renderChart(res['bodyContent'].chartConfig, res.canvasID)
+            }
         },
         renderChart: function (chartConfig = false, canvasID) {
             if (chartConfig) {
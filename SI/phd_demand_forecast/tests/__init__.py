@@ -0,0 +1,4 @@
+# Copyright © 2021 Novobi, LLC
+# See LICENSE file for full copyright and licensing details.
+
+from . import test_sales_demand
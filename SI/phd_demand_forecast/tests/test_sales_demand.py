@@ -0,0 +1,98 @@
+# Copyright © 2021 Novobi, LLC
+# See LICENSE file for full copyright and licensing details.
+
+from datetime import datetime
+
+from odoo.tests import common, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestSalesDemand(common.SavepointCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestSalesDemand, cls).setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+        # Two languages starting the weeks on different days
+        cls.env['res.lang']._activate_lang('fr_FR')
+        cls.env['res.lang']._lang_get('en_US').week_start = 7
+        cls.env['res.lang']._lang_get('fr_FR').week_start = 1
+        cls.env.company.demand_week_start = '7'
+        group_ids = [(6, 0, [cls.env.ref('sales_team.group_sale_manager').id])]
+        cls.user_en = cls.env['res.users'].create({
+            'name': 'Demand User EN',
+            'login': 'demand_user_en',
+            'lang': 'en_US',
+            'groups_id': group_ids,
+        })
+        cls.user_fr = cls.env['res.users'].create({
+            'name': 'Demand User FR',
+            'login': 'demand_user_fr',
+            'lang': 'fr_FR',
+            'groups_id': group_ids,
+        })
+        cls.partner = cls.env['res.partner'].create({'name': 'Demand Customer'})
+        cls.product = cls.env['product.product'].create({
+            'name': 'Demand Product',
+            'type': 'consu',
+        })
+
+    def _get_weekly_demand(self):
+        self.env.cr.execute("""
+            SELECT week_end_date, sale_qty FROM actual_sales_demand WHERE product_id = %s ORDER BY week_end_date
+        """, (self.product.id,))
+        return self.env.cr.fetchall()
+
+    def test_demand_net_zero_across_languages(self):
+        # A Sunday, which is in different weeks for both languages
+        order = self.env['sale.order'].with_user(self.user_en).create({
+            'partner_id': self.partner.id,
+            'date_order': datetime(2021, 1, 3, 12, 0),
+            'order_line': [(0, 0, {
+                'product_id': self.product.id,
+                'product_uom_qty': 5,
+            })],
+        })
+        order.action_confirm()
+        weekly_demand = self._get_weekly_demand()
+        self.assertEqual(len(weekly_demand), 1)
+        self.assertEqual(weekly_demand[0][0].weekday(), 5, 'The weeks of the company start on Sunday')
+        self.assertEqual(weekly_demand[0][1], 5)
+
+        order.with_user(self.user_fr).action_cancel()
+        self.assertEqual(self._get_weekly_demand(), [(weekly_demand[0][0], 0)],
+                         'The cancelled demand must be removed from the same week')
+
+    def test_lines_written_with_order_counted_once(self):
+        order = self.env['sale.order'].create({
+            'partner_id': self.partner.id,
+            'date_order': datetime(2021, 1, 5, 12, 0),
+            'order_line': [(0, 0, {
+                'product_id': self.product.id,
+                'product_uom_qty': 5,
+            })],
+        })
+        # A draft order confirmed together with a new line
+        order.write({
+            'state': 'sale',
+            'order_line': [(0, 0, {
+                'product_id': self.product.id,
+                'product_uom_qty': 2,
+            })],
+        })
+        weekly_demand = self._get_weekly_demand()
+        self.assertEqual([qty for week, qty in weekly_demand], [7])
+
+        # A confirmed order moved to another week together with a new line and a changed line
+        order.write({
+            'date_order': datetime(2021, 1, 12, 12, 0),
+            'order_line': [
+                (0, 0, {'product_id': self.product.id, 'product_uom_qty': 3}),
+                (1, order.order_line[0].id, {'product_uom_qty': 4}),
+            ],
+        })
+        self.assertEqual([qty for week, qty in self._get_weekly_demand()], [0, 9])
+
+        # The lines written alone are still counted
+        order.order_line[0].product_uom_qty = 1
+        self.assertEqual([qty for week, qty in self._get_weekly_demand()], [0, 6])
@@ -0,0 +1,120 @@
+# Copyright © 2021 Novobi, LLC
+# See LICENSE file for full copyright and licensing details.
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+MOVING_AVERAGE = 'moving_average'
+EXPONENTIAL_SMOOTHING = 'exponential_smoothing'
+SEASONAL_NAIVE = 'seasonal_naive'
+FORECAST_METHODS = [MOVING_AVERAGE, EXPONENTIAL_SMOOTHING, SEASONAL_NAIVE]
+
+MOVING_AVERAGE_WINDOW = 8
+SMOOTHING_ALPHA = 0.3
+SEASON_LENGTH = 52
+# Below this number of series, the process pool costs more than it saves
+MIN_SERIES_PER_WORKER = 500
+
+
+def moving_average(history, horizon, window=MOVING_AVERAGE_WINDOW):
+    """
+    :param history: weekly demand, one row per series
+    :type history: numpy.ndarray
+    :return: the mean of the last weeks repeated over the horizon
+    :rtype: numpy.ndarray
+    """
+    level = history[:, -window:].mean(axis=1)
+    return np.repeat(level[:, None], horizon, axis=1)
+
+
+def exponential_smoothing(history, horizon, alpha=SMOOTHING_ALPHA):
+    """
+    Simple exponential smoothing, the loop runs over the weeks and every series is smoothed at once
+    """
+    level = history[:, 0].copy()
+    for week_demand in history.T[1:]:
+        level = alpha * week_demand + (1 - alpha) * level
+    return np.repeat(level[:, None], horizon, axis=1)
+
+
+def seasonal_naive(history, horizon, season=SEASON_LENGTH):
+    """
+    Repeat the demand of the same weeks one season ago, fall back on the moving average when the history
+    is shorter than a season
+    """
+    if history.shape[1] < season:
+        return moving_average(history, horizon)
+    week_indexes = history.shape[1] - season + np.arange(horizon) % season
+    return history[:, week_indexes]
+
+
+FORECAST_FUNCTIONS = {
+    MOVING_AVERAGE: moving_average,
+    EXPONENTIAL_SMOOTHING: exponential_smoothing,
+    SEASONAL_NAIVE: seasonal_naive,
+}
+
+
+def fit_forecast(history, horizon, holdout):
+    """
+    Back-test every method on the last weeks of the history, then forecast every series with the method
+    having the lowest mean absolute error on it
+    :param history: weekly demand, one row per series
+    :type history: numpy.ndarray
+    :param horizon: number of weeks to forecast
+    :param holdout: number of weeks of the history kept for the back-test
+    :return: forecast (series x horizon), index of the method of each series in FORECAST_METHODS,
+        back-test forecast of the chosen methods (series x holdout)
+    :rtype: tuple
+    """
+    train, test = history[:, :-holdout], history[:, -holdout:]
+    backtests = np.stack([FORECAST_FUNCTIONS[method](train, holdout) for method in FORECAST_METHODS])
+    best_methods = np.abs(backtests - test).mean(axis=2).argmin(axis=0)
+    forecasts = np.stack([FORECAST_FUNCTIONS[method](history, horizon) for method in FORECAST_METHODS])
+    series_indexes = np.arange(history.shape[0])
+    forecast = np.clip(forecasts[best_methods, series_indexes], 0, None)
+    return forecast, best_methods, backtests[best_methods, series_indexes]
+
+
+def _fit_forecast_args(args):
+    return fit_forecast(*args)
+
+
+def fit_forecast_parallel(history, horizon, holdout, max_workers=1):
+    """
+    Split the series between the processes of a pool and run `fit_forecast` on every chunk
+    """
+    nb_chunks = min(max_workers, history.shape[0] // MIN_SERIES_PER_WORKER)
+    if nb_chunks <= 1:
+        return fit_forecast(history, horizon, holdout)
+    chunks = np.array_split(history, nb_chunks)
+    with ProcessPoolExecutor(max_workers=nb_chunks) as executor:
+        results = list(executor.map(_fit_forecast_args, [(chunk, horizon, holdout) for chunk in chunks]))
+    return tuple(np.concatenate(arrays) for arrays in zip(*results))
+
+
+def accuracy_by_group(actual, forecast, group_indexes, nb_groups):
+    """
+    Aggregate the series of each group (e.g. the customers of a product) and measure the forecast error
+    :param actual: actual demand (series x weeks)
+    :param forecast: forecasted demand of the same weeks
+    :param group_indexes: index of the group of every series
+    :return: dictionary of metric arrays, one value per group
+    :rtype: dict
+    """
+    group_actual = np.zeros((nb_groups, actual.shape[1]))
+    group_forecast = np.zeros((nb_groups, actual.shape[1]))
+    np.add.at(group_actual, group_indexes, actual)
+    np.add.at(group_forecast, group_indexes, forecast)
+    error = group_forecast - group_actual
+    actual_qty = group_actual.sum(axis=1)
+    absolute_error_qty = np.abs(error).sum(axis=1)
+    return {
+        'actual_qty': actual_qty,
+        'forecasted_qty': group_forecast.sum(axis=1),
+        'bias': error.sum(axis=1),
+        'mae': np.abs(error).mean(axis=1),
+        'rmse': np.sqrt((error ** 2).mean(axis=1)),
+        'wape': np.divide(absolute_error_qty, actual_qty, out=np.zeros_like(actual_qty), where=actual_qty != 0),
+    }
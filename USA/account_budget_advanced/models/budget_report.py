@@ -4,9 +4,11 @@
 import xlsxwriter
 import io
 import ast
+import numpy as np
 from odoo import models, api, _, fields
 from xlsxwriter import utility
 from dateutil import rrule
+from dateutil.relativedelta import relativedelta
 from ..utils.budget_utils import get_list_period_by_type, _divide_line, format_number, _get_balance_sheet_value
 
 
@@ -75,19 +77,16 @@ class BudgetReport(models.AbstractModel):
         return lines
 
     def _get_dict_lines(self, children_lines, column_number, crossovered_budget, daterange_list,
-                        financial_report, currency_table, is_profit_budget, index_dict, actual_data_length):
+                        financial_report, currency_table, is_profit_budget, budget_matrix):
         final_result_table = []
-        AccountAccount = self.env['account.account']
+        account_index = budget_matrix['account_index']
         empty = [0.0 for i in range(column_number)]
         analytic_account_id = crossovered_budget.analytic_account_id
-        empty_actual_data = [0.0 for i in range(actual_data_length)]
 
         # build comparison table
         for line in children_lines:
             domain_ids = {}
-            actual_data = {}
             lines = []
-            balance_sheet_dict = {}
             class_name = ' expense_budget' if not line.green_on_positive else ' income_budget'
 
             if line.hide_in_budget:
@@ -117,16 +116,7 @@ class BudgetReport(models.AbstractModel):
             groupby = line.groupby or 'aml'
 
             if line.domain:
-                edit_domain = line.domain.replace('account_id.', '')
-                domain_ids = sorted(AccountAccount.search(ast.literal_eval(edit_domain)).ids)
-
-                if is_profit_budget and daterange_list:
-                    # For Monthly, Quarterly, Yearly filter
-                    actual_data = self._get_actual_data(ast.literal_eval(line.domain), analytic_account_id,
-                                                        daterange_list, actual_data_length, index_dict)
-                else:
-                    balance_sheet_dict = _get_balance_sheet_value(line, financial_report, currency_table,
-                                                                  daterange_list, analytic_account_id)
+                domain_ids = budget_matrix['line_accounts'][line.id]
 
             for domain_id in domain_ids:
                 name = str(line._get_gb_name(domain_id))
@@ -134,38 +124,25 @@ class BudgetReport(models.AbstractModel):
                 actual_total = 0
                 budget_total = 0
 
-                budget_lines = crossovered_budget.crossovered_budget_line.filtered(
-                    lambda x: domain_id in x.general_budget_id.account_ids.ids).sorted(lambda x: x.date_from)
+                row = account_index[domain_id]
+                planned_amounts = budget_matrix['planned'][row]
+                actual_amounts = budget_matrix['actual'][line.id][row]
 
                 if not is_profit_budget:  # BALANCE SHEET
-                    practical_amount_array = balance_sheet_dict.get(domain_id, empty)
-
-                    for index, daterange in enumerate(daterange_list):
-                        range_lines = budget_lines.filtered(lambda x: x.date_to == daterange[1])
-
-                        practical_amount = practical_amount_array[index]
-                        planned_amount_entry = range_lines[0].planned_amount_entry if range_lines else 0
-
-                        result = self._get_budget_value(practical_amount, planned_amount_entry, True)
-                        columns.extend(result)
+                    columns.extend(self._get_budget_values(actual_amounts, planned_amounts, True))
                 else:  # PROFIT & LOSS
                     if daterange_list:
-                        actual_list = actual_data.get(domain_id, empty_actual_data)
-                        actual_total = sum(actual_list)
-                        for index, daterange in enumerate(daterange_list):
-                            range_lines = budget_lines.filtered(lambda x: x.date_from >= daterange[0]
-                                                                          and x.date_to <= daterange[1])
-                            planned_amount_entry = sum([i.planned_amount_entry for i in range_lines])
-                            budget_total += planned_amount_entry
-                            result = self._get_budget_value(actual_list[index], planned_amount_entry, line.green_on_positive)
-                            columns.extend(result)
+                        actual_total = actual_amounts.sum()
+                        budget_total = planned_amounts.sum()
+                        columns.extend(self._get_budget_values(actual_amounts, planned_amounts,
+                                                               line.green_on_positive))
                     else:
                         # Whole Budget, will show only Total column
-                        actual_total = sum([i.practical_amount for i in budget_lines])
-                        budget_total = sum([i.planned_amount_entry for i in budget_lines])
+                        actual_total = budget_matrix['practical_total'][row]
+                        budget_total = budget_matrix['planned_total'][row]
 
                     # Add extra Total column, only for P&L
-                    result = self._get_budget_value(actual_total, budget_total, line.green_on_positive)
+                    result = self._get_budget_value(float(actual_total), float(budget_total), line.green_on_positive)
                     columns.extend(result)
 
                 if not columns:
@@ -197,7 +174,8 @@ class BudgetReport(models.AbstractModel):
 
             if len(lines) == 1:
                 new_lines = self._get_dict_lines(line.children_ids, column_number, crossovered_budget, daterange_list,
-                                                 financial_report, currency_table, is_profit_budget, index_dict, actual_data_length)
+                                                 financial_report, currency_table, is_profit_budget,
+                                                 budget_matrix)
 
                 if new_lines and line.level > 0 and line.formulas:
                     divided_lines = _divide_line(lines[0], column_number, line)
@@ -215,56 +193,248 @@ class BudgetReport(models.AbstractModel):
 
         return final_result_table
 
+    def _create_index_dict(self, daterange_list):
+        """
+        Map every month of the budget to the index of its period
+        """
+        index_dict = {}
+        for index, daterange in enumerate(daterange_list):
+            for dt in rrule.rrule(rrule.MONTHLY, dtstart=daterange[0].replace(day=1), until=daterange[1]):
+                index_dict[str(dt.month) + '-' + str(dt.year)] = index
+        return index_dict
+
     @api.model
-    def _get_actual_data(self, domain, analytic_account_id, daterange_list, column_number, index_dict):
-        result_dict = {}
+    def _is_account_domain(self, domain):
+        """
+        Check if a domain on journal items only filters on their account
+        """
+        return all(not isinstance(leaf, (list, tuple)) or str(leaf[0]).startswith('account_id') for leaf in domain)
 
-        tables, where_clause, where_params = self.env['account.move.line'].with_context(
-            analytic_account_ids=analytic_account_id)._query_get(domain=domain)
-        sql_params = [daterange_list[0][0], daterange_list[-1][1]]
-        sql_params.extend(where_params)
-        sql_query = """
-                    SELECT "account_move_line".account_id as account_id, 
-                        date_part('year', "account_move_line".date::date) as year,
-                        date_part('month', "account_move_line".date::date) AS month,
-                        SUM("account_move_line".balance) as total_balance,
-                        SUM("account_move_line".debit) as debit,
-                        SUM("account_move_line".credit) as credit
-
-                    FROM "account_move" as "account_move_line__move_id","account_move_line" 
-
-                    WHERE ("account_move_line"."move_id"="account_move_line__move_id"."id") AND
-                        "account_move_line__move_id"."state" = 'posted' AND
-                        "account_move_line".date >= %s AND
-                        "account_move_line".date <= %s AND """ + where_clause + """
-                        GROUP BY account_id, year, month 
-                        ORDER BY account_id, year, month;
-                        """
-        self.env.cr.execute(sql_query, sql_params)
-        result = self.env.cr.dictfetchall()
-
-        if len(daterange_list) < 2:
-            # Yearly filter
-            for r in result:
-                account_balance = result_dict.get(r['account_id'], [0.0 for i in range(column_number)])
-                account_balance[0] += r['credit'] - r['debit']
-                result_dict[r['account_id']] = account_balance
+    @api.model
+    def _is_account_balance_line(self, line):
+        """
+        Check if the balance of each account of a Balance Sheet line is its cumulative balance, or its opposite,
+        i.e. if it can be computed with the other lines instead of evaluating the formulas of the line
+        :return: 1 or -1 as the sign of the balance, 0 when the formulas of the line need to be evaluated
+        """
+        formulas = line._split_formulas() if line.formulas else {}
+        balance_formula = formulas.get('balance', '').replace(' ', '')
+        if balance_formula not in ('sum.balance', '-sum.balance') or line.groupby != 'account_id' \
+                or line.show_domain == 'never' or line.special_date_changer not in ('normal', 'from_beginning') \
+                or not self._is_account_domain(ast.literal_eval(line.domain)):
+            return 0
+        return -1 if balance_formula.startswith('-') else 1
+
+    def _plan_report_lines(self, lines, plan=None):
+        """
+        Walk the tree of the financial report lines once and evaluate the domain of the lines showing accounts,
+        the lines sharing a domain search their accounts once
+        :return: {'lines': {line: sorted account ids}, 'domains': {domain: sorted account ids}}
+        :rtype: dict
+        """
+        plan = {'lines': {}, 'domains': {}} if plan is None else plan
+        for line in lines:
+            if line.hide_in_budget:
+                continue
+            if line.domain:
+                if line.domain not in plan['domains']:
+                    edit_domain = line.domain.replace('account_id.', '')
+                    plan['domains'][line.domain] = sorted(
+                        self.env['account.account'].search(ast.literal_eval(edit_domain)).ids)
+                plan['lines'][line] = plan['domains'][line.domain]
+            if not plan['lines'].get(line):
+                # Same as the report, which shows the children of the lines without accounts
+                self._plan_report_lines(line.children_ids, plan)
+        return plan
+
+    def _get_budget_matrix(self, lines, crossovered_budget, daterange_list, is_profit_budget, financial_report,
+                           currency_table):
+        """
+        Load the planned amounts of the budget and the actual amounts of every line of the report once, as
+        matrices indexed by (account, period)
+        :return: dictionary with the accounts of each line, the index of the accounts in the matrices, the planned
+            matrix, the actual matrix of each line, the planned and practical totals of each account for the Whole
+            Budget filter
+        :rtype: dict
+        """
+        plan = self._plan_report_lines(lines)
+        account_ids = sorted({account_id for ids in plan['domains'].values() for account_id in ids})
+        account_index = {account_id: index for index, account_id in enumerate(account_ids)}
+        period_number = len(daterange_list)
+        planned = np.zeros((len(account_ids), period_number))
+        planned_total = np.zeros(len(account_ids))
+        practical_total = np.zeros(len(account_ids))
+
+        # One (budget line, account) pair for every account of the budgetary position of a budget line
+        budget_lines = crossovered_budget.crossovered_budget_line.sorted(lambda x: x.date_from)
+        pair_lines, pair_accounts = [], []
+        for line_index, budget_line in enumerate(budget_lines):
+            for account_id in budget_line.general_budget_id.account_ids.ids:
+                if account_id in account_index:
+                    pair_lines.append(line_index)
+                    pair_accounts.append(account_index[account_id])
+        pair_lines = np.array(pair_lines, dtype=int)
+        pair_accounts = np.array(pair_accounts, dtype=int)
+        planned_amounts = np.array(budget_lines.mapped('planned_amount_entry'), dtype=float)
+
+        if period_number and len(pair_lines):
+            line_dates_from = np.array(budget_lines.mapped('date_from'), dtype='datetime64[D]')[pair_lines]
+            line_dates_to = np.array(budget_lines.mapped('date_to'), dtype='datetime64[D]')[pair_lines]
+            period_ends = np.array([daterange[1] for daterange in daterange_list], dtype='datetime64[D]')
+            if is_profit_budget:
+                # Sum of the budget lines within the period
+                period_starts = np.array([daterange[0] for daterange in daterange_list], dtype='datetime64[D]')
+                in_period = (line_dates_from[:, None] >= period_starts) & (line_dates_to[:, None] <= period_ends)
+                np.add.at(planned, pair_accounts, planned_amounts[pair_lines][:, None] * in_period)
+            else:
+                # First budget line ending with the period
+                pair_index, period_index = np.nonzero(line_dates_to[:, None] == period_ends)
+                cells = pair_accounts[pair_index] * period_number + period_index
+                cells, first_index = np.unique(cells, return_index=True)
+                planned.flat[cells] = planned_amounts[pair_lines[pair_index[first_index]]]
+        elif is_profit_budget and len(pair_lines):
+            practical_amounts = np.array(budget_lines.mapped('practical_amount'), dtype=float)
+            np.add.at(planned_total, pair_accounts, planned_amounts[pair_lines])
+            np.add.at(practical_total, pair_accounts, practical_amounts[pair_lines])
+
+        if is_profit_budget:
+            actual = self._get_profit_actual_matrices(plan, account_index, crossovered_budget, daterange_list)
         else:
-            # Monthly, Quarterly filter
-            for r in result:
-                account_balance = result_dict.get(r['account_id'], [0.0 for i in range(column_number)])
-                time_index = str(int(r['month'])) + '-' + str(int(r['year']))
-                index = index_dict[time_index]
-                account_balance[index] = r['credit'] - r['debit']
-                result_dict[r['account_id']] = account_balance
+            actual = self._get_balance_actual_matrices(plan, account_index, crossovered_budget, daterange_list,
+                                                       financial_report, currency_table)
+
+        return {
+            'line_accounts': {line.id: ids for line, ids in plan['lines'].items()},
+            'account_index': account_index,
+            'planned': planned,
+            'actual': actual,
+            'planned_total': planned_total,
+            'practical_total': practical_total,
+        }
+
+    def _get_profit_actual_matrices(self, plan, account_index, crossovered_budget, daterange_list):
+        """
+        Actual amounts of the lines of a Profit & Loss budget. The lines filtering only on the accounts share the
+        actual amounts of their accounts, the other lines are computed once per domain, all of them in one query.
+        :return: {line id: actual matrix (account x period)}
+        :rtype: dict
+        """
+        shape = (len(account_index), len(daterange_list))
+        if not daterange_list or not account_index:
+            return {line.id: np.zeros(shape) for line in plan['lines']}
+
+        # Domain of the journal items of each matrix, the first one is shared by the account domains
+        domains = [[('account_id', 'in', list(account_index))]]
+        domain_matrix = {}
+        for domain in plan['domains']:
+            if self._is_account_domain(ast.literal_eval(domain)):
+                domain_matrix[domain] = 0
+            else:
+                domain_matrix[domain] = len(domains)
+                domains.append(ast.literal_eval(domain))
 
-        return result_dict
+        index_dict = self._create_index_dict(daterange_list)
+        matrices = np.zeros((len(domains),) + shape)
+        for domain_index, account_id, year, month, amount in self._get_actual_amounts(
+                domains, crossovered_budget.analytic_account_id, daterange_list):
+            period = index_dict.get(str(int(month)) + '-' + str(int(year)))
+            row = account_index.get(account_id)
+            if period is not None and row is not None:
+                matrices[domain_index, row, period] += amount
 
-    def _create_index_dict(self, start_date, end_date):
-        index_dict = {}
-        for index, dt in enumerate(rrule.rrule(rrule.MONTHLY, dtstart=start_date, until=end_date)):
-            index_dict[str(dt.month) + '-' + str(dt.year)] = index
-        return index_dict
+        return {line.id: matrices[domain_matrix[line.domain]] for line in plan['lines']}
+
+    @api.model
+    def _get_actual_amounts(self, domains, analytic_account_id, daterange_list):
+        """
+        Actual amount (credit - debit) of the journal items of several domains by account and month, in a single
+        query
+        :return: rows of (index of the domain, account id, year, month, amount)
+        :rtype: list
+        """
+        AccountMoveLine = self.env['account.move.line'].with_context(analytic_account_ids=analytic_account_id)
+        queries = []
+        sql_params = []
+        for domain_index, domain in enumerate(domains):
+            tables, where_clause, where_params = AccountMoveLine._query_get(domain=domain)
+            queries.append("""
+                SELECT %s AS domain_index, "account_move_line".account_id,
+                    date_part('year', "account_move_line".date::date) AS year,
+                    date_part('month', "account_move_line".date::date) AS month,
+                    SUM("account_move_line".credit) - SUM("account_move_line".debit) AS amount
+                FROM "account_move" as "account_move_line__move_id","account_move_line"
+                WHERE ("account_move_line"."move_id"="account_move_line__move_id"."id") AND
+                    "account_move_line__move_id"."state" = 'posted' AND
+                    "account_move_line".date >= %s AND
+                    "account_move_line".date <= %s AND """ + where_clause + """
+                GROUP BY "account_move_line".account_id, year, month
+            """)
+            sql_params.extend([domain_index, daterange_list[0][0], daterange_list[-1][1]])
+            sql_params.extend(where_params)
+        self.env.cr.execute(' UNION ALL '.join(queries), sql_params)
+        return self.env.cr.fetchall()
+
+    def _get_balance_actual_matrices(self, plan, account_index, crossovered_budget, daterange_list,
+                                     financial_report, currency_table):
+        """
+        Actual balances of the lines of a Balance Sheet budget. The balance of the accounts at the end of every
+        period is computed in one query and shared by the lines showing the (opposite) balance of their accounts,
+        the formulas of the other lines are evaluated line by line.
+        :return: {line id: actual matrix (account x period)}
+        :rtype: dict
+        """
+        shape = (len(account_index), len(daterange_list))
+        analytic_account_id = crossovered_budget.analytic_account_id
+        signs = {line: self._is_account_balance_line(line) for line in plan['lines']}
+        balances = np.zeros(shape)
+        if daterange_list and any(signs.values()):
+            account_ids = sorted({account_id for line, ids in plan['lines'].items() if signs[line]
+                                  for account_id in ids})
+            for account_id, period, balance in self._get_period_balances(
+                    account_ids, analytic_account_id, daterange_list, currency_table):
+                balances[account_index[account_id], period] += balance
+            # Balance at the end of the periods
+            balances = balances.cumsum(axis=1)
+
+        result = {}
+        for line, ids in plan['lines'].items():
+            if signs[line]:
+                result[line.id] = signs[line] * balances
+                continue
+            matrix = np.zeros(shape)
+            balance_sheet_dict = _get_balance_sheet_value(line, financial_report, currency_table,
+                                                          daterange_list, analytic_account_id)
+            for account_id in ids:
+                if account_id in balance_sheet_dict:
+                    matrix[account_index[account_id]] = balance_sheet_dict[account_id][:len(daterange_list)]
+            result[line.id] = matrix
+        return result
+
+    @api.model
+    def _get_period_balances(self, account_ids, analytic_account_id, daterange_list, currency_table):
+        """
+        Balance of the accounts by period, the journal items before the first period are counted in the first
+        one, as the Balance Sheet lines do
+        :return: rows of (account id, index of the period, balance)
+        :rtype: list
+        """
+        date_to = daterange_list[-1][1]
+        tables, where_clause, where_params = self.env['account.move.line'].with_context(
+            date_from=False, date_to=date_to, analytic_account_ids=analytic_account_id)._query_get(
+            domain=[('account_id', 'in', account_ids)])
+        select, select_params = self.env['account.financial.html.report.line']._query_get_select_sum(currency_table)
+        # Period of a journal item = number of periods ending before its date
+        period_thresholds = [daterange[1] + relativedelta(days=1) for daterange in daterange_list]
+        self.env.cr.execute("""
+            SELECT sub.account_id, sub.period, sub.balance FROM (
+                SELECT "account_move_line".account_id,
+                    width_bucket("account_move_line".date, %s::date[]) AS period, """ + select + """
+                FROM """ + tables + """
+                WHERE """ + where_clause + """
+                GROUP BY "account_move_line".account_id, period
+            ) sub
+        """, [period_thresholds] + select_params + where_params)
+        return self.env.cr.fetchall()
 
     def get_html(self, options, line_id=None, additional_context=None):
         if additional_context is None:
@@ -281,15 +451,12 @@ class BudgetReport(models.AbstractModel):
         column_number = (len(daterange_list) + 1) * 4 if is_profit_budget else (len(daterange_list)) * 4
 
         # to quickly get actual data
-        if daterange_list and is_profit_budget:
-            index_dict = self._create_index_dict(daterange_list[0][0], daterange_list[-1][1])
-        else:
-            index_dict = {}
-        actual_data_length = (len(daterange_list) + 1) if is_profit_budget else len(daterange_list) 
+        budget_matrix = self._get_budget_matrix(financial_report.line_ids, crossovered_budget, daterange_list,
+                                                is_profit_budget, financial_report, currency_table)
 
         # # get lines
         lines = self._get_dict_lines(financial_report.line_ids, column_number, crossovered_budget, daterange_list,
-                                     financial_report, currency_table, is_profit_budget, index_dict, actual_data_length)
+                                     financial_report, currency_table, is_profit_budget, budget_matrix)
 
         # add more options
         options.update({
@@ -452,6 +619,24 @@ class BudgetReport(models.AbstractModel):
             result += lines
         return result
 
+    @api.model
+    def _get_budget_values(self, practical_amounts, planned_amounts, green_on_positive):
+        """
+        Same as `_get_budget_value` for every period at once
+        :param practical_amounts: actual amount of each period
+        :type practical_amounts: numpy.ndarray
+        :param planned_amounts: planned amount of each period
+        :type planned_amounts: numpy.ndarray
+        :return: actual, budget, variance and % of budget of each period, one after the other
+        :rtype: list
+        """
+        # Adding 0 turns -0.0 into 0.0
+        practical_amounts = (practical_amounts if green_on_positive else -practical_amounts) + 0
+        percentages = np.divide(practical_amounts, planned_amounts, out=np.zeros_like(practical_amounts),
+                                where=planned_amounts != 0) * 100 + 0
+        return np.column_stack([practical_amounts, planned_amounts, practical_amounts - planned_amounts,
+                                percentages]).ravel().tolist()
+
     @api.model
     def _get_budget_value(self, practical_amount, planned_amount, green_on_positive):
         practical_amount = practical_amount * -1 if not green_on_positive and practical_amount else practical_amount
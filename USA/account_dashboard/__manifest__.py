@@ -33,6 +33,7 @@
         'data/digest_data.xml',
         'data/inherited_digest_template_data.xml',
         'data/account_journal_data.xml',
+        'data/ir_cron_data.xml',
 
         'views/assets.xml',
         'views/account_dashboard_views.xml',
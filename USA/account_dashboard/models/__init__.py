@@ -6,3 +6,6 @@ from . import personalized_kpi_info
 from . import inherited_account_journal
 from . import inherited_digest
 from . import inherited_account_move_line
+from . import account_dashboard_summary
+from . import inherited_account_move
+from . import inherited_account_account
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import api, fields, models
+from odoo.osv import expression
+from odoo.tools import create_index
+
+from ..utils.time_utils import BY_MONTH
+
+
+# Fields of the journal items summed in the summary
+SUMMARY_LINE_FIELDS = ['move_id', 'account_id', 'company_id', 'date', 'debit', 'credit', 'balance',
+                       'exclude_from_invoice_tab', 'parent_state']
+
+# Posted journal items summed by company, account, account type and day, with their sales amount
+SUMMARY_SELECT = """
+    SELECT aml.company_id, aml.account_id, aa.user_type_id, aml.date,
+        %(sign)s * SUM(aml.debit), %(sign)s * SUM(aml.credit), %(sign)s * SUM(aml.balance),
+        %(sign)s * COALESCE(-SUM(aml.balance) FILTER (
+            WHERE am.type = 'out_invoice' AND NOT COALESCE(aml.exclude_from_invoice_tab, FALSE)), 0)
+    FROM account_move_line aml
+        JOIN account_move am ON am.id = aml.move_id
+        JOIN account_account aa ON aa.id = aml.account_id
+    WHERE {}
+    GROUP BY aml.company_id, aml.account_id, aa.user_type_id, aml.date
+"""
+
+
+class AccountDashboardSummaryDelta(models.Model):
+    """
+    Change of the summary logged when journal items are posted, reset to draft or changed while posted. The
+    log is insert only, so posting moves never waits on the rows of the summary shared by other postings.
+    """
+    _name = 'account.dashboard.summary.delta'
+    _description = 'Account Dashboard Summary Delta'
+    _log_access = False
+
+    company_id = fields.Many2one('res.company', string='Company', required=True, ondelete='cascade')
+    account_id = fields.Many2one('account.account', string='Account', required=True, ondelete='cascade')
+    user_type_id = fields.Many2one('account.account.type', string='Account Type', required=True)
+    date = fields.Date(string='Date', required=True)
+    debit = fields.Float(string='Debit')
+    credit = fields.Float(string='Credit')
+    balance = fields.Float(string='Balance')
+    sale_amount = fields.Float(string='Untaxed Sales')
+
+    @api.model
+    def _log_move_lines(self, moves=None, lines=None, sign=1):
+        """
+        Log the posted journal items of moves, or some posted journal items
+        :param sign: 1 when the journal items are added to the summary, -1 when they are removed from it
+        """
+        if not moves and not lines:
+            return
+        self.env['account.move.line'].flush(SUMMARY_LINE_FIELDS)
+        self.env['account.move'].flush(['type'])
+        self.env['account.account'].flush(['user_type_id'])
+        if moves:
+            where_clause, params = "aml.move_id IN %(ids)s", {'ids': tuple(moves.ids)}
+        else:
+            where_clause, params = "aml.id IN %(ids)s", {'ids': tuple(lines.ids)}
+        params['sign'] = sign
+        self.env.cr.execute("""
+            INSERT INTO account_dashboard_summary_delta
+                (company_id, account_id, user_type_id, date, debit, credit, balance, sale_amount)
+        """ + SUMMARY_SELECT.format("aml.parent_state = 'posted' AND " + where_clause), params)
+
+
+class AccountDashboardSummary(models.Model):
+    """
+    Posted journal items summed by company, account, account type and day, so the graphs of the dashboard
+    aggregate a few rows per account and day instead of every journal item. Posting only logs deltas, the cron
+    is the only writer of the summary: it folds the deltas every few minutes and builds the summary again every
+    night, which also catches the changes of posted journal items which were not logged.
+    """
+    _name = 'account.dashboard.summary'
+    _description = 'Account Dashboard Daily Summary'
+    _log_access = False
+    _order = 'date, company_id, account_id'
+
+    company_id = fields.Many2one('res.company', string='Company', required=True, ondelete='cascade')
+    account_id = fields.Many2one('account.account', string='Account', required=True, ondelete='cascade')
+    user_type_id = fields.Many2one('account.account.type', string='Account Type', required=True)
+    date = fields.Date(string='Date', required=True)
+    debit = fields.Float(string='Debit')
+    credit = fields.Float(string='Credit')
+    balance = fields.Float(string='Balance')
+    sale_amount = fields.Float(string='Untaxed Sales', help='Untaxed amount of the customer invoices')
+
+    _sql_constraints = [
+        ('company_account_type_date_uniq', 'unique(company_id, account_id, user_type_id, date)',
+         'An account can only have one summary per company and day!'),
+    ]
+
+    def init(self):
+        create_index(self._cr, 'account_dashboard_summary_company_type_date_index', self._table,
+                     ['company_id', 'user_type_id', 'date'])
+        self._cr.execute("SELECT 1 FROM account_dashboard_summary LIMIT 1")
+        if not self._cr.fetchone():
+            self._rebuild_summary()
+
+    @api.model
+    def _rebuild_summary(self):
+        """
+        Build the summary again from the posted journal items, the deltas logged so far are included in it
+        """
+        self.env['account.move.line'].flush(SUMMARY_LINE_FIELDS)
+        self.env['account.move'].flush(['type'])
+        self.env['account.account'].flush(['user_type_id'])
+        self.env['account.dashboard.summary.delta'].flush()
+        self.env.cr.execute("""
+            DELETE FROM account_dashboard_summary_delta;
+            DELETE FROM account_dashboard_summary;
+            INSERT INTO account_dashboard_summary
+                (company_id, account_id, user_type_id, date, debit, credit, balance, sale_amount)
+        """ + SUMMARY_SELECT.format("aml.parent_state = 'posted'"), {'sign': 1})
+        self.invalidate_cache()
+
+    @api.model
+    def _fold_deltas(self):
+        """
+        Add the logged deltas to the summary and remove them. The rows are upserted in a fixed order, so that
+        two folds can never lock the same rows in a different order.
+        """
+        self.flush()
+        self.env['account.dashboard.summary.delta'].flush()
+        self.env.cr.execute("""
+            WITH deltas AS (
+                DELETE FROM account_dashboard_summary_delta
+                RETURNING company_id, account_id, user_type_id, date, debit, credit, balance, sale_amount
+            )
+            INSERT INTO account_dashboard_summary AS s
+                (company_id, account_id, user_type_id, date, debit, credit, balance, sale_amount)
+            SELECT company_id, account_id, user_type_id, date, SUM(debit), SUM(credit), SUM(balance),
+                SUM(sale_amount)
+            FROM deltas
+            GROUP BY company_id, account_id, user_type_id, date
+            ORDER BY account_id, date, company_id, user_type_id
+            ON CONFLICT (company_id, account_id, user_type_id, date) DO UPDATE SET
+                debit = s.debit + EXCLUDED.debit,
+                credit = s.credit + EXCLUDED.credit,
+                balance = s.balance + EXCLUDED.balance,
+                sale_amount = s.sale_amount + EXCLUDED.sale_amount
+        """)
+        self.invalidate_cache()
+
+    @api.model
+    def _cron_fold_deltas(self):
+        self._fold_deltas()
+
+    @api.model
+    def _cron_rebuild_summary(self):
+        self._rebuild_summary()
+
+    @api.model
+    def _update_account_types(self, accounts):
+        """
+        Move the summary and the deltas of accounts to their current account type
+        """
+        self.flush()
+        self.env['account.dashboard.summary.delta'].flush()
+        self.env['account.account'].flush(['user_type_id'])
+        self.env.cr.execute("""
+            UPDATE account_dashboard_summary_delta d SET user_type_id = aa.user_type_id
+            FROM account_account aa
+            WHERE aa.id = d.account_id AND aa.id IN %(account_ids)s AND d.user_type_id != aa.user_type_id;
+
+            INSERT INTO account_dashboard_summary_delta
+                (company_id, account_id, user_type_id, date, debit, credit, balance, sale_amount)
+            SELECT s.company_id, s.account_id, aa.user_type_id, s.date, s.debit, s.credit, s.balance, s.sale_amount
+            FROM account_dashboard_summary s
+            JOIN account_account aa ON aa.id = s.account_id
+            WHERE aa.id IN %(account_ids)s AND s.user_type_id != aa.user_type_id
+            UNION ALL
+            SELECT s.company_id, s.account_id, s.user_type_id, s.date, -s.debit, -s.credit, -s.balance,
+                -s.sale_amount
+            FROM account_dashboard_summary s
+            JOIN account_account aa ON aa.id = s.account_id
+            WHERE aa.id IN %(account_ids)s AND s.user_type_id != aa.user_type_id
+        """, {'account_ids': tuple(accounts.ids)})
+        self.env['account.dashboard.summary.delta'].invalidate_cache()
+
+    @api.model
+    def _get_summary_table(self):
+        """
+        :return: query of the summary with the deltas which are not folded yet
+        :rtype: str
+        """
+        self.flush()
+        self.env['account.dashboard.summary.delta'].flush()
+        return """(
+            SELECT company_id, account_id, user_type_id, date, debit, credit, balance, sale_amount
+            FROM account_dashboard_summary
+            UNION ALL
+            SELECT company_id, account_id, user_type_id, date, debit, credit, balance, sale_amount
+            FROM account_dashboard_summary_delta
+        )"""
+
+    @api.model
+    def _get_account_domain(self, domain):
+        """
+        Translate a domain on journal items that only filters on their account into a domain on accounts
+        :return: domain on account.account, None when the domain uses other fields of the journal items
+        """
+        account_domain = []
+        for leaf in expression.normalize_domain(domain):
+            if expression.is_operator(leaf) or tuple(leaf) in [expression.TRUE_LEAF, expression.FALSE_LEAF]:
+                account_domain.append(leaf)
+                continue
+            field_name = leaf[0]
+            if field_name == 'account_id':
+                account_domain.append(('id', leaf[1], leaf[2]))
+            elif field_name.startswith('account_id.'):
+                account_domain.append((field_name[len('account_id.'):], leaf[1], leaf[2]))
+            else:
+                return None
+        return account_domain
+
+    @api.model
+    def get_series(self, date_from, date_to, period_type=BY_MONTH, company_ids=None, user_type_ids=None,
+                   account_ids=None):
+        """ Sum the summary by period, the result has the same shape as the aggregations of journal items
+        used by the graphs
+
+        :param date_from:
+        :param date_to:
+        :param period_type: date part used to group the days
+        :param company_ids: companies to summarize, the allowed companies by default
+        :param user_type_ids: account types to summarize, all of them by default
+        :param account_ids: accounts to summarize, all of them by default
+        :return: one dictionary per period, ordered by date
+        :rtype: list
+        """
+        conditions = ["s.date >= %s", "s.date <= %s", "s.company_id IN %s"]
+        params = [period_type, date_from, date_to, tuple(company_ids or self.env.companies.ids)]
+        if user_type_ids is not None:
+            conditions.append("s.user_type_id IN %s")
+            params.append(tuple(user_type_ids) or (None,))
+        if account_ids is not None:
+            conditions.append("s.account_id IN %s")
+            params.append(tuple(account_ids) or (None,))
+        self.env.cr.execute("""
+            SELECT date_part('year', s.date) AS year,
+                date_part(%s, s.date) AS period,
+                MIN(s.date) AS date_in_period,
+                SUM(s.balance) AS total_balance,
+                SUM(s.credit) AS total_credit,
+                SUM(s.debit) AS total_debit,
+                SUM(s.sale_amount) AS total_sale_amount
+            FROM {} s
+            WHERE {}
+            GROUP BY year, period
+            ORDER BY year, period
+        """.format(self._get_summary_table(), ' AND '.join(conditions)), params)
+        return self.env.cr.dictfetchall()
+
+    @api.model
+    def get_balance(self, date_to, user_type_ids, company_ids):
+        """
+        :return: balance of the accounts of some types at a date
+        :rtype: float
+        """
+        self.env.cr.execute("""
+            SELECT COALESCE(SUM(s.balance), 0)
+            FROM {} s
+            WHERE s.date <= %s AND s.user_type_id IN %s AND s.company_id IN %s
+        """.format(self._get_summary_table()), (date_to, tuple(user_type_ids), tuple(company_ids)))
+        return self.env.cr.fetchone()[0]
+
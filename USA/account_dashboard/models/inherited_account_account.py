@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import models
+
+
+class AccountAccount(models.Model):
+    _inherit = 'account.account'
+
+    def write(self, vals):
+        res = super(AccountAccount, self).write(vals)
+        if 'user_type_id' in vals:
+            self.env['account.dashboard.summary'].sudo()._update_account_types(self)
+        return res
@@ -61,8 +61,8 @@ class AccountJournal(models.Model):
             if journal_type in ['bank']:
                 labels = []
                 graph_data = [
-                    get_barchart_format([record.get_balance_per_book()], _('Balance per Book'), COLOR_BOOK),
-                    get_barchart_format([record.get_balance_per_bank()], _('Balance per Bank'), COLOR_BANK),
+                    get_barchart_format([record.balance_per_book], _('Balance per Book'), COLOR_BOOK),
+                    get_barchart_format([record.balance_per_bank], _('Balance per Bank'), COLOR_BANK),
                 ]
                 selection = []
                 function_retrieve = ''
@@ -81,6 +81,73 @@ class AccountJournal(models.Model):
                        {'n': 'Last Fiscal Year', 'd': -1, 't': BY_FISCAL_YEAR}, ]
     default_period_by_month = 'This Fiscal Year'
     kanban_right_info_graph = fields.Text(compute='_kanban_right_info_graph')
+    # Computed together for all the journals read in the request, and cached for the rest of it
+    balance_per_book = fields.Float(compute='_compute_liquidity_balances')
+    balance_per_bank = fields.Float(compute='_compute_liquidity_balances')
+    outstanding_balance = fields.Float(compute='_compute_liquidity_balances',
+                                       help='Posted lines of the journal accounts not reconciled with the bank yet')
+
+    def _compute_liquidity_balances(self):
+        balances = self._get_liquidity_balances()
+        for record in self:
+            record.balance_per_book, record.balance_per_bank, record.outstanding_balance = \
+                balances.get(record.id, (0, 0, 0))
+
+    def _get_liquidity_balances(self):
+        """ Compute the balances of the bank and cash journals in one query
+
+        :return: {journal id: (balance per book, balance of the last statement, outstanding balance)}
+        """
+        journals = self.filtered(lambda journal: journal.type in ['bank', 'cash'])
+        if not journals:
+            return {}
+        journal_ids, account_ids, use_amount_currency = [], [], []
+        for journal in journals:
+            in_currency = bool(journal.currency_id and journal.currency_id != journal.company_id.currency_id)
+            for account_id in {journal.default_debit_account_id.id, journal.default_credit_account_id.id} - {False}:
+                journal_ids.append(journal.id)
+                account_ids.append(account_id)
+                use_amount_currency.append(in_currency)
+
+        self.env['account.move.line'].flush(['account_id', 'move_id', 'balance', 'amount_currency', 'bank_reconciled'])
+        self.env['account.move'].flush(['date', 'state'])
+        self.env['account.bank.statement'].flush(['journal_id', 'date', 'balance_end'])
+        query = """
+            WITH journal_account AS (
+                SELECT * FROM unnest(%(journal_ids)s::int[], %(account_ids)s::int[], %(use_amount_currency)s::bool[])
+                    AS t(journal_id, account_id, use_amount_currency)
+            ),
+            book AS (
+                SELECT ja.journal_id,
+                    SUM(CASE WHEN ja.use_amount_currency THEN aml.amount_currency ELSE aml.balance END) AS balance,
+                    SUM(CASE WHEN ja.use_amount_currency THEN aml.amount_currency ELSE aml.balance END)
+                        FILTER (WHERE aml.bank_reconciled IS NOT TRUE) AS outstanding
+                FROM journal_account ja
+                    JOIN account_move_line aml ON aml.account_id = ja.account_id
+                    JOIN account_move move ON aml.move_id = move.id
+                WHERE move.date <= %(date)s AND move.state = 'posted'
+                GROUP BY ja.journal_id
+            ),
+            statement AS (
+                SELECT DISTINCT ON (st.journal_id) st.journal_id, st.balance_end
+                FROM account_bank_statement st
+                WHERE st.journal_id IN %(journals)s
+                ORDER BY st.journal_id, st.date DESC, st.id DESC
+            )
+            SELECT j.id, COALESCE(book.balance, 0), COALESCE(statement.balance_end, 0), COALESCE(book.outstanding, 0)
+            FROM unnest(%(journal_list)s::int[]) AS j(id)
+                LEFT JOIN book ON book.journal_id = j.id
+                LEFT JOIN statement ON statement.journal_id = j.id
+        """
+        self.env.cr.execute(query, {
+            'journal_ids': journal_ids,
+            'account_ids': account_ids,
+            'use_amount_currency': use_amount_currency,
+            'date': fields.Date.today(),
+            'journals': tuple(journals.ids),
+            'journal_list': journals.ids,
+        })
+        return {journal_id: (book, bank, outstanding) for journal_id, book, bank, outstanding in self.env.cr.fetchall()}
 
     def get_general_kanban_section_data(self):
         data = []
@@ -195,45 +262,11 @@ class AccountJournal(models.Model):
 
     def get_balance_per_book(self):
         self.ensure_one()
-        account_sum = 0
-        if self.type in ['bank', 'cash']:
-            # Get the number of items to reconcile for that bank journal
-            query = """
-                SELECT COUNT(DISTINCT(line.id))
-                FROM account_bank_statement_line AS line
-                    LEFT JOIN account_bank_statement AS st ON line.statement_id = st.id
-                WHERE st.journal_id IN %s AND
-                    st.state = 'open' AND
-                    line.amount != 0.0 AND
-                    line.account_id IS NULL AND
-                    NOT EXISTS (SELECT 1 FROM account_move_line aml WHERE aml.statement_line_id = line.id)
-            """
-            self.env.cr.execute(query, (tuple(self.ids),))
-
-            # optimization to read sum of balance from account_move_line
-            account_ids = tuple(
-                ac for ac in [self.default_debit_account_id.id, self.default_credit_account_id.id] if ac)
-            if account_ids:
-                amount_field = 'aml.balance' if (not self.currency_id or self.currency_id == self.company_id.currency_id) else 'aml.amount_currency'
-                query = """
-                    SELECT sum(%s)
-                    FROM account_move_line aml LEFT JOIN account_move move ON aml.move_id = move.id
-                    WHERE aml.account_id in %%s AND move.date <= %%s AND move.state = 'posted';
-                """ % (amount_field,)
-                self.env.cr.execute(query, (account_ids, fields.Date.today(),))
-                query_results = self.env.cr.dictfetchall()
-
-                if query_results and query_results[0].get('sum') is not None:
-                    account_sum = query_results[0].get('sum')
-        return account_sum
+        return self.balance_per_book
 
     def get_balance_per_bank(self):
         self.ensure_one()
-        last_balance = 0
-        if self.type in ['bank', 'cash']:
-            last_bank_stmt = self.env['account.bank.statement'].search([('journal_id', 'in', self.ids)], order="date desc, id desc", limit=1)
-            last_balance = last_bank_stmt and last_bank_stmt[0].balance_end or 0
-        return last_balance
+        return self.balance_per_bank
 
     ########################################################
     # GENERAL FUNCTIONS
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+
+from odoo import models
+
+
+class AccountMove(models.Model):
+    _inherit = 'account.move'
+
+    def post(self):
+        res = super(AccountMove, self).post()
+        self.env['account.dashboard.summary.delta'].sudo()._log_move_lines(moves=self)
+        return res
+
+    def button_draft(self):
+        self.env['account.dashboard.summary.delta'].sudo()._log_move_lines(
+            moves=self.filtered(lambda move: move.state == 'posted'), sign=-1)
+        return super(AccountMove, self).button_draft()
@@ -4,15 +4,31 @@
 from ..utils.time_utils import BY_MONTH
 from odoo import api, fields, models
 
+# Fields of the journal items changing the dashboard summary
+SUMMARY_FIELDS = {'account_id', 'company_id', 'date', 'debit', 'credit', 'balance', 'exclude_from_invoice_tab'}
+
 
 class AccountMoveLine(models.Model):
     _inherit = "account.move.line"
 
+    def write(self, vals):
+        posted_lines = self.filtered(lambda line: line.parent_state == 'posted') \
+            if SUMMARY_FIELDS.intersection(vals) else self.browse()
+        if not posted_lines:
+            return super(AccountMoveLine, self).write(vals)
+        # Remove the posted lines from the dashboard summary as they were, then add them back as they are
+        Delta = self.env['account.dashboard.summary.delta'].sudo()
+        Delta._log_move_lines(lines=posted_lines, sign=-1)
+        res = super(AccountMoveLine, self).write(vals)
+        Delta._log_move_lines(lines=posted_lines)
+        return res
+
     ########################################################
     # GENERAL FUNCTION
     ########################################################
     def summarize_group_account(self, date_from, date_to, period_type=BY_MONTH, expenses_domain=[]):
-        """
+        """ Sum the journal items matching a domain by period, from the dashboard summary when the
+        domain only filters on the account
 
         :param date_from:
         :param date_to:
@@ -20,6 +36,11 @@ class AccountMoveLine(models.Model):
         :param expenses_domain:
         :return:
         """
+        Summary = self.env['account.dashboard.summary']
+        account_domain = Summary._get_account_domain(expenses_domain)
+        if account_domain is not None:
+            accounts = self.env['account.account'].with_context(active_test=False).search(account_domain)
+            return Summary.get_series(date_from, date_to, period_type, account_ids=accounts.ids)
         _, extend_condition_clause, extend_where_params = self.env['account.move.line']._query_get(domain=expenses_domain)
         return self.get_group_account_move_line(date_from, date_to, period_type, extend_condition_clause, extend_where_params)
 
@@ -561,41 +561,8 @@ class USAJournal(models.Model):
         date_to = datetime.strptime(date_to, '%Y-%m-%d')
         periods = get_list_period_by_type(self, date_from, date_to, period_type)
 
-        currency = """
-            SELECT c.id, COALESCE((
-                SELECT r.rate
-                FROM res_currency_rate r
-                WHERE r.currency_id = c.id AND r.name <= %s AND (r.company_id IS NULL OR r.company_id IN %s)
-                ORDER BY r.company_id, r.name DESC
-                LIMIT 1), 1.0) AS rate
-            FROM res_currency c
-        """
-
-        transferred_currency = """
-            SELECT ai.invoice_date, ai.type, c.rate * ai.amount_untaxed AS amount_tran, state, company_id
-            FROM account_move AS ai
-                LEFT JOIN ({currency_table}) AS c ON ai.currency_id = c.id
-        """.format(currency_table=currency)
-
-        query = """
-            SELECT date_part('year', aic.invoice_date::DATE) AS year,
-                date_part(%s, aic.invoice_date::DATE) AS period,
-                MIN(aic.invoice_date) AS date_in_period,
-                SUM(aic.amount_tran) AS amount_untaxed
-            FROM ({transferred_currency_table}) AS aic
-            WHERE invoice_date >= %s AND
-                invoice_date <= %s AND
-                aic.state = 'posted' AND
-                aic.type = 'out_invoice' AND
-                aic.company_id IN %s
-            GROUP BY year, period
-            ORDER BY year, period;
-        """.format(transferred_currency_table=transferred_currency)
-
         company_ids = get_list_companies_child(self.env.company)
-        name = fields.Date.today()
-        self.env.cr.execute(query, (period_type, name, tuple(company_ids), date_from, date_to, tuple(company_ids),))
-        data_fetch = self.env.cr.dictfetchall()
+        data_fetch = self.env['account.dashboard.summary'].get_series(date_from, date_to, period_type, company_ids)
 
         data_list = [[], []]
         graph_label = []
@@ -613,7 +580,7 @@ class USAJournal(models.Model):
                 index += 1
 
             if index < len(periods):
-                value = data.get('amount_untaxed', False)
+                value = data.get('total_sale_amount', False)
                 values = [
                     value if not isinstance(value, bool) and periods[index][0] <= today else 'NaN',
                     value if not isinstance(value, bool) and periods[index][1] >= today else 'NaN'
@@ -657,28 +624,9 @@ class USAJournal(models.Model):
         date_to = datetime.strptime(date_to, '%Y-%m-%d')
         periods = get_list_period_by_type(self, date_from, date_to, period_type)
         type_account_id = self.env.ref('account.data_account_type_liquidity').id
-        query = """
-            SELECT date_part('year', aml.date::DATE) AS year,
-                date_part(%s, aml.date::DATE) AS period,
-                MIN(aml.date) AS date_in_period,
-                SUM(aml.debit) AS total_debit,
-                SUM(aml.credit) AS total_credit
-            FROM account_move_line AS aml
-                INNER JOIN account_move AS am ON aml.move_id = am.id
-                INNER JOIN account_account AS aa ON aml.account_id = aa.id
-                INNER JOIN account_account_type AS aat ON aa.user_type_id = aat.id
-            WHERE aml.date >= %s AND 
-                aml.date <= %s AND
-                am.state = 'posted' AND
-                aat.id = %s AND 
-                aml.company_id IN %s
-            GROUP BY year, period
-            ORDER BY year, period;
-        """
-
         company_ids = get_list_companies_child(self.env.company)
-        self.env.cr.execute(query, (period_type, date_from, date_to, type_account_id, tuple(company_ids),))
-        data_fetch = self.env.cr.dictfetchall()
+        data_fetch = self.env['account.dashboard.summary'].get_series(date_from, date_to, period_type, company_ids,
+                                                                      user_type_ids=[type_account_id])
 
         data_list = [[], [], []]
         graph_label = []
@@ -743,20 +691,6 @@ class USAJournal(models.Model):
                 data_dict[key][side] = data['amount']
             return data_dict
 
-        def _get_bank_balance(date, account_type, company_ids):
-            query = """SELECT COALESCE(SUM(aml.balance), 0) as balance
-                        FROM account_move_line as aml
-                        INNER JOIN account_move as am
-                            ON aml.move_id = am.id
-                        INNER JOIN account_account as aa
-                            ON aml.account_id = aa.id
-                        WHERE aml.date <= %s AND
-                              am.state = 'posted' AND
-                              aa.user_type_id = %s AND 
-                              aml.company_id IN %s;"""
-            self.env.cr.execute(query, (date, account_type, tuple(company_ids)))
-            return self.env.cr.dictfetchall()
-
         def _get_account_balance(where, period_type, date_from, date_to, reconcile_acc_id, liquidity_account_id, company_ids):
             query = """
                 SELECT date_part('year', aml.date_maturity) AS year,
@@ -787,7 +721,8 @@ class USAJournal(models.Model):
                                             payable_account_id, liquidity_account_id, company_ids)
         data_dict = _update_data_dict(data_dict, data_payable, 'payable')
 
-        opening_balance = _get_bank_balance(date_from, liquidity_account_id, company_ids)[0]['balance']
+        opening_balance = self.env['account.dashboard.summary'].get_balance(date_from, [liquidity_account_id],
+                                                                            company_ids)
 
         recurring_cashin = forecast_dashboard.recurring_cashin
         recurring_cashout = forecast_dashboard.recurring_cashout * -1
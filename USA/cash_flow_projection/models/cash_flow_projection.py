@@ -82,6 +82,9 @@ class CashFlowProjection(models.TransientModel):
             })
         # Query accounts thar appear in the cash flow projection report
         transaction_list_in, transaction_list_out = self._get_default_lines(options)
+        # Query the amounts of all periods and the values saved by users at once
+        period_amounts = self._get_cash_lines_by_period(date_list, period_unit, options)
+        user_values = self._get_user_values(period_unit)
         for date_period in date_list:
             i = date_period.get('period_order', 0)
             is_due_period = date_period.get('is_due_period', False)
@@ -89,46 +92,13 @@ class CashFlowProjection(models.TransientModel):
             period_end_date = date_period.get('end_date', fields.Date.today())
             # Get period name
             period_name = self._get_period_name(period_start_date, period_end_date, period_unit, is_due_period)
-            # Query cash in lines and render them in order to show in the report
-            cash_in_lines = self.get_cash_in_lines(period_start_date, period_end_date, options)
-            rendered_in_lines = []
-            for transaction in transaction_list_in:
-                amount = self._get_user_value(period_name, period_unit, 'cash_in', transaction['transaction_code'],
-                                              is_due_period)
-                rendered_in_lines.append({
-                    'transaction_name': transaction['transaction_name'],
-                    'transaction_code': transaction['transaction_code'],
-                    'has_user_value': amount != 0,
-                    'amount': amount,
-                })
-            for line in cash_in_lines:
-                transaction = [account for account in transaction_list_in if
-                               line['transaction_code'] == account['transaction_code']]
-                if not len(transaction):
-                    continue
-                index = transaction_list_in.index(transaction[0])
-                if not rendered_in_lines[index]['has_user_value']:
-                    rendered_in_lines[index]['amount'] = line['amount']
-            # Query cash out lines and render them in order to show in the report
-            cash_out_lines = self.get_cash_out_lines(period_start_date, period_end_date, options)
-            rendered_out_lines = []
-            for transaction in transaction_list_out:
-                amount = self._get_user_value(period_name, period_unit, 'cash_out', transaction['transaction_code'],
-                                              is_due_period)
-                rendered_out_lines.append({
-                    'transaction_name': transaction['transaction_name'],
-                    'transaction_code': transaction['transaction_code'],
-                    'has_user_value': amount != 0,
-                    'amount': amount,
-                })
-            for line in cash_out_lines:
-                transaction = [account for account in transaction_list_out if
-                               line['transaction_code'] == account['transaction_code']]
-                if not len(transaction):
-                    continue
-                index = transaction_list_out.index(transaction[0])
-                if not rendered_out_lines[index]['has_user_value']:
-                    rendered_out_lines[index]['amount'] = line['amount']
+            # Render cash in and cash out lines in order to show in the report
+            rendered_in_lines = self._render_period_lines(transaction_list_in, period_amounts.get((i, 'cash_in'), {}),
+                                                          user_values, period_name, period_unit, 'cash_in',
+                                                          is_due_period)
+            rendered_out_lines = self._render_period_lines(transaction_list_out,
+                                                           period_amounts.get((i, 'cash_out'), {}), user_values,
+                                                           period_name, period_unit, 'cash_out', is_due_period)
             # Create the dictionary which contains the information of the period to show in the report
             opening_balance = i < 0 and 0 or round(
                 i == 0 and self.get_opening_balance(today), 2) or 0.0
@@ -222,6 +192,51 @@ class CashFlowProjection(models.TransientModel):
             return value
         return record and record.value or 0.0
     
+    def _get_user_values(self, period_type):
+        """
+        Read all the values saved by users for a period type at once
+        @param period_type: type of the period ('day', 'week', 'month')
+        @return: a dictionary {(cash_type, transaction_code, period): value}
+        """
+        records = self.env['cash.flow.user.configuration'].sudo().search(
+            [('period_type', '=', period_type), ('company_id', '=', self.env.user.company_id.id)])
+        user_values = {}
+        redundant_records = self.env['cash.flow.user.configuration']
+        for record in records:
+            key = (record.cash_type, record.transaction_type.code, record.period)
+            if key in user_values:
+                redundant_records |= record
+                continue
+            user_values[key] = record.value
+        # Unlink redundant records
+        if redundant_records:
+            redundant_records.unlink()
+        return user_values
+    
+    def _render_period_lines(self, transactions, amounts, user_values, period, period_type, cash_type,
+                             is_due_period):
+        """
+        Render the lines of a period, the value saved by users takes precedence over the queried amount
+        @param transactions: the default lines of the cash type
+        @param amounts: the queried amount of each transaction code in the period
+        @param user_values: the values saved by users, see _get_user_values
+        @return: list of rendered lines
+        """
+        rendered_lines = []
+        for transaction in transactions:
+            code = transaction['transaction_code']
+            amount = 0.0
+            if not is_due_period:
+                amount = user_values.get((cash_type, code, period),
+                                         user_values.get((cash_type, code, period_type), 0.0))
+            rendered_lines.append({
+                'transaction_name': transaction['transaction_name'],
+                'transaction_code': code,
+                'has_user_value': amount != 0,
+                'amount': amount or amounts.get(code, amount),
+            })
+        return rendered_lines
+    
     @api.model
     def save_user_value(self, options):
         """
@@ -357,6 +372,57 @@ class CashFlowProjection(models.TransientModel):
             return result
         return []
     
+    def _get_cash_lines_by_period(self, date_list, period_type, options={}):
+        """
+        Query the cash in and cash out amounts of all periods in one query, the lines of the whole projection are
+        bucketed into the periods generated by generate_series
+        @param date_list: the periods of the projection
+        @param period_type: type of the period ('day', 'week', 'month')
+        @param options: options for filtering records
+        @return: a dictionary {(period_order, cash_type): {transaction_code: amount}}
+        """
+        regular_periods = [period for period in date_list if not period['is_due_period']]
+        if not regular_periods:
+            return {}
+        due_periods = [period for period in date_list if period['is_due_period']]
+        from_date = min(period['start_date'] for period in date_list)
+        to_date = max(period['end_date'] for period in date_list)
+        query_table = ["SELECT cast('cash_in' as text) as cash_type, temp.id, temp.amount, temp.cash_date "
+                       "FROM ({}) temp".format(stmt)
+                       for stmt in self._query_table_cash_in(from_date, to_date, options)]
+        query_table += ["SELECT cast('cash_out' as text) as cash_type, temp.id, temp.amount, temp.cash_date "
+                        "FROM ({}) temp".format(stmt)
+                        for stmt in self._query_table_cash_out(from_date, to_date, options)]
+        if not query_table:
+            return {}
+        query_stmt = """
+            WITH periods AS (
+                SELECT (ROW_NUMBER() OVER (ORDER BY ps) - 1)::int as period_order, ps::date as start_date,
+                    (ps + %(step)s::interval - interval '1 day')::date as end_date
+                FROM generate_series(%(start_date)s::timestamp, %(last_start_date)s::timestamp, %(step)s::interval) ps
+                UNION ALL
+                SELECT -1, %(due_start_date)s::date, %(due_end_date)s::date
+                WHERE %(has_due_period)s
+            ),
+            lines AS ({})
+            SELECT periods.period_order, lines.cash_type, lines.id as transaction_code,
+                ROUND(SUM(lines.amount), 2) as amount
+            FROM lines JOIN periods ON lines.cash_date >= periods.start_date AND lines.cash_date <= periods.end_date
+            GROUP BY periods.period_order, lines.cash_type, lines.id
+        """.format(' UNION ALL '.join('({})'.format(stmt) for stmt in query_table))
+        self.env.cr.execute(query_stmt, {
+            'step': '1 {}'.format(period_type if period_type in ['day', 'week'] else 'month'),
+            'start_date': regular_periods[0]['start_date'],
+            'last_start_date': regular_periods[-1]['start_date'],
+            'due_start_date': due_periods and due_periods[0]['start_date'] or None,
+            'due_end_date': due_periods and due_periods[0]['end_date'] or None,
+            'has_due_period': bool(due_periods),
+        })
+        result = {}
+        for line in self.env.cr.dictfetchall():
+            result.setdefault((line['period_order'], line['cash_type']), {})[line['transaction_code']] = line['amount']
+        return result
+    
     ####################################################################################################################
     #                                       QUERY CASH IN LINES                                                        #
     ####################################################################################################################
@@ -431,7 +497,7 @@ class CashFlowProjection(models.TransientModel):
         elif to_date < today:
             to_date = from_date - relativedelta(days=1)
         query_incoming_payment_lines = """
-            SELECT cast('future_customer_payment' as text) as id, cast('Future Customer Payments' as text) as name, aml.debit as amount, am.name as account_name, TO_CHAR(aml.date + aa.payment_lead_time, 'mm/dd/yyyy') as date, aml.id as line_id, aa.id as account_id, rp.name as partner_name
+            SELECT cast('future_customer_payment' as text) as id, cast('Future Customer Payments' as text) as name, aml.debit as amount, am.name as account_name, TO_CHAR(aml.date + aa.payment_lead_time, 'mm/dd/yyyy') as date, aml.id as line_id, aa.id as account_id, rp.name as partner_name, (aml.date + aa.payment_lead_time) as cash_date
             FROM account_move_line aml
                      JOIN account_account aa ON aml.account_id = aa.id
                      JOIN account_account_type aat ON aa.user_type_id = aat.id
@@ -455,14 +521,14 @@ class CashFlowProjection(models.TransientModel):
         """
         so_lead_time = self.env.user.company_id.customer_payment_lead_time
         query_so_lines = """
-             SELECT cast('sale_order' as text) as id, cast('Sales' as text) as name, so.amount_so_remaining as amount, so.name as account_name, TO_CHAR(so.date_order + interval '{}' day, 'mm/dd/yyyy') as date, so.id as line_id, so.id as account_id, rp.name as partner_name
+             SELECT cast('sale_order' as text) as id, cast('Sales' as text) as name, so.amount_so_remaining as amount, so.name as account_name, TO_CHAR(so.date_order + interval '{}' day, 'mm/dd/yyyy') as date, so.id as line_id, so.id as account_id, rp.name as partner_name, cast((so.date_order + interval '{}' day) as date) as cash_date
              FROM sale_order so LEFT JOIN res_partner rp ON so.partner_id = rp.id
              WHERE state NOT IN ('draft', 'cancel')
                             AND amount_so_remaining > 0
                             AND cast((date_order + interval '{}' day) as date) >= '{}'
                             AND cast((date_order + interval '{}' day) as date) <= '{}'
                             AND so.company_id = {}
-        """.format(so_lead_time, so_lead_time, from_date, so_lead_time, to_date, self.env.user.company_id.id)
+        """.format(so_lead_time, so_lead_time, so_lead_time, from_date, so_lead_time, to_date, self.env.user.company_id.id)
         return query_so_lines
     
     def _query_ar_invoice_lines(self, from_date, to_date):
@@ -473,7 +539,7 @@ class CashFlowProjection(models.TransientModel):
         :return: string the selection statement
         """
         query_ar_invoice_lines = """
-            SELECT cast('ar_invoice' as text) as id, cast('Receivable' as text) as name, aml1.amount_residual as amount, am.name as account_name, TO_CHAR(aml1.date_maturity, 'mm/dd/yyyy') as date, aml1.id as line_id, aml1.account_id, aml1.partner_name
+            SELECT cast('ar_invoice' as text) as id, cast('Receivable' as text) as name, aml1.amount_residual as amount, am.name as account_name, TO_CHAR(aml1.date_maturity, 'mm/dd/yyyy') as date, aml1.id as line_id, aml1.account_id, aml1.partner_name, aml1.date_maturity as cash_date
             FROM
                 (SELECT aml.amount_residual, aml.move_id, aml.date_maturity, aml.id, aa.id as account_id, rp.name as partner_name
                  FROM account_move_line aml JOIN account_account aa ON aml.account_id = aa.id
@@ -496,7 +562,7 @@ class CashFlowProjection(models.TransientModel):
         :return: string the selection statement
         """
         query_ar_credit_note_lines = """
-            SELECT cast('ar_credit_note' as text) as id, cast('Customer Credit Notes' as text) as name, aml1.amount_residual as amount, am.name as account_name, TO_CHAR(aml1.date_maturity, 'mm/dd/yyyy') as date, aml1.id as line_id, aml1.account_id, aml1.partner_name
+            SELECT cast('ar_credit_note' as text) as id, cast('Customer Credit Notes' as text) as name, aml1.amount_residual as amount, am.name as account_name, TO_CHAR(aml1.date_maturity, 'mm/dd/yyyy') as date, aml1.id as line_id, aml1.account_id, aml1.partner_name, aml1.date_maturity as cash_date
             FROM
                 (SELECT aml.amount_residual, aml.move_id, aml.date_maturity, aml.id, aa.id as account_id, rp.name as partner_name
                  FROM account_move_line aml JOIN account_account aa ON aml.account_id = aa.id
@@ -530,7 +596,7 @@ class CashFlowProjection(models.TransientModel):
         """
         query_other_lines = """SELECT cast('cash_in_other' as text) as id, cast('Others' as text) as name, cast('0' as int) as amount,
                 cast('Others' as text) as account_name, null as date, cast('0' as int) as line_id, cast('0' as int) as account_id,
-                null as partner_name
+                null as partner_name, null::date as cash_date
         """
         return query_other_lines
     
@@ -606,7 +672,7 @@ class CashFlowProjection(models.TransientModel):
         elif to_date < today:
             to_date = from_date - relativedelta(days=1)
         query_outgoing_payment_lines = """
-            SELECT cast('future_vendor_payment' as text) as id, cast('Future Vendor Payments' as text) as name, aml.credit as amount, am.name as account_name, TO_CHAR(aml.date + aa.payment_lead_time, 'mm/dd/yyyy') as date, aml.id as line_id, aa.id as account_id, rp.name as partner_name
+            SELECT cast('future_vendor_payment' as text) as id, cast('Future Vendor Payments' as text) as name, aml.credit as amount, am.name as account_name, TO_CHAR(aml.date + aa.payment_lead_time, 'mm/dd/yyyy') as date, aml.id as line_id, aa.id as account_id, rp.name as partner_name, (aml.date + aa.payment_lead_time) as cash_date
             FROM account_move_line aml
                       JOIN account_account aa ON aml.account_id = aa.id
                       JOIN account_account_type aat ON aa.user_type_id = aat.id
@@ -630,14 +696,14 @@ class CashFlowProjection(models.TransientModel):
         """
         po_lead_time = self.env.user.company_id.vendor_payment_lead_time
         query_po_lines = """
-            SELECT cast('purchase_order' as text) as id, cast('Purchases' as text) as name, po.amount_so_remaining as amount, po.name as account_name, TO_CHAR(po.date_approve + interval '{}' day, 'mm/dd/yyyy') as date, po.id as line_id, po.id as account_id, rp.name as partner_name
+            SELECT cast('purchase_order' as text) as id, cast('Purchases' as text) as name, po.amount_so_remaining as amount, po.name as account_name, TO_CHAR(po.date_approve + interval '{}' day, 'mm/dd/yyyy') as date, po.id as line_id, po.id as account_id, rp.name as partner_name, cast((po.date_approve + interval '{}' day) as date) as cash_date
             FROM purchase_order po LEFT JOIN res_partner rp ON po.partner_id = rp.id
             WHERE state NOT IN ('draft', 'cancel')
                        AND amount_so_remaining > 0
                        AND cast((date_approve + interval '{}' day) as date) >= '{}'
                        AND cast((date_approve + interval '{}' day) as date) <= '{}'
                        AND po.company_id = {}
-        """.format(po_lead_time, po_lead_time, from_date, po_lead_time, to_date, self.env.user.company_id.id)
+        """.format(po_lead_time, po_lead_time, po_lead_time, from_date, po_lead_time, to_date, self.env.user.company_id.id)
         return query_po_lines
     
     def _query_ap_invoice_lines(self, from_date, to_date):
@@ -648,7 +714,7 @@ class CashFlowProjection(models.TransientModel):
         :return: string the selection statement
         """
         query_ap_invoice_lines = """
-            SELECT cast('ap_invoice' as text) as id, cast('Payable' as text) as name, -aml1.amount_residual as amount, am.name as account_name, TO_CHAR(aml1.date_maturity, 'mm/dd/yyyy') as date, aml1.id as line_id, aml1.account_id, aml1.partner_name
+            SELECT cast('ap_invoice' as text) as id, cast('Payable' as text) as name, -aml1.amount_residual as amount, am.name as account_name, TO_CHAR(aml1.date_maturity, 'mm/dd/yyyy') as date, aml1.id as line_id, aml1.account_id, aml1.partner_name, aml1.date_maturity as cash_date
             FROM
                 (SELECT aml.amount_residual, aml.move_id, aml.date_maturity, aml.id, aa.id as account_id, rp.name as partner_name
                  FROM account_move_line aml JOIN account_account aa ON aml.account_id = aa.id
@@ -671,7 +737,7 @@ class CashFlowProjection(models.TransientModel):
         :return: string the selection statement
         """
         query_ap_credit_note_lines = """
-           SELECT cast('ap_credit_note' as text) as id, cast('Vendor Credit Notes' as text) as name, -aml1.amount_residual as amount, am.name as account_name, TO_CHAR(aml1.date_maturity, 'mm/dd/yyyy') as date, aml1.id as line_id, aml1.account_id, aml1.partner_name
+           SELECT cast('ap_credit_note' as text) as id, cast('Vendor Credit Notes' as text) as name, -aml1.amount_residual as amount, am.name as account_name, TO_CHAR(aml1.date_maturity, 'mm/dd/yyyy') as date, aml1.id as line_id, aml1.account_id, aml1.partner_name, aml1.date_maturity as cash_date
            FROM
                (SELECT aml.amount_residual, aml.move_id, aml.date_maturity, aml.id, aa.id as account_id, rp.name as partner_name
                 FROM account_move_line aml JOIN account_account aa ON aml.account_id = aa.id
@@ -705,6 +771,6 @@ class CashFlowProjection(models.TransientModel):
         """
         query_other_lines = """SELECT cast('cash_out_other' as text) as id, cast('Others' as text) as name, cast('0' as int) as amount,
                 cast('Others' as text) as account_name, null as date, cast('0' as int) as line_id, cast('0' as int) as account_id,
-                null as partner_name
+                null as partner_name, null::date as cash_date
         """
         return query_other_lines
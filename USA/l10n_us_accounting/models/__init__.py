@@ -2,6 +2,7 @@
 
 # Mixin class should be import inherited class
 from . import account_mixin
+from . import reference_tokens_mixin
 
 from . import res_partner
 from . import res_company
@@ -121,21 +121,27 @@ class BankReconciliationData(models.Model):
         self.ensure_one()
 
         # Mark AML and all reviewed bank statement lines as reconciled
-        reconciled_items = self.aml_ids.filtered(lambda x: x.temporary_reconciled)
-        reconciled_items.mark_bank_reconciled()
+        self.flush()
+        self.env['account.move.line'].flush(['temporary_reconciled', 'bank_reconciled'])
+        self._cr.execute("""
+            UPDATE account_move_line aml SET bank_reconciled = TRUE
+            FROM {relation} rel
+            WHERE rel.{column2} = aml.id AND rel.{column1} = %s AND aml.temporary_reconciled IS TRUE
+            RETURNING aml.id
+        """.format(**self._get_aml_relation()), (self.id,))
+        self._apply_bank_reconciled([aml_id for aml_id, in self._cr.fetchall()])
 
         # Create report
         self._create_report_line()
-        payments_uncleared = - sum(record.amount for record in self.payments_uncleared_ids)
-        deposits_uncleared = sum(record.amount for record in self.deposits_uncleared_ids)
+        totals = self._get_report_totals()
+        payments_uncleared = - totals['payments_uncleared']
+        deposits_uncleared = totals['deposits_uncleared']
         register_balance = self.ending_balance + payments_uncleared + deposits_uncleared
-        payment_count = len(self.payments_cleared_ids)
-        deposit_count = len(self.deposits_cleared_ids)
         self.write({'payments_uncleared': payments_uncleared,
                     'deposits_uncleared': deposits_uncleared,
                     'register_balance': register_balance,
-                    'payment_count': '(' + str(payment_count) + ')',
-                    'deposit_count': '(' + str(deposit_count) + ')',
+                    'payment_count': '(' + str(totals['payment_count']) + ')',
+                    'deposit_count': '(' + str(totals['deposit_count']) + ')',
                     'state': 'reconciled'})
 
         if self.journal_id.is_credit_card and self.ending_balance < 0:
@@ -175,18 +181,42 @@ class BankReconciliationData(models.Model):
 
         # Reset some fields
         prev_id = self.previous_reconciliation_id
+        self.env['account.bank.reconciliation.data.line'].flush()
+        self._cr.execute("DELETE FROM account_bank_reconciliation_data_line WHERE bank_reconciliation_data_id = %s",
+                         (prev_id.id,))
+        self.env['account.bank.reconciliation.data.line'].invalidate_cache()
+        prev_id.invalidate_cache()
         prev_id.with_context(undo_reconciliation=True).write({
             'state': 'draft',
             'ending_balance': self.ending_balance,
             'statement_ending_date': self.statement_ending_date,
-            'data_line_ids': [(5,)]
         })
 
         # Un-mark reconciled, don't change temporary_reconciled so they can still be marked in reconciliation screen
-        prev_id.aml_ids.filtered(lambda x: x.bank_reconciled).undo_bank_reconciled()
+        self.env['account.move.line'].flush(['bank_reconciled', 'payment_id', 'statement_line_id'])
+        relation = prev_id._get_aml_relation()
+        self._cr.execute("""
+            UPDATE account_move_line aml SET bank_reconciled = FALSE
+            FROM {relation} rel
+            WHERE rel.{column2} = aml.id AND rel.{column1} = %s AND aml.bank_reconciled IS TRUE
+            RETURNING aml.id, aml.payment_id
+        """.format(**relation), (prev_id.id,))
+        rows = self._cr.fetchall()
+        self._invalidate_bank_reconciled([aml_id for aml_id, payment_id in rows])
+        payment_ids = {payment_id for aml_id, payment_id in rows if payment_id}
+        self.env['account.payment'].browse(payment_ids).write({'state': 'posted'})
 
         # Reset status of all reconciled bank statement lines back to 'confirm'
-        prev_id.aml_ids.mapped('statement_line_id').filtered(lambda x: x.status == 'reconciled').write({'status': 'confirm'})
+        self.env['account.bank.statement.line'].flush(['status'])
+        self._cr.execute("""
+            SELECT DISTINCT st_line.id
+            FROM {relation} rel
+            JOIN account_move_line aml ON aml.id = rel.{column2}
+            JOIN account_bank_statement_line st_line ON st_line.id = aml.statement_line_id
+            WHERE rel.{column1} = %s AND st_line.status = 'reconciled'
+        """.format(**relation), (prev_id.id,))
+        self.env['account.bank.statement.line'].browse([st_line_id for st_line_id, in self._cr.fetchall()])\
+            .write({'status': 'confirm'})
 
         # Reverse discrepancy entry, if any
         if prev_id.discrepancy_entry_id:
@@ -220,24 +250,110 @@ class BankReconciliationData(models.Model):
                              'bank_reconciliation_data_id': data_id}
         return action
 
+    def _get_aml_relation(self):
+        """
+        Names of the table and columns of the many2many between the reconciliation and its journal items
+        """
+        field = self._fields['aml_ids']
+        return {'relation': field.relation, 'column1': field.column1, 'column2': field.column2}
+
+    def _invalidate_bank_reconciled(self, aml_ids):
+        """
+        Journal items have been (un)marked reconciled in SQL, recompute the fields depending on it
+        """
+        aml_ids = self.env['account.move.line'].browse(aml_ids)
+        aml_ids.invalidate_cache(['bank_reconciled'])
+        aml_ids.modified(['bank_reconciled'])
+
+    def _apply_bank_reconciled(self, aml_ids):
+        """
+        Same as mark_bank_reconciled of account.move.line for journal items already marked reconciled in SQL.
+        - Payments whose bank lines are all reconciled are marked reconciled.
+        - Bank statement lines whose journal items are all reconciled are marked reconciled.
+        """
+        self._invalidate_bank_reconciled(aml_ids)
+        if not aml_ids:
+            return
+        self.env['account.move.line'].flush(['should_be_reconciled', 'payment_id', 'statement_line_id'])
+        self._cr.execute("""
+            SELECT DISTINCT aml.payment_id
+            FROM account_move_line aml
+            WHERE aml.id IN %s AND aml.payment_id IS NOT NULL
+                AND NOT EXISTS (
+                    SELECT 1 FROM account_move_line line
+                    WHERE line.payment_id = aml.payment_id AND line.should_be_reconciled IS TRUE
+                        AND line.bank_reconciled IS NOT TRUE)
+        """, (tuple(aml_ids),))
+        self.env['account.payment'].browse([payment_id for payment_id, in self._cr.fetchall()])\
+            .write({'state': 'reconciled'})
+
+        self._cr.execute("""
+            SELECT DISTINCT aml.statement_line_id
+            FROM account_move_line aml
+            WHERE aml.id IN %s AND aml.statement_line_id IS NOT NULL
+                AND NOT EXISTS (
+                    SELECT 1 FROM account_move_line line
+                    WHERE line.statement_line_id = aml.statement_line_id AND line.should_be_reconciled IS TRUE
+                        AND line.bank_reconciled IS NOT TRUE)
+        """, (tuple(aml_ids),))
+        self.env['account.bank.statement.line'].browse([st_line_id for st_line_id, in self._cr.fetchall()])\
+            .write({'status': 'reconciled'})
+
     def _create_report_line(self):
         self.ensure_one()
         line_env = self.env['account.bank.reconciliation.data.line'].sudo()
-
-        for line in self.aml_ids:
-            line_env.create({
-                'aml_id': line.id,
-                'name': line.move_id.name,
-                'date': line.date,
-                'memo': line.name,
-                'check_number': line.payment_id.check_number if line.payment_id and line.payment_id.check_number else '',
-                'payee_id': line.partner_id.id if line.partner_id else False,
-                'amount': line.credit if line.credit > 0 else line.debit,
-                'amount_signed': line.credit if line.credit > 0 else (line.debit * -1),
-                'transaction_type': 'payment' if line.credit > 0 else 'deposit',
-                'is_cleared': line.temporary_reconciled,
-                'bank_reconciliation_data_id': self.id,
-            })
+        line_env.flush()
+        self.env['account.move.line'].flush(['move_id', 'date', 'name', 'payment_id', 'partner_id', 'debit', 'credit',
+                                             'temporary_reconciled'])
+        self.env['account.move'].flush(['name', 'state'])
+        self.env['account.payment'].flush(['check_number'])
+        self._cr.execute("""
+            INSERT INTO account_bank_reconciliation_data_line (
+                aml_id, name, date, memo, check_number, payee_id, amount, amount_signed, transaction_type, is_cleared,
+                bank_reconciliation_data_id, currency_id, change_status, current_amount, amount_change,
+                has_been_canceled, create_uid, create_date, write_uid, write_date)
+            SELECT
+                aml.id, move.name, aml.date, aml.name, COALESCE(NULLIF(payment.check_number, 0)::VARCHAR, ''),
+                aml.partner_id,
+                CASE WHEN aml.credit > 0 THEN aml.credit ELSE aml.debit END,
+                CASE WHEN aml.credit > 0 THEN aml.credit ELSE -aml.debit END,
+                CASE WHEN aml.credit > 0 THEN 'payment' ELSE 'deposit' END,
+                COALESCE(aml.temporary_reconciled, FALSE),
+                rel.{column1}, %s,
+                -- Same as compute_change_status of the line
+                CASE WHEN move.state = 'draft' THEN 'canceled' ELSE 'normal' END,
+                CASE WHEN move.state = 'draft' THEN 0 END,
+                CASE WHEN move.state = 'draft' THEN CASE WHEN aml.credit > 0 THEN aml.credit ELSE -aml.debit END END,
+                move.state = 'draft',
+                %s, now() at time zone 'UTC', %s, now() at time zone 'UTC'
+            FROM {relation} rel
+            JOIN account_move_line aml ON aml.id = rel.{column2}
+            JOIN account_move move ON move.id = aml.move_id
+            LEFT JOIN account_payment payment ON payment.id = aml.payment_id
+            WHERE rel.{column1} = %s
+        """.format(**self._get_aml_relation()), (self.env.company.currency_id.id, self.env.uid, self.env.uid, self.id))
+        line_env.invalidate_cache()
+        self.invalidate_cache()
+
+    def _get_report_totals(self):
+        """
+        :return: uncleared amounts and number of cleared transactions of the report
+        :rtype: dict
+        """
+        self.ensure_one()
+        self.env['account.bank.reconciliation.data.line'].flush()
+        self._cr.execute("""
+            SELECT
+                COALESCE(SUM(amount) FILTER (WHERE transaction_type = 'payment' AND is_cleared IS NOT TRUE), 0)
+                    AS payments_uncleared,
+                COALESCE(SUM(amount) FILTER (WHERE transaction_type = 'deposit' AND is_cleared IS NOT TRUE), 0)
+                    AS deposits_uncleared,
+                COUNT(*) FILTER (WHERE transaction_type = 'payment' AND is_cleared IS TRUE) AS payment_count,
+                COUNT(*) FILTER (WHERE transaction_type = 'deposit' AND is_cleared IS TRUE) AS deposit_count
+            FROM account_bank_reconciliation_data_line
+            WHERE bank_reconciliation_data_id = %s
+        """, (self.id,))
+        return self._cr.dictfetchone()
 
     def _reset_transactions(self, old_date=None, new_date=None):
         """ Reset transactions
@@ -245,15 +361,26 @@ class BankReconciliationData(models.Model):
         Used when reconcile, close without saving & change ending date
         Only reset transactions within a time frame (change ending date)
         """
-        account_ids = [self.journal_id.default_debit_account_id.id,
-                       self.journal_id.default_credit_account_id.id]
-        domain_date = [('date', '>', old_date), ('date', '<=', new_date)] if old_date else []
-
-        domain_aml = [('account_id', 'in', account_ids), ('bank_reconciled', '=', False)]
-        domain_aml.extend(domain_date)
-        aml_ids = self.env['account.move.line'].search(domain_aml)
-        aml_ids.filtered(lambda r: not r.statement_line_id and r.temporary_reconciled).write({'temporary_reconciled': False})
-        aml_ids.filtered(lambda r: r.statement_line_id and not r.temporary_reconciled).write({'temporary_reconciled': True})
+        account_ids = [account_id for account_id in [self.journal_id.default_debit_account_id.id,
+                                                     self.journal_id.default_credit_account_id.id] if account_id]
+        if not account_ids:
+            return
+        date_clause = 'AND date > %s AND date <= %s' if old_date else ''
+        date_params = [old_date, new_date] if old_date else []
+
+        # Only the journal items of a reviewed bank statement line stay marked
+        self.env['account.move.line'].flush(['account_id', 'bank_reconciled', 'date', 'statement_line_id',
+                                             'temporary_reconciled'])
+        self._cr.execute("""
+            UPDATE account_move_line SET temporary_reconciled = (statement_line_id IS NOT NULL)
+            WHERE account_id IN %s AND bank_reconciled IS NOT TRUE
+                AND temporary_reconciled IS DISTINCT FROM (statement_line_id IS NOT NULL)
+                {}
+            RETURNING id
+        """.format(date_clause), [tuple(account_ids)] + date_params)
+        aml_ids = self.env['account.move.line'].browse([aml_id for aml_id, in self._cr.fetchall()])
+        aml_ids.invalidate_cache(['temporary_reconciled'])
+        aml_ids.modified(['temporary_reconciled'])
 
     ############################
     #  CRUD
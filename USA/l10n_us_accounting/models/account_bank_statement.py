@@ -23,7 +23,7 @@ class AccountBankStatementUSA(models.Model):
 
 class AccountBankStatementLineUSA(models.Model):
     _name = 'account.bank.statement.line'
-    _inherit = ['account.bank.statement.line', 'mail.thread', 'mail.activity.mixin']
+    _inherit = ['account.bank.statement.line', 'mail.thread', 'mail.activity.mixin', 'usa.reference.tokens.mixin']
 
     # Override
     name = fields.Char(string='Description', track_visibility='onchange')
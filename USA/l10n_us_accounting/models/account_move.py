@@ -17,7 +17,8 @@ OPERATORS = {'<': py_operator.lt, '>': py_operator.gt, '<=': py_operator.le, '>=
 
 class AccountMoveUSA(models.Model):
     _name = 'account.move'
-    _inherit = ['account.move', 'mail.thread', 'mail.activity.mixin']
+    _inherit = ['account.move', 'mail.thread', 'mail.activity.mixin', 'usa.reference.tokens.mixin']
+    _reference_token_fields = ['name', 'ref']
 
     # Override
     state = fields.Selection(track_visibility='onchange')
@@ -452,7 +453,8 @@ class AccountMoveUSA(models.Model):
 
 
 class AccountMoveLineUSA(models.Model):
-    _inherit = 'account.move.line'
+    _name = 'account.move.line'
+    _inherit = ['account.move.line', 'usa.reference.tokens.mixin']
 
     # Technical fields
     temporary_reconciled = fields.Boolean(default=False, copy=False)
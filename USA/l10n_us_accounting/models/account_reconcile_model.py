@@ -247,26 +247,13 @@ class AccountReconcileModelUSA(models.Model):
                 aml.amount_currency                 AS aml_amount_currency,
                 account.internal_type               AS account_internal_type,
 
-                -- Determine a matching or not with the statement line communication using the aml.name, move.name or move.ref.
-                (
-                    aml.name IS NOT NULL
-                    AND
-                    substring(REGEXP_REPLACE(aml.name, '[^0-9|^\s]', '', 'g'), '\S(?:.*\S)*') != ''
-                    AND
-                        regexp_split_to_array(substring(REGEXP_REPLACE(aml.name, '[^0-9|^\s]', '', 'g'), '\S(?:.*\S)*'),'\s+')
-                        && regexp_split_to_array(substring(REGEXP_REPLACE(st_line.name, '[^0-9|^\s]', '', 'g'), '\S(?:.*\S)*'), '\s+')
-                )
-                OR
-                    regexp_split_to_array(substring(REGEXP_REPLACE(move.name, '[^0-9|^\s]', '', 'g'), '\S(?:.*\S)*'),'\s+')
-                    && regexp_split_to_array(substring(REGEXP_REPLACE(st_line.name, '[^0-9|^\s]', '', 'g'), '\S(?:.*\S)*'), '\s+')
-                OR
-                (
-                    move.ref IS NOT NULL
-                    AND
-                    substring(REGEXP_REPLACE(move.ref, '[^0-9|^\s]', '', 'g'), '\S(?:.*\S)*') != ''
-                    AND
-                        regexp_split_to_array(substring(REGEXP_REPLACE(move.ref, '[^0-9|^\s]', '', 'g'), '\S(?:.*\S)*'),'\s+')
-                        && regexp_split_to_array(substring(REGEXP_REPLACE(st_line.name, '[^0-9|^\s]', '', 'g'), '\S(?:.*\S)*'), '\s+')
+                -- Determine a matching or not with the statement line communication using the numbers of the aml.name,
+                -- move.name or move.ref, precomputed in reference_tokens.
+                COALESCE(
+                    string_to_array(aml.reference_tokens, ' ') && string_to_array(st_line.reference_tokens, ' ')
+                    OR
+                    string_to_array(move.reference_tokens, ' ') && string_to_array(st_line.reference_tokens, ' '),
+                    FALSE
                 )                                   AS communication_flag,
                 -- Determine a matching or not with the statement line communication using the move.invoice_payment_ref.
                 (
@@ -279,7 +266,23 @@ class AccountReconcileModelUSA(models.Model):
             LEFT JOIN jnl_precision                 ON jnl_precision.journal_id = journal.id
             LEFT JOIN res_company company           ON company.id = st_line.company_id
             LEFT JOIN partners_table line_partner   ON line_partner.line_id = st_line.id
-            , account_move_line aml
+            -- Candidates of each statement line, every branch is served by an index: the lines of the partner,
+            -- or without partner, the lines of the bank account and the open lines of the reconcilable accounts
+            CROSS JOIN LATERAL (
+                SELECT cand.id FROM account_move_line cand
+                WHERE line_partner.partner_id != 0 AND cand.partner_id = line_partner.partner_id
+                UNION
+                SELECT cand.id FROM account_move_line cand
+                WHERE line_partner.partner_id = 0
+                    AND cand.account_id IN (journal.default_credit_account_id, journal.default_debit_account_id)
+                UNION
+                SELECT cand.id FROM account_move_line cand
+                JOIN account_account cand_account ON cand_account.id = cand.account_id
+                WHERE line_partner.partner_id = 0
+                    AND cand_account.reconcile IS TRUE
+                    AND cand.reconciled IS FALSE
+            ) candidate
+            JOIN account_move_line aml              ON aml.id = candidate.id
             LEFT JOIN account_move move             ON move.id = aml.move_id AND move.state = 'posted'
             LEFT JOIN account_account account       ON account.id = aml.account_id
             WHERE st_line.id IN %s
@@ -297,12 +300,10 @@ class AccountReconcileModelUSA(models.Model):
                          ELSE aml.balance < 0
                     END
 
-                -- if there is a partner, propose all aml of the partner, otherwise propose only the ones
-                -- matching the statement line communication
-                -- ===============================================================================
-                -- !!! REMOVE THIS PART TO APPLY FOR BANK STATEMENT LINE HAVING NO PARTNER ID !!!
-                -- ===============================================================================
-                
+                -- if there is a partner, propose all aml of the partner, otherwise propose all the lines of the
+                -- bank account and all the open lines, the lines matching the communication are preferred through
+                -- communication_flag, see candidate above
+
                 AND
                 (
                     (
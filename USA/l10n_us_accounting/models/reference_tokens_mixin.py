@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models
+from odoo.tools import column_exists, create_column
+
+from ..utils import bank_statement_line_utils
+
+
+class ReferenceTokensMixinUSA(models.AbstractModel):
+    _name = 'usa.reference.tokens.mixin'
+    _description = 'Reference Numbers for Bank Statement Matching'
+
+    # Fields whose numbers are matched with the numbers of the bank statement lines
+    _reference_token_fields = ['name']
+
+    # Technical fields
+    reference_tokens = fields.Char(string='Reference Numbers', compute='_compute_reference_tokens', store=True,
+                                   help='Numbers found in the name/reference, used to match bank statement lines')
+
+    @api.depends(lambda self: self._reference_token_fields)
+    def _compute_reference_tokens(self):
+        for record in self:
+            record.reference_tokens = bank_statement_line_utils.extract_reference_tokens(
+                *[record[field_name] for field_name in record._reference_token_fields])
+
+    def _auto_init(self):
+        """
+        Fill the numbers in SQL when the column is added, computing them in Python for every journal item would
+        take hours on a large database.
+        """
+        if self._auto and column_exists(self._cr, self._table, 'id') \
+                and not column_exists(self._cr, self._table, 'reference_tokens'):
+            create_column(self._cr, self._table, 'reference_tokens', 'varchar')
+            self._cr.execute(r"""
+                UPDATE {table} SET reference_tokens = NULLIF(array_to_string(regexp_split_to_array(
+                    substring(REGEXP_REPLACE(concat_ws(' ', {fields}), '[^0-9|^\s]', '', 'g'), '\S(?:.*\S)*'),
+                    '\s+'), ' '), '')
+            """.format(table=self._table, fields=', '.join('"%s"' % name for name in self._reference_token_fields)))
+        return super(ReferenceTokensMixinUSA, self)._auto_init()
+
+    def init(self):
+        super(ReferenceTokensMixinUSA, self).init()
+        # The numbers only rank the candidates of the matching query, they are never searched
+        if self._auto:
+            self._cr.execute("DROP INDEX IF EXISTS {table}_reference_tokens_index".format(table=self._table))
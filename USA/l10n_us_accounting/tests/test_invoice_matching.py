@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import common, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestInvoiceMatching(common.SavepointCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestInvoiceMatching, cls).setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+        cls.partner = cls.env['res.partner'].create({'name': 'Matching Customer'})
+        cls.bank_journal = cls.env['account.journal'].create({
+            'name': 'Matching Bank',
+            'code': 'MBNK',
+            'type': 'bank',
+        })
+        cls.rule = cls.env['account.reconcile.model'].create({
+            'name': 'Matching Invoices',
+            'rule_type': 'invoice_matching',
+            'match_partner': False,
+            'match_same_currency': False,
+        })
+        cls.invoice = cls.env['account.move'].create({
+            'type': 'out_invoice',
+            'partner_id': cls.partner.id,
+            'invoice_date': '2021-01-04',
+            'ref': '424242',
+            'invoice_line_ids': [(0, 0, {'name': 'Matching Service', 'quantity': 1, 'price_unit': 100.0})],
+        })
+        cls.invoice.action_post()
+        cls.receivable_line = cls.invoice.line_ids.filtered(
+            lambda line: line.account_id.internal_type == 'receivable')
+
+    def _get_candidate_lines(self, name):
+        statement = self.env['account.bank.statement'].create({
+            'journal_id': self.bank_journal.id,
+            'date': '2021-01-11',
+            'line_ids': [(0, 0, {'name': name, 'date': '2021-01-11', 'amount': 100.0})],
+        })
+        st_line = statement.line_ids
+        query, params = self.rule._get_invoice_matching_query(st_line)
+        self.env['account.move.line'].flush()
+        self.env.cr.execute(query, params)
+        return {row['aml_id']: row['communication_flag'] for row in self.env.cr.dictfetchall()}
+
+    def test_no_partner_open_invoice_candidate(self):
+        """ A statement line without partner is still proposed the open invoices not matching its numbers """
+        candidates = self._get_candidate_lines('Deposit 777')
+        self.assertIn(self.receivable_line.id, candidates)
+        self.assertFalse(candidates[self.receivable_line.id])
+
+    def test_no_partner_matching_number_flagged(self):
+        candidates = self._get_candidate_lines('Deposit 424242')
+        self.assertTrue(candidates[self.receivable_line.id])
+
+    def test_no_partner_reconciled_line_not_candidate(self):
+        self.env.cr.execute('UPDATE account_move_line SET reconciled = TRUE WHERE id = %s', [self.receivable_line.id])
+        candidates = self._get_candidate_lines('Deposit 424242')
+        self.assertNotIn(self.receivable_line.id, candidates)
@@ -33,3 +33,14 @@ def extract_check_number(description):
             return word
 
     return None
+
+
+def extract_reference_tokens(*texts):
+    """
+    Keep the numbers of the texts used to match a bank statement line with journal items, the same way as the
+    regular expressions of the matching query did
+    :param texts: e.g. the name and reference of a journal entry
+    :return: numbers separated by a space
+    """
+    tokens = re.sub(r'[^0-9|^\s]', '', ' '.join(text for text in texts if text)).split()
+    return ' '.join(tokens) or False
@@ -7,3 +7,4 @@
 from . import audit_trail_log
 from . import audit_trail_rule
 from . import ir_module
+from . import base
@@ -5,7 +5,18 @@
 #
 ##############################################################################
 
+import weakref
+
 from odoo import models, fields, api, _
+from odoo.tools import split_every
+
+LOG_COLUMNS = ['rule_id', 'model_id', 'res_id', 'res_name', 'res_create_date', 'res_partner_id', 'res_field_name',
+               'res_old_value', 'res_new_value', 'author_id', 'operation', 'parent_id', 'parent_model_id',
+               'create_date']
+LOG_TEXT_COLUMNS = ['res_old_value', 'res_new_value']
+INSERT_BATCH_SIZE = 1000
+# Logs of the ongoing transactions waiting to be inserted, by cursor
+PENDING_LOGS = weakref.WeakKeyDictionary()
 
 
 class AuditTrailLog(models.Model):
@@ -41,6 +52,69 @@ class AuditTrailLog(models.Model):
         res = super().create(vals)
         return res
     
+    @api.model
+    def _queue_logs(self, vals_list):
+        """
+        Keep the logs of the transaction, they are inserted at once when the transaction is flushed, i.e. before
+        commit or before the logs are searched, and they are dropped on rollback
+        :param vals_list: list of values of the logs
+        """
+        if not vals_list:
+            return
+        cr = self.env.cr
+        pending_logs = PENDING_LOGS.get(cr)
+        if pending_logs is None:
+            pending_logs = PENDING_LOGS[cr] = []
+            cr.after('rollback', lambda: PENDING_LOGS.pop(cr, None))
+        pending_logs.extend(vals_list)
+
+    @api.model
+    def _flush_pending_logs(self):
+        self._insert_logs(PENDING_LOGS.pop(self.env.cr, []))
+
+    @api.model
+    def _get_log_names(self, count):
+        """
+        Get the next `count` names of the log sequence with one query
+        """
+        sequence = self.env['ir.sequence'].sudo().search(
+            [('code', '=', 'audit_trail_log'), ('company_id', 'in', [self.env.company.id, False])],
+            order='company_id', limit=1)
+        if not sequence:
+            return [_('New Audit Log')] * count
+        if sequence.implementation != 'standard' or sequence.use_date_range:
+            return [sequence._next() for i in range(count)]
+        self.env.cr.execute("SELECT nextval('ir_sequence_%03d') FROM generate_series(1, %%s)" % sequence.id,
+                            (count,))
+        return [sequence.get_next_char(number) for number, in self.env.cr.fetchall()]
+
+    @api.model
+    def _insert_logs(self, vals_list):
+        """
+        Insert the logs with multi-row INSERT statements
+        :param vals_list: list of values of the logs, keys are in LOG_COLUMNS
+        """
+        if not vals_list:
+            return
+        self.flush()
+        names = self._get_log_names(len(vals_list))
+        now = fields.Datetime.now()
+        rows = []
+        for name, vals in zip(names, vals_list):
+            row = [name]
+            for column in LOG_COLUMNS:
+                value = vals.get(column)
+                if value is False or value is None:
+                    value = None
+                elif column in LOG_TEXT_COLUMNS:
+                    value = str(value)
+                row.append(value)
+            rows.append(tuple(row + [self.env.uid, self.env.uid, now]))
+        for rows_batch in split_every(INSERT_BATCH_SIZE, rows):
+            query = 'INSERT INTO audit_trail_log (name, {}, create_uid, write_uid, write_date) VALUES {}'.format(
+                ', '.join(LOG_COLUMNS), ', '.join(['%s'] * len(rows_batch)))
+            self.env.cr.execute(query, rows_batch)
+
     def action_open_all_logs(self):
         self.ensure_one()
         action = self.env.ref('novobi_audit_trail.action_audit_trail_log_tree').read()[0]
@@ -5,7 +5,7 @@
 #
 ##############################################################################
 
-from odoo import models, fields, api, _, modules
+from odoo import models, fields, api, tools, _, modules
 
 DEFAULT_OPERATIONS = ['create', 'write', 'unlink']
 
@@ -185,74 +185,111 @@ class AuditTrailRule(models.Model):
         if is_need_to_reset:
             modules.registry.Registry(self.env.cr.dbname).signal_changes()
     
+    @api.model
+    @tools.ormcache('model_name')
+    def _get_tracking_metadata(self, model_name):
+        """
+        Get the confirmed rule and the tracking fields of a model, cached until the rules change
+        :param model_name: name of the tracking model
+        :return: dictionary of the rule and fields information, or None if the model is not tracked
+        """
+        model_id = self.env['ir.model'].sudo().search([('model', '=', model_name)], limit=1)
+        tracking_rule = self.env['audit.trail.rule'].sudo().search(
+            [('model_id', '=', model_id.id), ('state', '=', 'confirmed')], limit=1)
+        if not tracking_rule:
+            return None
+        if tracking_rule.is_tracking_all_fields:
+            tracking_fields = self.env['ir.model.fields'].sudo().search(
+                [('model', '=', model_name), ('store', '=', True)])
+        else:
+            tracking_fields = tracking_rule.tracking_field_ids
+        fields_info = {}
+        for field in tracking_fields:
+            fields_info.setdefault(field.name, {
+                'relation': field.relation,
+                'ttype': field.ttype,
+                'relation_table': field.relation_table,
+                'column1': field.column1,
+                'column2': field.column2,
+                'relation_field': field.relation_field,
+            })
+        return {
+            'rule_id': tracking_rule.id,
+            'model_id': model_id.id,
+            'parent_field': tracking_rule.parent_field_id.name or False,
+            'fields': fields_info,
+        }
+    
+    @api.model
+    def _get_display_values(self, relation, ids_list):
+        """
+        Get the display value of the relational values of several records with one name_get
+        :param relation: name of the related model
+        :param ids_list: list of related ids of each record
+        :return: list of display values
+        """
+        all_ids = list({res_id for ids in ids_list for res_id in ids})
+        names = dict(self.env[relation].sudo().browse(all_ids).name_get())
+        return ['\n'.join([names[res_id] for res_id in ids if res_id in names]) for ids in ids_list]
+    
+    @api.model
+    def _get_selection_value(self, model_name, field_name, value):
+        selection = self.env[model_name].sudo()._fields[field_name].selection
+        return isinstance(selection, list) and dict(selection).get(value) or ''
+    
     @api.model
     def create_audit_trail_log(self, operation, records, old_values={}, new_values={}):
         """
-        Create a log to record the changes with the operation create/write/unlink
+        Prepare the logs recording the changes with the operation create/write/unlink, the logs are inserted
+        together before the transaction is committed
         :param operation: create/write/unlink
         :param records: the resource records
         :param old_values: the old values
         :param new_values: the new values
-        :return: created log for recording the changes
+        :return: values of the queued logs
         """
-        created_log = []
-        for record in records:
-            record = record.sudo()
-            # Create log
-            rule = new_values.get(record.id) and new_values[record.id].get('rule')
-            res_string_fields = self.env['ir.translation'].sudo().get_field_string(record._name)
-            res_partner_id = getattr(record, 'partner_id', '')
-            audit_log_env = self.env['audit.trail.log'].sudo()
-            has_parent_id = rule and hasattr(rule, 'parent_field_id') and rule.parent_field_id
-            record_name = hasattr(record, 'name') and record.name or record.name_get()[0][1]
+        metadata = records and self._get_tracking_metadata(records._name)
+        if not metadata:
+            return []
+        res_string_fields = self.env['ir.translation'].sudo().get_field_string(records._name)
+        untracking_fields = ['message_ids', '__last_update', 'message_follower_ids', 'write_date']
+        parent_field = metadata['parent_field']
+        log_date = fields.Datetime.now()
+        log_vals_list = []
+        for record in records.sudo():
+            partner = getattr(record, 'partner_id', '')
+            parent = parent_field and record[parent_field]
+            common_vals = {
+                'rule_id': metadata['rule_id'],
+                'model_id': metadata['model_id'],
+                'res_id': record.id,
+                'res_name': hasattr(record, 'name') and record.name or record.name_get()[0][1],
+                'parent_id': parent and parent.id or False,
+                'parent_model_id': parent and parent._name or False,
+                'res_create_date': getattr(record, 'create_date', None),
+                'res_partner_id': partner and partner.id,
+                'author_id': self.env.user.id,
+                'operation': operation,
+                'create_date': log_date,
+            }
             if operation == 'unlink':
-                model_id = self.env['ir.model'].sudo().search([('model', '=', record._name)], limit=1)
-                tracking_rule = self.env['audit.trail.rule'].sudo().search(
-                    [('model_id', '=', model_id.id), ('state', '=', 'confirmed')], limit=1)
-                
-                log_vals = {
-                    'rule_id': tracking_rule and tracking_rule.id,
-                    'res_name': record_name,
-                    'parent_id': has_parent_id and getattr(record, rule.parent_field_id.name).id or False,
-                    'parent_model_id': has_parent_id and getattr(record, rule.parent_field_id.name)._name or False,
-                    'res_create_date': getattr(record, 'create_date', None),
-                    'res_partner_id': res_partner_id and res_partner_id.id,
-                    'model_id': self.env['ir.model'].sudo().search([('model', '=', record._name)], limit=1).id,
-                    'res_id': record.id,
-                    'author_id': self.env.user.id,
-                    'operation': operation,
-                }
-                log = audit_log_env.create(log_vals)
-                created_log.append(log)
-            else:
-                # Track changes
-                record_old_values = old_values.get(record.id, {}) and old_values[record.id].get('values', [])
-                record_new_values = new_values.get(record.id, {}) and new_values[record.id].get('values', [])
-                untracking_fields = ['message_ids', '__last_update', 'message_follower_ids', 'write_date']
-                for key in record_new_values.keys():
-                    old_value = record_old_values.get(key, '')
-                    new_value = record_new_values.get(key, '')
-                    if old_value != new_value and (old_value or new_value) and key not in untracking_fields:
-                        # Create log if the change occurs
-                        log_vals = {
-                            'rule_id': rule and rule.id,
-                            'res_name': record_name,
-                            'parent_id': has_parent_id and getattr(record, rule.parent_field_id.name).id or False,
-                            'parent_model_id': has_parent_id and getattr(record,
-                                                                         rule.parent_field_id.name)._name or False,
-                            'res_create_date': getattr(record, 'create_date', None),
-                            'res_partner_id': res_partner_id and res_partner_id.id,
-                            'res_field_name': res_string_fields.get(key, ''),
-                            'res_old_value': old_value,
-                            'res_new_value': new_value,
-                            'model_id': self.env['ir.model'].sudo().search([('model', '=', record._name)], limit=1).id,
-                            'res_id': record.id,
-                            'author_id': self.env.user.id,
-                            'operation': operation,
-                        }
-                        log = audit_log_env.create(log_vals)
-                        created_log.append(log)
-        return created_log
+                log_vals_list.append(common_vals)
+                continue
+            # Track changes
+            record_old_values = old_values.get(record.id, {}) and old_values[record.id].get('values', [])
+            record_new_values = new_values.get(record.id, {}) and new_values[record.id].get('values', [])
+            for key in record_new_values.keys():
+                old_value = record_old_values.get(key, '')
+                new_value = record_new_values.get(key, '')
+                if old_value != new_value and (old_value or new_value) and key not in untracking_fields:
+                    # Create log if the change occurs
+                    log_vals_list.append(dict(common_vals, **{
+                        'res_field_name': res_string_fields.get(key, ''),
+                        'res_old_value': old_value,
+                        'res_new_value': new_value,
+                    }))
+        self.env['audit.trail.log'].sudo()._queue_logs(log_vals_list)
+        return log_vals_list
     
     @api.model
     def get_tracking_value(self, records, keys_list):
@@ -263,125 +300,86 @@ class AuditTrailRule(models.Model):
         :return: dictionary of values
         """
         tracking_dict = {}
-        length = len(records)
-        keys_list = length == len(keys_list) and keys_list or [keys_list[0] for record in records]
-        model_id = self.env['ir.model'].sudo().search([('model', '=', records._name)], limit=1)
-        tracking_rule = self.env['audit.trail.rule'].sudo().search(
-            [('model_id', '=', model_id.id), ('state', '=', 'confirmed')], limit=1)
-        if tracking_rule:
-            if tracking_rule.is_tracking_all_fields:
-                tracking_fields = self.env['ir.model.fields'].sudo().search(
-                    [('model', '=', records._name), ('store', '=', True)])
+        metadata = records and self._get_tracking_metadata(records._name)
+        if not metadata or not keys_list:
+            return tracking_dict
+        records = records.sudo()
+        keys_list = len(records) == len(keys_list) and keys_list or [keys_list[0] for record in records]
+        tracking_fields = metadata['fields']
+        values_list = [{} for record in records]
+        for key in {key for keys in keys_list for key in keys}:
+            field = tracking_fields.get(key)
+            if not field:
+                continue
+            indexes = [i for i, keys in enumerate(keys_list) if key in keys]
+            if field['relation']:
+                display_values = self._get_display_values(field['relation'],
+                                                          [records[i][key].ids for i in indexes])
+            elif field['ttype'] == 'selection':
+                display_values = [self._get_selection_value(records._name, key, records[i][key]) for i in indexes]
             else:
-                tracking_fields = tracking_rule.tracking_field_ids
-            for i in range(0, length):
-                record = records[i].sudo()
-                keys_list_i = keys_list[0]
-                value_dict = {}
-                for key in keys_list_i:
-                    changed_fields = tracking_fields.filtered(lambda f: f.name == key)
-                    changed_field = len(changed_fields) > 1 and changed_fields[0] or changed_fields
-                    if changed_field:
-                        if changed_field['relation']:
-                            value = record[key].name_get()
-                            value_dict[key] = '\n'.join([name and name[1] for name in value])
-                        elif changed_field['ttype'] == 'selection':
-                            selection = self.env[record._name].sudo()._fields[key].selection
-                            value_dict[key] = isinstance(selection, list) and dict(selection).get(record[key]) or ''
-                        else:
-                            value_dict[key] = record[key]
-                tracking_dict[record.id] = {
-                    'values': value_dict,
-                    'rule': tracking_rule,
-                    'model': model_id,
-                }
+                display_values = [records[i][key] for i in indexes]
+            for i, value in zip(indexes, display_values):
+                values_list[i][key] = value
+        for record, value_dict in zip(records, values_list):
+            tracking_dict[record.id] = {
+                'values': value_dict,
+                'metadata': metadata,
+            }
         return tracking_dict
     
     @api.model
     def query_field_from_db(self, records):
         tracking_dict = {}
-        if records:
-            in_table_list = ['id']
-            one2many_list = []
-            many2many_list = []
-            model_id = self.env['ir.model'].sudo().search([('model', '=', records._name)], limit=1)
-            tracking_rule = self.env['audit.trail.rule'].sudo().search(
-                [('model_id', '=', model_id.id), ('state', '=', 'confirmed')], limit=1)
-            if tracking_rule:
-                if tracking_rule.is_tracking_all_fields:
-                    tracking_fields = self.env['ir.model.fields'].sudo().search(
-                        [('model', '=', records._name), ('store', '=', True)])
-                else:
-                    tracking_fields = tracking_rule.tracking_field_ids
-                fields = tracking_fields.filtered(lambda f: f['ttype'] != 'binary')
-                for field in fields:
-                    if field['relation']:
-                        if 'one2many' in field['ttype']:
-                            one2many_list.append(field)
-                        elif 'many2many' in field['ttype']:
-                            many2many_list.append(field)
-                        else:
-                            in_table_list.append(field.name)
-                    else:
-                        in_table_list.append(field.name)
-                
-                query_stmt = """
-                    SELECT {}
-                    FROM {}
-                    WHERE id IN ({})
-                """.format(','.join(in_table_list), records._table,
-                           ','.join(str(record.id) for record in records))
-                cr = self.env.cr
-                cr.execute(query_stmt)
-                result = {line['id']: line for line in cr.dictfetchall()}
-                
-                for record in records:
-                    # Query many2many fields
-                    for field in many2many_list:
-                        relation_table = field.relation_table
-                        column_name = field.column1
-                        ref_column_name = field.column2
-                        query_stmt = """
-                                            SELECT {}
-                                            FROM {}
-                                            WHERE {} = {}
-                                        """.format(ref_column_name, relation_table, column_name, record.id)
-                        cr.execute(query_stmt)
-                        field_result = cr.dictfetchall()
-                        result[record.id][field.name] = [value[ref_column_name] for value in field_result]
-                    # Query one2many fields
-                    for field in one2many_list:
-                        if field.relation_field:
-                            column_name = field.relation_field
-                            relation_table = field.relation.replace('.', '_')
-                            query_stmt = """
-                                SELECT id
-                                FROM {}
-                                WHERE {} = {}
-                            """.format(relation_table, column_name, record.id)
-                            cr.execute(query_stmt)
-                            field_result = cr.dictfetchall()
-                            result[record.id][field.name] = [value['id'] for value in field_result]
-                    
-                    value_dict = {}
-                    old_value_dict = result.get(record.id)
-                    if old_value_dict:
-                        for field in fields:
-                            if field['relation']:
-                                relation_record = self.env[field.relation].sudo().browse(old_value_dict[field.name])
-                                value = relation_record.name_get()
-                                value_dict[field.name] = '\n'.join([name and name[1] for name in value])
-                            elif field['ttype'] == 'selection':
-                                selection = self.env[record._name].sudo()._fields[field.name].selection
-                                value_dict[field.name] = isinstance(selection, list) and dict(selection).get(
-                                    old_value_dict[field.name]) or ''
-                            elif not field['relation']:
-                                value_dict[field.name] = old_value_dict[field.name]
-                    tracking_dict[record.id] = {
-                        'values': value_dict,
-                        'rule': tracking_rule,
-                        'model': model_id,
-                    }
+        metadata = records and self._get_tracking_metadata(records._name)
+        if not metadata:
+            return tracking_dict
+        fields = {name: field for name, field in metadata['fields'].items() if field['ttype'] != 'binary'}
+        in_table_list = ['id'] + [name for name, field in fields.items()
+                                  if field['ttype'] not in ('one2many', 'many2many')]
+        cr = self.env.cr
+        cr.execute('SELECT {} FROM {} WHERE id IN %s'.format(
+            ','.join('"{}"'.format(name) for name in in_table_list), records._table), (tuple(records.ids),))
+        result = {line['id']: line for line in cr.dictfetchall()}
+        for line in result.values():
+            for name, field in fields.items():
+                if field['ttype'] in ('one2many', 'many2many'):
+                    line[name] = []
+        
+        for name, field in fields.items():
+            # Query many2many fields
+            if field['ttype'] == 'many2many':
+                cr.execute('SELECT "{column1}", "{column2}" FROM "{table}" WHERE "{column1}" IN %s'.format(
+                    column1=field['column1'], column2=field['column2'], table=field['relation_table']),
+                    (tuple(result),))
+            # Query one2many fields
+            elif field['ttype'] == 'one2many' and field['relation_field']:
+                cr.execute('SELECT "{column}", id FROM "{table}" WHERE "{column}" IN %s ORDER BY id'.format(
+                    column=field['relation_field'], table=self.env[field['relation']]._table), (tuple(result),))
+            else:
+                continue
+            for res_id, value_id in cr.fetchall():
+                result[res_id][name].append(value_id)
+        
+        old_values_list = [result[res_id] for res_id in records.ids if res_id in result]
+        values_list = [{} for old_value_dict in old_values_list]
+        for name, field in fields.items():
+            if field['relation']:
+                display_values = self._get_display_values(field['relation'], [
+                    isinstance(line[name], list) and line[name] or [line[name]] if line[name] else []
+                    for line in old_values_list])
+            elif field['ttype'] == 'selection':
+                display_values = [self._get_selection_value(records._name, name, line[name])
+                                  for line in old_values_list]
+            else:
+                display_values = [line[name] for line in old_values_list]
+            for value_dict, value in zip(values_list, display_values):
+                value_dict[name] = value
+        for old_value_dict, value_dict in zip(old_values_list, values_list):
+            tracking_dict[old_value_dict['id']] = {
+                'values': value_dict,
+                'metadata': metadata,
+            }
         return tracking_dict
     
     def create_action_view_audit_log(self):
@@ -408,6 +406,7 @@ class AuditTrailRule(models.Model):
         operations = DEFAULT_OPERATIONS
         self.remove_all_patch_methods(operation_list=operations)
         res = super().write(vals)
+        self.clear_caches()
         # Register hook for tracking operations
         self._register_hook()
         return res
@@ -415,6 +414,7 @@ class AuditTrailRule(models.Model):
     def unlink(self):
         # Remove all patched methods to resource models before unlink the rules
         self.remove_all_patch_methods(is_delete=True)
+        self.clear_caches()
         return super().unlink()
     
     @api.model
@@ -422,4 +422,5 @@ class AuditTrailRule(models.Model):
         if vals.get('name', _('New Audit Rule')) == _('New Audit Rule'):
             vals['name'] = self.env['ir.sequence'].sudo().next_by_code('audit_trail_rule') or _('New Audit Rule')
         res = super().create(vals)
+        self.clear_caches()
         return res
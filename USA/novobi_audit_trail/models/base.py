@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+
+#    Copyright (C) 2020 Novobi LLC (<http://novobi.com>)
+#
+##############################################################################
+
+from odoo import models
+
+
+class Base(models.AbstractModel):
+    _inherit = 'base'
+
+    def flush(self, fnames=None, records=None):
+        super().flush(fnames, records)
+        # The whole transaction is flushed before commit, the audit logs are also inserted before they are searched
+        if fnames is None or self._name == 'audit.trail.log':
+            self.env['audit.trail.log'].sudo()._flush_pending_logs()
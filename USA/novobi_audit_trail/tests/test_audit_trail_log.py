@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from odoo.tests import common, tagged
+
+from ..models.audit_trail_log import PENDING_LOGS
+
+
+@tagged('post_install', '-at_install')
+class TestAuditTrailLog(common.SavepointCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestAuditTrailLog, cls).setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+        cls.rule = cls.env.ref('novobi_audit_trail.audit_rule_track_journal_entries')
+        cls.journal = cls.env['account.journal'].search([('type', '=', 'general')], limit=1)
+        cls.moves = cls.env['account.move'].create([{
+            'type': 'entry',
+            'journal_id': cls.journal.id,
+            'ref': 'Audit %s' % i,
+        } for i in range(5)])
+        cls.env['base'].flush()
+
+    def _count_log_inserts(self, func):
+        cr = self.env.cr
+        inserts = []
+        execute = cr.execute
+
+        def count_execute(query, params=None, log_exceptions=None):
+            if isinstance(query, str) and query.startswith('INSERT INTO audit_trail_log'):
+                inserts.append(query)
+            return execute(query, params, log_exceptions)
+
+        with patch.object(cr, 'execute', count_execute):
+            func()
+        return len(inserts)
+
+    def _get_logs(self, ref):
+        return self.env['audit.trail.log'].search([
+            ('rule_id', '=', self.rule.id),
+            ('res_id', 'in', self.moves.ids),
+            ('operation', '=', 'write'),
+            ('res_new_value', '=', ref),
+        ])
+
+    def test_operation_logs_inserted_at_once(self):
+        def write_refs():
+            self.moves.write({'ref': 'Audit Batch'})
+            self.assertTrue(PENDING_LOGS.get(self.env.cr))
+            self.env['base'].flush()
+
+        self.assertEqual(self._count_log_inserts(write_refs), 1)
+        self.assertFalse(PENDING_LOGS.get(self.env.cr))
+        self.assertEqual(len(self._get_logs('Audit Batch')), len(self.moves))
+
+    def test_transaction_logs_inserted_at_once(self):
+        def write_refs():
+            for move in self.moves:
+                move.write({'ref': 'Audit Single'})
+            self.env['base'].flush()
+
+        self.assertEqual(self._count_log_inserts(write_refs), 1)
+        self.assertEqual(len(self._get_logs('Audit Single')), len(self.moves))
+
+    def test_search_flushes_logs(self):
+        self.moves.write({'ref': 'Audit Search'})
+        self.assertEqual(len(self._get_logs('Audit Search')), len(self.moves))
+        self.assertFalse(PENDING_LOGS.get(self.env.cr))
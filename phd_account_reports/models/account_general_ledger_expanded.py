@@ -2,6 +2,7 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
 import io
+import itertools
 import logging
 import lxml.html
 from odoo.tools.misc import xlsxwriter
@@ -14,6 +15,8 @@ from odoo.tools.misc import format_date, DEFAULT_SERVER_DATE_FORMAT
 _logger = logging.getLogger(__name__)
 
 REF_COLUMN_IDX = 1
+# Number of journal items fetched at once from the server-side cursor of the Excel export
+XLSX_FETCH_SIZE = 2000
 
 
 class AccountGeneralLedgerReport(models.AbstractModel):
@@ -132,8 +135,10 @@ class AccountGeneralLedgerReport(models.AbstractModel):
                 # account.move.line record lines.
                 amls = results.get('lines', [])
 
-                load_more_remaining = len(amls)
+                # Out of print mode, only the first page of the lines is fetched along with the number of lines
+                load_more_remaining = amls and amls[0]['account_line_count'] or len(amls)
                 load_more_counter = self._context.get('print_mode') and load_more_remaining or self.MAX_LINES
+                last_aml_id = 0
 
                 for aml in amls:
                     # Don't show more line than load_more_counter.
@@ -146,12 +151,13 @@ class AccountGeneralLedgerReport(models.AbstractModel):
                     load_more_remaining -= 1
                     load_more_counter -= 1
                     aml_lines.append(aml['id'])
+                    last_aml_id = aml['id']
 
                 if load_more_remaining > 0:
-                    # Load more line.
+                    # Load more line, its offset is the last line shown.
                     lines.append(self._get_load_more_line(
                         options, account,
-                        self.MAX_LINES,
+                        last_aml_id,
                         load_more_remaining,
                         cumulated_balance,
                     ))
@@ -184,6 +190,128 @@ class AccountGeneralLedgerReport(models.AbstractModel):
             return aml_lines
         return lines
 
+    @api.model
+    def _load_more_lines(self, options, line_id, offset, load_more_remaining, progress):
+        ''' Fetch the next page of an expanded account, the offset is the id of the last line shown and the
+        progress is the cumulated balance at that line.
+        '''
+        lines = []
+        expanded_account = self.env['account.account'].browse(int(line_id[9:]))
+        company_currency = self.env.company.currency_id
+
+        amls_query, amls_params = self._get_query_amls(options, expanded_account, offset=offset, limit=self.MAX_LINES)
+        self._cr.execute(amls_query, amls_params)
+        for aml in self._cr.dictfetchall():
+            progress += aml['balance']
+            lines.append(self._get_aml_line(options, expanded_account, aml, company_currency.round(progress)))
+            offset = aml['id']
+            load_more_remaining -= 1
+
+        if load_more_remaining > 0:
+            lines.append(self._get_load_more_line(
+                options, expanded_account,
+                offset,
+                load_more_remaining,
+                progress,
+            ))
+        return lines
+
+    @api.model
+    def _iter_query_amls(self, options, account_ids):
+        ''' Read the journal items of accounts through a server-side cursor, sorted by account in the given order
+        then by date.
+        :return: generator of the journal items as dictionaries
+        '''
+        query, params = self._get_query_amls(options, None, account_order=account_ids)
+        cursor = self._cr._cnx.cursor('phd_general_ledger_amls')
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(XLSX_FETCH_SIZE)
+                if not rows:
+                    break
+                columns = [column[0] for column in cursor.description]
+                for row in rows:
+                    yield dict(zip(columns, row))
+        finally:
+            cursor.close()
+
+    @api.model
+    def _iter_general_ledger_lines(self, options):
+        ''' Same lines as `_get_general_ledger_lines` in print mode, the journal items are streamed instead of
+        being all loaded before the first line is built.
+        :return: generator of the report lines
+        '''
+        options_list = self._get_options_periods_list(options)
+        unfold_all = options.get('unfold_all') or not options['unfolded_lines']
+        date_from = fields.Date.from_string(options['date']['date_from'])
+        company_currency = self.env.company.currency_id
+
+        accounts_results, taxes_results = self._do_query(options_list, fetch_lines=False)
+
+        unfolded_account_ids = []
+        for account, periods_results in accounts_results:
+            max_date = periods_results[0].get('sum', {}).get('max_date')
+            if max_date and max_date >= date_from and (
+                    unfold_all or 'account_%s' % account.id in options['unfolded_lines']):
+                unfolded_account_ids.append(account.id)
+        aml_groups = iter([])
+        if unfolded_account_ids:
+            aml_groups = itertools.groupby(self._iter_query_amls(options, unfolded_account_ids),
+                                           key=lambda aml: aml['account_id'])
+        next_group = next(aml_groups, None)
+
+        total_debit = total_credit = total_balance = 0.0
+        for account, periods_results in accounts_results:
+            results = periods_results[0]
+            account_sum = results.get('sum', {})
+            account_un_earn = results.get('unaffected_earnings', {})
+
+            has_amls = bool(next_group and next_group[0] == account.id)
+            amount_currency = account_sum.get('amount_currency', 0.0) + account_un_earn.get('amount_currency', 0.0)
+            debit = account_sum.get('debit', 0.0) + account_un_earn.get('debit', 0.0)
+            credit = account_sum.get('credit', 0.0) + account_un_earn.get('credit', 0.0)
+            balance = account_sum.get('balance', 0.0) + account_un_earn.get('balance', 0.0)
+
+            if not has_amls:
+                max_date = account_sum.get('max_date')
+                yield self._get_account_title_line(options, account, amount_currency, debit, credit, balance,
+                                                   max_date and max_date >= date_from or False)
+
+            total_debit += debit
+            total_credit += credit
+            total_balance += balance
+
+            if account.id in unfolded_account_ids:
+                account_init_bal = results.get('initial_balance', {})
+                cumulated_balance = account_init_bal.get('balance', 0.0) + account_un_earn.get('balance', 0.0)
+                yield self._get_initial_balance_line(
+                    options, account,
+                    account_init_bal.get('amount_currency', 0.0) + account_un_earn.get('amount_currency', 0.0),
+                    account_init_bal.get('debit', 0.0) + account_un_earn.get('debit', 0.0),
+                    account_init_bal.get('credit', 0.0) + account_un_earn.get('credit', 0.0),
+                    cumulated_balance,
+                )
+                if has_amls:
+                    for aml in next_group[1]:
+                        cumulated_balance += aml['balance']
+                        yield self._get_aml_line(options, account, aml, company_currency.round(cumulated_balance))
+                    next_group = next(aml_groups, None)
+                yield self._get_account_total_line(
+                    options, account,
+                    account_sum.get('amount_currency', 0.0),
+                    account_sum.get('debit', 0.0),
+                    account_sum.get('credit', 0.0),
+                    account_sum.get('balance', 0.0),
+                )
+
+        yield self._get_total_line(options, total_debit, total_credit, company_currency.round(total_balance))
+
+        journal_options = self._get_options_journals(options)
+        if len(journal_options) == 1 and journal_options[0]['type'] in ('sale', 'purchase'):
+            for line in self._get_tax_declaration_lines(options, journal_options[0]['type'], taxes_results):
+                yield line
+
     @api.model
     def _get_aml_line(self, options, account, aml, cumulated_balance):
         if aml['payment_id']:
@@ -354,13 +482,15 @@ class AccountGeneralLedgerReport(models.AbstractModel):
         return super(AccountGeneralLedgerReport, self).print_xlsx(options)
 
     @api.model
-    def _get_query_amls(self, options, expanded_account, offset=None, limit=None):
+    def _get_query_amls(self, options, expanded_account, offset=None, limit=None, account_order=None):
         ''' Construct a query retrieving the account.move.lines when expanding a report line with or without the load
         more.
         :param options:             The report options.
         :param expanded_account:    The account.account record corresponding to the expanded line.
-        :param offset:              The offset of the query (used by the load more).
+        :param offset:              The id of the last account.move.line already shown (used by the load more), the
+                                    lines are fetched by keyset on (date, id) instead of skipping the previous ones.
         :param limit:               The limit of the query (used by the load more).
+        :param account_order:       The ids of the accounts to fetch, the lines are sorted by account in this order.
         :return:                    (query, params)
         '''
 
@@ -368,7 +498,9 @@ class AccountGeneralLedgerReport(models.AbstractModel):
 
         # Get sums for the account move lines.
         # period: [('date' <= options['date_to']), ('date', '>=', options['date_from'])]
-        if expanded_account:
+        if account_order is not None:
+            domain = [('account_id', 'in', account_order)]
+        elif expanded_account:
             domain = [('account_id', '=', expanded_account.id)]
         elif unfold_all:
             domain = []
@@ -378,6 +510,37 @@ class AccountGeneralLedgerReport(models.AbstractModel):
         new_options = self._force_strict_range(options)
         tables, where_clause, where_params = self._query_get(new_options, domain=domain)
         ct_query = self._get_query_currency_table(options)
+
+        # Only the journal items of the page are joined to the partners, journals, etc.
+        page_columns = 'NULL AS account_line_count'
+        page_limit = page_filter = ''
+        order_by = 'account_move_line.date, account_move_line.id'
+        if offset:
+            where_clause += ''' AND (account_move_line.date, account_move_line.id) > (
+                    SELECT last_aml.date, last_aml.id FROM account_move_line last_aml WHERE last_aml.id = %s)'''
+            where_params.append(offset)
+        if limit:
+            page_limit = 'ORDER BY account_move_line.date, account_move_line.id LIMIT %s'
+            where_params.append(limit)
+        elif account_order is not None:
+            order_by = 'array_position(%s, account_move_line.account_id), ' + order_by
+            where_params.append(list(account_order))
+        elif not self._context.get('print_mode') and not self._context.get('aml_only'):
+            # First page of the unfolded accounts, the load more fetches the next ones
+            page_columns = '''COUNT(*) OVER (PARTITION BY account_move_line.account_id) AS account_line_count,
+                    ROW_NUMBER() OVER (PARTITION BY account_move_line.account_id
+                                       ORDER BY account_move_line.date, account_move_line.id) AS account_line_number'''
+            page_filter = 'WHERE page.account_line_number <= %s'
+            where_params.append(self.MAX_LINES)
+
+        page_query = '''
+                SELECT account_move_line.id, %s
+                FROM account_move_line
+                LEFT JOIN account_move account_move_line__move_id ON account_move_line__move_id.id = account_move_line.move_id
+                WHERE %s
+                %s
+            ''' % (page_columns, where_clause, page_limit)
+
         query = '''
                 SELECT
                     account_move_line.id,
@@ -404,8 +567,10 @@ class AccountGeneralLedgerReport(models.AbstractModel):
                     journal.code                            AS journal_code,
                     journal.name                            AS journal_name,
                     full_rec.name                           AS full_rec_name,
-                    analytic_account.code                   AS analytic_account_name
-                FROM account_move_line
+                    analytic_account.code                   AS analytic_account_name,
+                    page.account_line_count
+                FROM (%s) page
+                JOIN account_move_line                      ON account_move_line.id = page.id
                 LEFT JOIN account_move account_move_line__move_id ON account_move_line__move_id.id = account_move_line.move_id
                 LEFT JOIN %s ON currency_table.company_id = account_move_line.company_id
                 LEFT JOIN res_company company               ON company.id = account_move_line.company_id
@@ -414,23 +579,17 @@ class AccountGeneralLedgerReport(models.AbstractModel):
                 LEFT JOIN account_journal journal           ON journal.id = account_move_line.journal_id
                 LEFT JOIN account_analytic_account analytic_account           ON analytic_account.id = account_move_line.analytic_account_id
                 LEFT JOIN account_full_reconcile full_rec   ON full_rec.id = account_move_line.full_reconcile_id
-                WHERE %s
-                ORDER BY account_move_line.date, account_move_line.id
-            ''' % (ct_query, where_clause)
-
-        if offset:
-            query += ' OFFSET %s '
-            where_params.append(offset)
-        if limit:
-            query += ' LIMIT %s '
-            where_params.append(limit)
+                %s
+                ORDER BY %s
+            ''' % (page_query, ct_query, page_filter, order_by)
 
         return query, where_params
 
     def get_xlsx(self, options, response=None):
         output = io.BytesIO()
+        # The rows are written in order, so they are flushed to a temporary file instead of being kept in memory
         workbook = xlsxwriter.Workbook(output, {
-            'in_memory': True,
+            'constant_memory': True,
             'strings_to_formulas': False,
         })
         sheet = workbook.add_worksheet(self._get_report_name()[:31])
@@ -469,19 +628,19 @@ class AccountGeneralLedgerReport(models.AbstractModel):
         ctx = self._set_context(options)
         ctx.update({'no_format': False, 'print_mode': True, 'prefetch_fields': False})
         # deactivating the prefetching saves ~35% on get_lines running time
-        lines = self.with_context(ctx)._get_lines(options)
+        lines = self.with_context(ctx)._iter_general_ledger_lines(options)
 
         if options.get('hierarchy'):
-            lines = self._create_hierarchy(lines, options)
+            lines = self._create_hierarchy(list(lines), options)
         if options.get('selected_column'):
-            lines = self._sort_lines(lines, options)
+            lines = self._sort_lines(list(lines), options)
 
         # write all data rows
-        for y in range(0, len(lines)):
+        for y, line in enumerate(lines):
             style = default_style
             col1_style = default_col1_style
 
-            cell_type, cell_value = self._get_cell_type_value(lines[y])
+            cell_type, cell_value = self._get_cell_type_value(line)
             if cell_type == 'date':
                 sheet.write_datetime(y + y_offset, 0, cell_value, date_default_col1_style)
             else:
@@ -491,15 +650,15 @@ class AccountGeneralLedgerReport(models.AbstractModel):
                 sheet.write(y + y_offset, 0, cell_value, col1_style)
 
             # write all the remaining cells
-            for x in range(1, len(lines[y]['columns']) + 1):
-                cell_type, cell_value = self._get_cell_type_value(lines[y]['columns'][x - 1])
+            for x in range(1, len(line['columns']) + 1):
+                cell_type, cell_value = self._get_cell_type_value(line['columns'][x - 1])
                 if cell_type == 'date':
-                    sheet.write_datetime(y + y_offset, x + lines[y].get('colspan', 1) - 1, cell_value,
+                    sheet.write_datetime(y + y_offset, x + line.get('colspan', 1) - 1, cell_value,
                                          date_default_style)
                 else:
                     if cell_value and '\n' in cell_value:
                         cell_value = cell_value.replace('\n', '')
-                    sheet.write(y + y_offset, x + lines[y].get('colspan', 1) - 1, cell_value, specific_type if lines[y]['columns'][x - 1].get('is_negative', False) else style)
+                    sheet.write(y + y_offset, x + line.get('colspan', 1) - 1, cell_value, specific_type if line['columns'][x - 1].get('is_negative', False) else style)
         workbook.close()
         output.seek(0)
         generated_file = output.read()
@@ -2,7 +2,7 @@
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
 from odoo import models, fields, api, _
-from odoo.tools import safe_eval
+from odoo.tools import safe_eval, create_index
 from psycopg2._psycopg import AsIs
 
 
@@ -13,6 +13,11 @@ class AccountMoveLine(models.Model):
     account_type_id = fields.Many2one('account.account.type', related='account_id.user_type_id', store=True)
     phd_communication = fields.Char(compute='_compute_phd_communication', store=True)
 
+    def init(self):
+        super(AccountMoveLine, self).init()
+        # Pages of the general ledger are read by keyset on (date, id) within an account
+        create_index(self._cr, 'account_move_line_account_id_date_id_index', self._table, ['account_id', 'date', 'id'])
+
     @api.depends('move_id.name', 'move_id.state')
     def _compute_phd_communication(self):
         for record in self:
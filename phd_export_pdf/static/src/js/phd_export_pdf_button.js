@@ -6,6 +6,7 @@ odoo.define('phd_tools.web.export.pdf', function (require) {
     var PHDDataExport = require('phd_tools.web.DataExport');
     var core = require('web.core');
     var qweb = core.qweb;
+    var _t = core._t;
     var viewRegistry = require('web.view_registry');
     var framework = require('web.framework');
     var session = require('web.session');
@@ -50,31 +51,19 @@ odoo.define('phd_tools.web.export.pdf', function (require) {
                    widget: field.attrs.widget || false,
                    class: field.attrs.class != undefined ? field.attrs.class : 'text-center',
                 }));
-                framework.blockUI();
-                return new Promise(function (resolve, reject) {
-                    var type = 'qweb-pdf';
-                    var blocked = !session.get_file({
-                        url: '/report/download/pdf',
-                        data: {
-                            data: JSON.stringify([type, domain, modelName, report_id, defaultExportFields, group_by, date_range_field, orderedByLine, default_location_id, orderedByGroup]),
-                            context: JSON.stringify(session.user_context),
-                        },
-                        success: resolve,
-                        error: (error) => {
-                            self.call('crash_manager', 'rpc_error', error);
-                            reject();
-                        },
-                        complete: framework.unblockUI,
-                    });
-                    if (blocked) {
-                        var message = _t('A popup window with your report was blocked. You ' +
-                                         'may need to change your browser settings to allow ' +
-                                         'popup windows for this page.');
-                        self.do_warn(_t('Warning'), message, true);
-                    }
-                });
+                var type = 'qweb-pdf';
+                // The report is rendered by a background job, the user is notified when the file is ready
+                return this._rpc({
+                    route: '/report/download/pdf/async',
+                    params: {
+                        data: JSON.stringify([type, domain, modelName, report_id, defaultExportFields, group_by, date_range_field, orderedByLine, default_location_id, orderedByGroup]),
+                        context: JSON.stringify(session.user_context),
+                    },
+                }).then(function () {
+                    self.do_notify(_t('Export PDF'), _t('The report is being generated, you will be notified when it is ready.'));
+                }).finally(framework.unblockUI);
             }
-            framework.unblockUI;
+            framework.unblockUI();
         },
         renderButtons: function ($node) {
             this._super.apply(this, arguments);
@@ -1,7 +1,6 @@
-import json
 from datetime import datetime, timedelta
 from odoo import fields, models, api, _
-from .payarc_request import PayarcRequest, PayarcError
+from .payarc_request import PayarcRequest, PAYARC_API_URL
 
 
 class PayarcBatchReport(models.Model):
@@ -23,6 +22,10 @@ class PayarcBatchReport(models.Model):
         ], string='State', default='draft')
     settlement_id = fields.Many2one('settlement.report', string='Settlement')
 
+    _sql_constraints = [
+        ('batch_ref_uniq', 'unique(batch_ref)', 'The batch reference must be unique!'),
+    ]
+
     sales_account_id = fields.Many2one('account.account', string='Sales Account', domain="[('deprecated', '=', False)]")
     fees_account_id = fields.Many2one('account.account', string='Fees Account', domain="[('deprecated', '=', False)]")
     reserve_account_id = fields.Many2one('account.account', string='Reserve Account', domain="[('deprecated', '=', False)]")
@@ -38,15 +41,38 @@ class PayarcBatchReport(models.Model):
 
     @api.model
     def process_batch_report_from_payarc(self, batch_report_datas):
-        batch_reports = self.browse()
-        for batch_report in batch_report_datas:
-            record = self.sudo().search([('batch_ref', '=', batch_report['batch_ref'])], limit=1)
-            # If a record is already existed
-            existed_record = True if record else False
-
-            batch_reports |= self.create_jobs_for_synching(vals=batch_report, update=existed_record, record=record)
+        """
+        Upsert the batch reports by batch_ref: the existing reports are searched at once, the new ones are
+        created in one call and only the changed ones are written
+        """
+        vals_by_ref = {batch_report['batch_ref']: batch_report for batch_report in batch_report_datas}
+        existing_reports = self.sudo().search([('batch_ref', 'in', list(vals_by_ref))])
+        batch_reports = self.browse(existing_reports.ids)
+        reports_by_ref = {report.batch_ref: report for report in existing_reports}
+        create_vals_list = []
+        for batch_ref, vals in vals_by_ref.items():
+            record = reports_by_ref.get(batch_ref)
+            if not record:
+                create_vals_list.append(vals)
+            elif self._is_batch_report_changed(record, vals):
+                self.create_jobs_for_synching(vals=vals, update=True, record=record)
+        if create_vals_list:
+            batch_reports |= self.with_context(for_synching=True).create(create_vals_list)
         return batch_reports
 
+    @api.model
+    def _is_batch_report_changed(self, record, vals):
+        for key, value in vals.items():
+            field = self._fields[key]
+            if field.type == 'many2one':
+                current_value = record[key].id
+            else:
+                current_value = record[key]
+                value = field.convert_to_cache(value, record)
+            if (current_value or False) != (value or False):
+                return True
+        return False
+
     @api.model
     def run(self):
         from_date = (datetime.now().date() - timedelta(days=1)).strftime("%Y-%m-%d")
@@ -65,45 +91,36 @@ class PayarcBatchReport(models.Model):
             })
         return datas
 
+    @api.model
+    def _sync_journal_batches(self, chunk):
+        """
+        Request log chunk method: fetch and save the batch reports of a journal, a PayarcError is raised to the
+        chunk worker which retries the chunk later
+        """
+        params = chunk._get_params()
+        journal = self.env['account.journal'].browse(params['journal_id'])
+        api_url = self.env['ir.config_parameter'].sudo().get_param('phd_payarc.api_url') or PAYARC_API_URL
+        payarc_request = PayarcRequest({'payarc_access_token': journal.payarc_access_token}, api_url=api_url)
+        res = payarc_request.get_batch_from_payarc(params['from_date'], params['to_date'])
+        chunk._set_payload({'data': res})
+        batch_report_datas = self._extend_information_for_batch_report(res, journal)
+        payarc_batch_reports = self.process_batch_report_from_payarc(batch_report_datas)
+        chunk.write({'payarc_batch_report_ids': [(6, 0, payarc_batch_reports.ids)]})
+
     @api.model
     def get_batch_from_payarc(self, from_date, to_date):
+        """
+        Create the request log fetching the batch reports of the integrated journals, with one chunk per journal
+        so that the journals are fetched in parallel by the chunk worker
+        :return: the request log
+        """
         integrated_journals = self.env['account.journal'].search([('is_integrate_with_payarc', '=', True)])
-        for journal in integrated_journals:
-            payarc_info = {
-                'payarc_access_token': journal.payarc_access_token
-            }
-            processer = PayarcRequest(payarc_info)
-            try:
-                res = processer.get_batch_from_payarc(from_date, to_date)
-                batch_report_datas = self._extend_information_for_batch_report(res, journal)
-                payarc_batch_reports = self.process_batch_report_from_payarc(batch_report_datas)
-                self.env['request.log'].create({
-                    'from_date': from_date,
-                    'to_date': to_date,
-                    'res_model': 'payarc.batch.report',
-                    'status': 'done',
-                    'is_resolved': True,
-                    'payarc_batch_report_ids': [(6, 0, payarc_batch_reports.ids)],
-                    'datas': json.dumps({'data': res}, indent=2)
-                })
-            except PayarcError as e:
-                self.env['request.log'].create({
-                    'from_date': from_date,
-                    'to_date': to_date,
-                    'res_model': 'payarc.batch.report',
-                    'status': 'failed',
-                    'message': e,
-                })
-            except Exception as e:
-                self.env.cr.rollback()
-                self.env['request.log'].create({
-                    'from_date': from_date,
-                    'to_date': to_date,
-                    'res_model': 'payarc.batch.report',
-                    'status': 'failed',
-                    'message': e,
-                    'datas': json.dumps({'data': res}, indent=2)
-                })
+        return self.env['request.log']._create_job(
+            'payarc.batch.report', '_sync_journal_batches',
+            [{'name': journal.display_name,
+              'params': {'journal_id': journal.id, 'from_date': from_date, 'to_date': to_date}}
+             for journal in integrated_journals],
+            from_date=from_date, to_date=to_date)
 
     @api.model
     def create_jobs_for_synching(self, vals, update=False, record=False):
@@ -1,19 +1,49 @@
+import threading
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+PAYARC_API_URL = 'https://api.payarc.net/v1'
+REQUEST_TIMEOUT = 60
+RETRY_TOTAL = 3
+RETRY_BACKOFF_FACTOR = 1
+RETRY_STATUS_FORCELIST = (429, 500, 502, 503, 504)
 
 
 class PayarcError(Exception):
     pass
 
 
+class PayarcSessionPool(object):
+    """
+    Keep one keep-alive HTTP session per thread, the sessions retry the failed requests with an exponential backoff
+    """
+    _local = threading.local()
+
+    @classmethod
+    def get_session(cls):
+        session = getattr(cls._local, 'session', None)
+        if session is None:
+            retry = Retry(total=RETRY_TOTAL, backoff_factor=RETRY_BACKOFF_FACTOR,
+                          status_forcelist=RETRY_STATUS_FORCELIST, raise_on_status=False)
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(max_retries=retry))
+            session.mount('http://', HTTPAdapter(max_retries=retry))
+            cls._local.session = session
+        return session
+
+
 class PayarcRequest(object):
 
     access_token: str
 
-    def __init__(self, payarc_info):
+    def __init__(self, payarc_info, api_url=PAYARC_API_URL, session=None):
         credentials = self.extract_credentials(payarc_info)
         for k, v in credentials.items():
             setattr(self, k, v)
-        self.batch_url = 'https://api.payarc.net/v1/deposit/summary'
+        self.batch_url = '%s/deposit/summary' % api_url.rstrip('/')
+        self.session = session
 
     @classmethod
     def extract_credentials(cls, payarc_info):
@@ -51,9 +81,16 @@ class PayarcRequest(object):
             'to_date': to_date
         }
 
-        response = requests.get(url=self.batch_url, headers=headers, params=params)
+        session = self.session or PayarcSessionPool.get_session()
+        try:
+            response = session.get(url=self.batch_url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            raise PayarcError("Something went wrong while getting Batch Report!\n%s" % e)
         if response.ok:
             return self.parse_payarc_batch_report_reponse_data(response.json()['data'])
         else:
-            error_message = response.json().get('error_description')
+            try:
+                error_message = response.json().get('error_description')
+            except ValueError:
+                error_message = response.text
             raise PayarcError("Something went wrong while getting Batch Report!\n%s" % error_message)
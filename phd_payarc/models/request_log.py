@@ -7,15 +7,25 @@ class RequestLog(models.Model):
     payarc_batch_report_ids = fields.Many2many('payarc.batch.report', string='PayArc Batch Reports')
     batch_report_count = fields.Integer(compute='_compute_batch_report_count')
 
-    @api.depends('res_model', 'payarc_batch_report_ids')
+    @api.depends('res_model', 'payarc_batch_report_ids', 'chunk_ids.payarc_batch_report_ids')
     def _compute_batch_report_count(self):
         for record in self:
-            record.batch_report_count = len(record.payarc_batch_report_ids)
+            record.batch_report_count = len(record._get_payarc_batch_reports())
+
+    def _get_payarc_batch_reports(self):
+        return self.payarc_batch_report_ids | self.chunk_ids.mapped('payarc_batch_report_ids')
 
     def action_open_details(self):
         if self.res_model == 'payarc.batch.report':
             action = self.env.ref('phd_payarc.phd_batch_report_action').read()[0]
-            if len(self.payarc_batch_report_ids) > 0:
-                action['domain'] = [('id', 'in', self.payarc_batch_report_ids.ids)]
+            payarc_batch_reports = self._get_payarc_batch_reports()
+            if len(payarc_batch_reports) > 0:
+                action['domain'] = [('id', 'in', payarc_batch_reports.ids)]
             return action
         return super().action_open_details()
+
+
+class RequestLogChunk(models.Model):
+    _inherit = 'request.log.chunk'
+
+    payarc_batch_report_ids = fields.Many2many('payarc.batch.report', string='PayArc Batch Reports')
@@ -0,0 +1,180 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest.mock import patch
+
+from odoo.tests import common, tagged
+
+from ..models import payarc_request
+from ..models.payarc_request import PayarcError, PayarcRequest, PayarcSessionPool, RETRY_TOTAL
+
+
+class PayarcStubServer(ThreadingMixIn, HTTPServer):
+    """
+    Local PayArc API: the responses are served in order, the last one is served again once the others are used
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super(PayarcStubServer, self).__init__(('127.0.0.1', 0), PayarcStubHandler)
+        self.responses = []
+        self.requests = []
+
+    @property
+    def api_url(self):
+        return 'http://127.0.0.1:%s/v1' % self.server_port
+
+
+class PayarcStubHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        responses = self.server.responses
+        status, data, delay = responses.pop(0) if len(responses) > 1 else responses[0]
+        if delay:
+            time.sleep(delay)
+        body = json.dumps(data).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client gave up waiting for a delayed response
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _batch_report_data(*deposits):
+    return {'data': {'rows_data': {'2021-01-04': {
+        'row_totals': {'Settlement_Date': '2021-01-04'},
+        'row_data': [{
+            'transType': 'DEPOSIT',
+            'amount': amount,
+            'batch_reference_number': batch_ref,
+            'transaction_count': transaction_count,
+        } for batch_ref, amount, transaction_count in deposits],
+    }}}}
+
+
+@tagged('post_install', '-at_install')
+class TestPayarcRequest(common.SavepointCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestPayarcRequest, cls).setUpClass()
+        cls.server = PayarcStubServer()
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+
+        cls.env['account.journal'].search([('is_integrate_with_payarc', '=', True)]).write({
+            'is_integrate_with_payarc': False,
+        })
+        cls.journal = cls.env['account.journal'].create({
+            'name': 'PayArc Bank',
+            'code': 'PARC',
+            'type': 'bank',
+            'is_integrate_with_payarc': True,
+            'payarc_access_token': 'payarc-token',
+        })
+        cls.env['ir.config_parameter'].sudo().set_param('phd_payarc.api_url', cls.server.api_url)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super(TestPayarcRequest, cls).tearDownClass()
+
+    def setUp(self):
+        super(TestPayarcRequest, self).setUp()
+        self.server.responses = []
+        self.server.requests = []
+        # fresh sessions of the pool, retrying without waiting
+        for name, value in [('RETRY_BACKOFF_FACTOR', 0), ('REQUEST_TIMEOUT', 0.2)]:
+            patcher = patch.object(payarc_request, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.object(PayarcSessionPool, '_local', threading.local())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get_batch(self):
+        request = PayarcRequest({'payarc_access_token': 'payarc-token'}, api_url=self.server.api_url)
+        return request.get_batch_from_payarc('2021-01-04', '2021-01-04')
+
+    def _sync_batches(self):
+        request_log = self.env['payarc.batch.report'].get_batch_from_payarc('2021-01-04', '2021-01-04')
+        self.assertEqual(len(request_log.chunk_ids), 1)
+        request_log.chunk_ids._process()
+        return request_log.chunk_ids.payarc_batch_report_ids
+
+    def test_session_pool_per_thread(self):
+        session = PayarcSessionPool.get_session()
+        self.assertIs(PayarcSessionPool.get_session(), session)
+        sessions = []
+        thread = threading.Thread(target=lambda: sessions.append(PayarcSessionPool.get_session()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(sessions[0], session)
+
+    def test_retry_on_server_error(self):
+        self.server.responses = [
+            (503, {'error_description': 'Unavailable'}, 0),
+            (502, {'error_description': 'Bad Gateway'}, 0),
+            (200, _batch_report_data(('B001', 100.0, 3)), 0),
+        ]
+        res = self._get_batch()
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(res, [{'amount': 100.0, 'batch_ref': 'B001', 'transaction_qty': 3, 'date': '2021-01-04'}])
+
+    def test_retry_exhausted(self):
+        self.server.responses = [(500, {'error_description': 'Internal Error'}, 0)]
+        with self.assertRaisesRegex(PayarcError, 'Internal Error'):
+            self._get_batch()
+        self.assertEqual(len(self.server.requests), RETRY_TOTAL + 1)
+
+    def test_no_retry_on_client_error(self):
+        self.server.responses = [(401, {'error_description': 'Invalid token'}, 0)]
+        with self.assertRaisesRegex(PayarcError, 'Invalid token'):
+            self._get_batch()
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_timeout(self):
+        self.server.responses = [(200, _batch_report_data(('B001', 100.0, 3)), 1)]
+        with self.assertRaises(PayarcError):
+            self._get_batch()
+        self.assertEqual(len(self.server.requests), RETRY_TOTAL + 1)
+
+    def test_timeout_then_success(self):
+        self.server.responses = [
+            (200, _batch_report_data(('B001', 100.0, 3)), 1),
+            (200, _batch_report_data(('B001', 100.0, 3)), 0),
+        ]
+        res = self._get_batch()
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(res[0]['batch_ref'], 'B001')
+
+    def test_upsert_by_batch_ref(self):
+        self.server.responses = [(200, _batch_report_data(('B001', 100.0, 3), ('B002', 50.0, 1)), 0)]
+        reports = self._sync_batches()
+        self.assertEqual(sorted(reports.mapped('batch_ref')), ['B001', 'B002'])
+        self.assertEqual(reports.mapped('journal_id'), self.journal)
+        self.assertIn('from_date=2021-01-04', self.server.requests[0])
+
+        # B001 is unchanged, B002 is updated and B003 is created
+        self.server.responses = [(200, _batch_report_data(
+            ('B001', 100.0, 3), ('B002', 75.0, 2), ('B003', 20.0, 1)), 0)]
+        reports_2 = self._sync_batches()
+        self.assertEqual(sorted(reports_2.mapped('batch_ref')), ['B001', 'B002', 'B003'])
+        self.assertEqual(reports_2 & reports, reports)
+        all_reports = self.env['payarc.batch.report'].search([('batch_ref', 'in', ['B001', 'B002', 'B003'])])
+        self.assertEqual(len(all_reports), 3)
+        report_2 = all_reports.filtered(lambda r: r.batch_ref == 'B002')
+        self.assertEqual((report_2.amount, report_2.transaction_qty), (75.0, 2))
+        report_1 = all_reports.filtered(lambda r: r.batch_ref == 'B001')
+        self.assertEqual((report_1.amount, report_1.transaction_qty), (100.0, 3))
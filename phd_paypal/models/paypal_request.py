@@ -49,6 +49,24 @@ class PaypalRequest(object):
             })
         return result
 
+    def get_transaction_ids_by_date(self, settled_at):
+        """
+        :param settled_at: settlement date
+        :type settled_at: datetime.date
+        :return: sorted ids of the transactions settled on the date
+        """
+        try:
+            return self.braintree_gateway.search_transaction_ids(settled_at, settled_at)
+        except Exception as e:
+            raise PaypalError("Something went wrong while searching Paypal Transactions via BrainTree!\n%s" % e)
+
+    def get_transactions_by_ids(self, transaction_ids, settled_at):
+        try:
+            datas = self.braintree_gateway.find_transactions(transaction_ids)
+            return self.parse_braintree_transaction(datas, settled_at.strftime("%Y-%m-%d"))
+        except Exception as e:
+            raise PaypalError("Something went wrong while getting Paypal Transaction via BrainTree!\n%s" % e)
+
     def get_transaction_by_date(self, settled_at):
         try:
             datas = self.braintree_gateway.search_transaction(settled_at)
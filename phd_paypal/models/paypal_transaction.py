@@ -1,7 +1,12 @@
-import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from odoo import fields, models, api, _
-from .paypal_request import PaypalRequest, PaypalError
+from odoo.tools import split_every
+from .paypal_request import PaypalRequest
+
+SYNC_BATCH_SIZE = 1000
+FETCH_CHUNK_SIZE = 500
+DEFAULT_FETCH_WORKERS = 4
 
 
 class PaypalTransaction(models.Model):
@@ -16,6 +21,10 @@ class PaypalTransaction(models.Model):
     amount = fields.Float(string='Amount')
     paypal_fee_amount = fields.Float(string='Paypal Fee Amount')
 
+    _sql_constraints = [
+        ('transaction_id_uniq', 'unique(transaction_id)', 'The Paypal transaction ID must be unique!'),
+    ]
+
     @api.model
     def create_jobs_for_synching(self, vals, update=False, record=False):
         return self._sync_in_queue_job(vals, update, record)
@@ -34,54 +43,112 @@ class PaypalTransaction(models.Model):
         to_date = from_date
         self.get_paypal_transaction_via_braintree(from_date, to_date)
 
+    @api.model
+    def _get_existing_transactions(self, transaction_ids):
+        """
+        Read the synced transactions with one query per batch
+        :param transaction_ids: Braintree ids of the transactions
+        :return: {transaction_id: record values}
+        """
+        self.flush()
+        existing = {}
+        for ids in split_every(SYNC_BATCH_SIZE, transaction_ids):
+            self.env.cr.execute("""
+                SELECT id, transaction_id, date, order_id, authorization_id, amount, paypal_fee_amount
+                FROM paypal_transaction
+                WHERE transaction_id IN %s
+            """, (tuple(ids),))
+            existing.update({row['transaction_id']: row for row in self.env.cr.dictfetchall()})
+        return existing
+
+    @api.model
+    def _is_transaction_changed(self, existing_vals, vals):
+        for key, value in vals.items():
+            existing_value = existing_vals.get(key)
+            if key == 'date':
+                existing_value = existing_value and fields.Date.to_string(existing_value)
+                value = value and fields.Date.to_string(fields.Date.to_date(value))
+            if (existing_value or False) != (value or False):
+                return True
+        return False
+
     @api.model
     def process_paypal_transaction(self, transactions):
-        paypal_transactions = self.env['paypal.transaction'].browse()
-        for transaction in transactions:
-            record = self.sudo().search([('transaction_id', '=', transaction['transaction_id'])], limit=1)
-            # If a record is already existed
-            existed_record = True if record else False
+        """
+        Upsert the transactions: the synced transactions are read at once, the new ones are created in batches
+        and only the changed ones are written
+        :param transactions: parsed Braintree transactions
+        :return: the synced paypal.transaction records
+        """
+        vals_by_transaction_id = {transaction['transaction_id']: transaction for transaction in transactions}
+        existing = self._get_existing_transactions(list(vals_by_transaction_id))
+        transaction_model = self.sudo()
+        paypal_transactions = self.env['paypal.transaction'].browse(
+            [existing_vals['id'] for existing_vals in existing.values()])
 
-            paypal_transaction = self.create_jobs_for_synching(vals=transaction, update=existed_record, record=record)
-            paypal_transactions |= paypal_transaction
+        create_vals_list = []
+        # The changed transactions having the same new values are written together
+        changed_ids_by_vals = {}
+        for transaction_id, vals in vals_by_transaction_id.items():
+            existing_vals = existing.get(transaction_id)
+            if not existing_vals:
+                create_vals_list.append(vals)
+            elif self._is_transaction_changed(existing_vals, vals):
+                key = tuple(sorted((field_name, value) for field_name, value in vals.items()
+                                   if field_name != 'transaction_id'))
+                changed_ids_by_vals.setdefault(key, []).append(existing_vals['id'])
+        for key, record_ids in changed_ids_by_vals.items():
+            transaction_model._sync_in_queue_job(dict(key), True, transaction_model.browse(record_ids))
+        for vals_list in split_every(SYNC_BATCH_SIZE, create_vals_list, list):
+            paypal_transactions |= transaction_model._sync_in_queue_job(vals_list, False, False)
         return paypal_transactions
 
     @api.model
-    def get_paypal_transaction_via_braintree(self, settled_date_from, settled_date_to):
+    def _get_paypal_client(self):
         ir_params_sudo = self.env['ir.config_parameter'].sudo()
         credentials = {
             'merchant_id': ir_params_sudo.get_param('braintree_merchant_id'),
             'public_key': ir_params_sudo.get_param('braintree_public_key'),
             'private_key': ir_params_sudo.get_param('braintree_private_key')
         }
-        paypal_client = PaypalRequest(credentials)
-        try:
-            res = paypal_client.get_transaction_by_date(settled_date_from)
-            paypal_transactions = self.process_paypal_transaction(res)
-            self.env['request.log'].create({
-                'from_date': settled_date_from,
-                'to_date': settled_date_to,
-                'res_model': 'paypal.transaction',
-                'status': 'done',
-                'is_resolved': True,
-                'datas': json.dumps({'data': res}, indent=2),
-                'paypal_transaction_ids': [(6, 0, paypal_transactions.ids)]
-            })
-        except PaypalError as e:
-            self.env['request.log'].create({
-                'from_date': settled_date_from,
-                'to_date': settled_date_to,
-                'res_model': 'paypal.transaction',
-                'status': 'failed',
-                'message': e,
-            })
-        except Exception as e:
-            self.env.cr.rollback()
-            self.env['request.log'].create({
-                'from_date': settled_date_from,
-                'to_date': settled_date_to,
-                'res_model': 'paypal.transaction',
-                'status': 'failed',
-                'datas': json.dumps({'data': res}, indent=2),
-                'message': e,
-            })
+        return PaypalRequest(credentials)
+
+    @api.model
+    def _sync_settled_date(self, chunk):
+        """
+        Request log chunk method: fetch the transactions settled on a day by chunks of ids and save them as they
+        arrive, the chunk worker commits the day at once and a failed day is retried as a whole, the transactions
+        being upserted
+        """
+        settled_date = fields.Date.to_date(chunk._get_params()['settled_date'])
+        paypal_client = self._get_paypal_client()
+        transaction_ids = paypal_client.get_transaction_ids_by_date(settled_date)
+        id_chunks = list(split_every(FETCH_CHUNK_SIZE, transaction_ids, list))
+        max_workers = int(self.env['ir.config_parameter'].sudo().get_param(
+            'phd_paypal.braintree_fetch_workers', DEFAULT_FETCH_WORKERS))
+        with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+            # The chunks are fetched concurrently and saved as they arrive
+            futures = [executor.submit(paypal_client.get_transactions_by_ids, ids, settled_date) for ids in id_chunks]
+            for future in futures:
+                paypal_transactions = self.process_paypal_transaction(future.result())
+                chunk.write({
+                    'paypal_transaction_ids': [(4, transaction.id) for transaction in paypal_transactions],
+                })
+
+    @api.model
+    def get_paypal_transaction_via_braintree(self, settled_date_from, settled_date_to):
+        """
+        Create the request log syncing the transactions settled in a date range, with one chunk per day so that
+        the days are fetched in parallel by the chunk worker
+        :param settled_date_from: first settlement date, as a string
+        :param settled_date_to: last settlement date, as a string
+        :return: the request log
+        """
+        date_from = fields.Date.to_date(settled_date_from)
+        date_to = fields.Date.to_date(settled_date_to or settled_date_from)
+        settled_dates = [fields.Date.to_string(date_from + timedelta(days=day))
+                         for day in range((date_to - date_from).days + 1)]
+        return self.env['request.log']._create_job(
+            'paypal.transaction', '_sync_settled_date',
+            [{'name': settled_date, 'params': {'settled_date': settled_date}} for settled_date in settled_dates],
+            from_date=date_from, to_date=date_to)
@@ -1,5 +1,6 @@
 import braintree
 import logging
+from datetime import datetime, time
 
 _logger = logging.getLogger(__name__)
 
@@ -24,3 +25,22 @@ class BrainTree:
             transactions.append(transaction)
 
         return transactions
+
+    def search_transaction_ids(self, date_from, date_to):
+        """
+        Search the ids of the transactions settled between two dates, without loading the transactions
+        :param date_from: first settlement date
+        :param date_to: last settlement date, included
+        :return: sorted transaction ids
+        """
+        collection = self.gateway.transaction.search([
+            braintree.TransactionSearch.settled_at.between(datetime.combine(date_from, time.min),
+                                                           datetime.combine(date_to, time.max))
+        ])
+        return sorted(collection.ids)
+
+    def find_transactions(self, transaction_ids):
+        collection = self.gateway.transaction.search([
+            braintree.TransactionSearch.ids.in_list(transaction_ids)
+        ])
+        return list(collection.items)
@@ -15,12 +15,13 @@
     """,
     'author': 'Novobi LLC',
     'website': 'http://www.novobi.com',
-    'depends': ['account_dashboard', 'l10n_us_accounting', 'l10n_custom_dashboard', 'phd_sale', 'phd_purchase', 'mrp'],
+    'depends': ['account_dashboard', 'l10n_us_accounting', 'l10n_custom_dashboard', 'phd_sale', 'phd_purchase', 'mrp', 'stock_account'],
     'description': """ """,
     'data': [
         'views/assets.xml',
         'security/ir.model.access.csv',
         'data/phd_report_dashboard_data.xml',
+        'data/ir_cron_data.xml',
         'views/phd_report_dashboard_views.xml',
     ],
     'qweb': ['static/src/xml/*.xml'],
@@ -8,3 +8,5 @@
 #
 ##############################################################################
 from . import phd_report_dashboard
+from . import dashboard_kpi_snapshot
+from . import account_move
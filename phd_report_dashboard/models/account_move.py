@@ -0,0 +1,15 @@
+from odoo import models
+
+
+class AccountMove(models.Model):
+    _inherit = 'account.move'
+
+    def post(self):
+        res = super(AccountMove, self).post()
+        self.env['phd.dashboard.kpi.delta']._log_move_deltas(self)
+        return res
+
+    def button_draft(self):
+        self.env['phd.dashboard.kpi.delta']._log_move_deltas(self.filtered(lambda move: move.state == 'posted'),
+                                                             sign=-1)
+        return super(AccountMove, self).button_draft()
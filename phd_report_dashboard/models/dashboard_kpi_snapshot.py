@@ -0,0 +1,223 @@
+from datetime import timedelta
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import api, fields, models
+from odoo.tools import create_index
+
+INVENTORY_VALUE = 'inventory_value'
+RECEIVABLE = 'receivable'
+PAYABLE = 'payable'
+KPIS = [INVENTORY_VALUE, RECEIVABLE, PAYABLE]
+
+# Seconds after which a snapshot is computed again from scratch instead of being updated by its deltas
+DEFAULT_SNAPSHOT_TTL = 3600
+
+
+class PHDDashboardKPISnapshot(models.Model):
+    """
+    Value of a header KPI of the dashboard for a company at a date. The cron is the only writer: the header
+    adds the deltas logged since the last refresh to the stored value, so loading it does not lock anything.
+    """
+    _name = 'phd.dashboard.kpi.snapshot'
+    _description = 'Dashboard KPI Snapshot'
+    _order = 'company_id, kpi, snapshot_date desc'
+
+    company_id = fields.Many2one('res.company', string='Company', required=True, ondelete='cascade')
+    kpi = fields.Selection([
+        (INVENTORY_VALUE, 'Inventory Value'),
+        (RECEIVABLE, 'Account Receivable'),
+        (PAYABLE, 'Account Payable')
+    ], string='KPI', required=True)
+    snapshot_date = fields.Date(string='Date', required=True)
+    value = fields.Float(string='Value')
+    refresh_date = fields.Datetime(string='Refreshed On')
+    last_delta_id = fields.Integer(string='Last Delta', help='Last KPI delta included in the value')
+    last_layer_id = fields.Integer(string='Last Valuation Layer',
+                                   help='Last stock valuation layer included in the inventory value')
+
+    _sql_constraints = [
+        ('company_kpi_date_uniq', 'unique(company_id, kpi, snapshot_date)',
+         'A KPI can only have one snapshot per company and date!'),
+    ]
+
+    @api.model
+    def _get_ttl(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param(
+            'phd_report_dashboard.kpi_snapshot_ttl', DEFAULT_SNAPSHOT_TTL))
+
+    @api.model
+    def _compute_kpi_value(self, company, kpi, snapshot_date):
+        """
+        Compute the value of a KPI from scratch
+        :return: values of the snapshot
+        :rtype: dict
+        """
+        self.env['phd.dashboard.kpi.delta'].flush()
+        self.env.cr.execute("""
+            SELECT COALESCE(MAX(id), 0) FROM phd_dashboard_kpi_delta WHERE company_id = %s AND kpi = %s
+        """, (company.id, kpi))
+        vals = {
+            'company_id': company.id,
+            'kpi': kpi,
+            'snapshot_date': snapshot_date,
+            'refresh_date': fields.Datetime.now(),
+            'last_delta_id': self.env.cr.fetchone()[0],
+            'last_layer_id': 0,
+        }
+        if kpi == INVENTORY_VALUE:
+            self.env['stock.valuation.layer'].flush(['value', 'account_move_id', 'company_id'])
+            self.env.cr.execute("""
+                SELECT COALESCE(SUM(value), 0), COALESCE(MAX(id), 0)
+                FROM stock_valuation_layer
+                WHERE account_move_id IS NOT NULL AND company_id = %s AND create_date < %s
+            """, (company.id, snapshot_date + timedelta(days=1)))
+            vals['value'], vals['last_layer_id'] = self.env.cr.fetchone()
+        else:
+            results, total, amls = self.env['report.account.report_agedpartnerbalance'].with_context(
+                company_ids=(company.id,))._get_partner_move_lines([kpi], snapshot_date, 'posted', 30)
+            vals['value'] = total[5] if total else 0
+        return vals
+
+    def _get_pending_amounts(self):
+        """
+        Get the amounts logged after the refresh of the snapshots
+        :return: {snapshot id: (pending amount, last delta id, last layer id)}
+        :rtype: dict
+        """
+        pending = {snapshot.id: [0.0, snapshot.last_delta_id, snapshot.last_layer_id] for snapshot in self}
+        if not self:
+            return pending
+        self.flush()
+        self.env['phd.dashboard.kpi.delta'].flush()
+        self.env['stock.valuation.layer'].flush(['value', 'account_move_id', 'company_id'])
+        self.env.cr.execute("""
+            SELECT s.id, SUM(d.amount) FILTER (WHERE d.date <= s.snapshot_date), MAX(d.id)
+            FROM phd_dashboard_kpi_snapshot s
+            JOIN phd_dashboard_kpi_delta d ON d.company_id = s.company_id AND d.kpi = s.kpi AND d.id > s.last_delta_id
+            WHERE s.id IN %s
+            GROUP BY s.id
+        """, (tuple(self.ids),))
+        for snapshot_id, amount, last_delta_id in self.env.cr.fetchall():
+            pending[snapshot_id][0] += amount or 0.0
+            pending[snapshot_id][1] = last_delta_id
+        self.env.cr.execute("""
+            SELECT s.id, SUM(l.value), MAX(l.id)
+            FROM phd_dashboard_kpi_snapshot s
+            JOIN stock_valuation_layer l ON l.company_id = s.company_id AND l.id > s.last_layer_id
+                AND l.account_move_id IS NOT NULL AND l.create_date < s.snapshot_date + 1
+            WHERE s.id IN %s AND s.kpi = %s
+            GROUP BY s.id
+        """, (tuple(self.ids), INVENTORY_VALUE))
+        for snapshot_id, amount, last_layer_id in self.env.cr.fetchall():
+            pending[snapshot_id][0] += amount or 0.0
+            pending[snapshot_id][2] = last_layer_id
+        return {snapshot_id: tuple(values) for snapshot_id, values in pending.items()}
+
+    @api.model
+    def _get_kpi_values(self, company, dates):
+        """
+        Read the KPIs of a company at some dates, a KPI without a snapshot refreshed within the TTL is computed
+        from scratch
+        :return: {(kpi, date): value}
+        :rtype: dict
+        """
+        Snapshot = self.sudo()
+        # The cron computes the expired snapshots again, the header only falls back on computing the KPIs when
+        # the cron is late by more than the TTL
+        expiry_date = fields.Datetime.now() - timedelta(seconds=2 * Snapshot._get_ttl())
+        snapshots = Snapshot.search([('company_id', '=', company.id), ('snapshot_date', 'in', dates),
+                                     ('refresh_date', '>=', expiry_date)])
+        pending = snapshots._get_pending_amounts()
+        values = {(snapshot.kpi, snapshot.snapshot_date): snapshot.value + pending[snapshot.id][0]
+                  for snapshot in snapshots}
+        for kpi in KPIS:
+            for snapshot_date in dates:
+                if (kpi, snapshot_date) not in values:
+                    values[(kpi, snapshot_date)] = Snapshot._compute_kpi_value(company, kpi, snapshot_date)['value']
+        return values
+
+    @api.model
+    def _cron_refresh_kpi_snapshots(self):
+        """
+        Add the pending deltas to the snapshots of today and one year ago, compute again the expired ones and
+        remove the snapshots and deltas which are not needed anymore
+        """
+        today = fields.Date.today()
+        dates = [today, today - relativedelta(years=1)]
+        expiry_date = fields.Datetime.now() - timedelta(seconds=self._get_ttl())
+        snapshots = self.search([('snapshot_date', 'in', dates)])
+        pending = snapshots._get_pending_amounts()
+        existing = {(snapshot.company_id.id, snapshot.kpi, snapshot.snapshot_date): snapshot
+                    for snapshot in snapshots}
+        vals_list = []
+        for company in self.env['res.company'].search([]):
+            for kpi in KPIS:
+                for snapshot_date in dates:
+                    snapshot = existing.get((company.id, kpi, snapshot_date))
+                    if not snapshot:
+                        vals_list.append(self._compute_kpi_value(company, kpi, snapshot_date))
+                    elif snapshot.refresh_date < expiry_date:
+                        snapshot.write(self._compute_kpi_value(company, kpi, snapshot_date))
+                    else:
+                        amount, last_delta_id, last_layer_id = pending[snapshot.id]
+                        snapshot.write({
+                            'value': snapshot.value + amount,
+                            'last_delta_id': last_delta_id,
+                            'last_layer_id': last_layer_id,
+                        })
+        self.create(vals_list)
+        self.search([('snapshot_date', 'not in', dates)]).unlink()
+        self.flush()
+        self.env.cr.execute("""
+            DELETE FROM phd_dashboard_kpi_delta d
+            WHERE d.id <= COALESCE((
+                SELECT MIN(s.last_delta_id) FROM phd_dashboard_kpi_snapshot s
+                WHERE s.company_id = d.company_id AND s.kpi = d.kpi), d.id)
+        """)
+
+
+class PHDDashboardKPIDelta(models.Model):
+    """
+    Change of the A/R or A/P balance logged when a move is posted or reset to draft. Reconciling only moves
+    residuals between lines, so the aged balance changes by the balance of the posted lines. The log is insert
+    only, so posting moves never waits on the dashboard.
+    """
+    _name = 'phd.dashboard.kpi.delta'
+    _description = 'Dashboard KPI Delta'
+    _log_access = False
+
+    company_id = fields.Many2one('res.company', string='Company', required=True, ondelete='cascade')
+    kpi = fields.Selection([
+        (RECEIVABLE, 'Account Receivable'),
+        (PAYABLE, 'Account Payable')
+    ], string='KPI', required=True)
+    date = fields.Date(string='Accounting Date', required=True)
+    amount = fields.Float(string='Amount')
+
+    def init(self):
+        create_index(self._cr, 'phd_dashboard_kpi_delta_company_kpi_id_index', self._table,
+                     ['company_id', 'kpi', 'id'])
+
+    @api.model
+    def _log_move_deltas(self, moves, sign=1):
+        """
+        Log the balance of the receivable and payable lines of moves
+        :param sign: 1 when the moves are posted, -1 when they are reset to draft
+        """
+        if not moves:
+            return
+        self.env['account.move.line'].flush(['move_id', 'account_id', 'company_id', 'date', 'balance'])
+        self.env.cr.execute("""
+            SELECT aml.company_id, a.internal_type, aml.date, SUM(aml.balance)
+            FROM account_move_line aml
+            JOIN account_account a ON a.id = aml.account_id
+            WHERE aml.move_id IN %s AND a.internal_type IN %s
+            GROUP BY aml.company_id, a.internal_type, aml.date
+        """, (tuple(moves.ids), (RECEIVABLE, PAYABLE)))
+        self.sudo().create([{
+            'company_id': company_id,
+            'kpi': kpi,
+            'date': date,
+            'amount': sign * amount,
+        } for company_id, kpi, date, amount in self.env.cr.fetchall() if amount])
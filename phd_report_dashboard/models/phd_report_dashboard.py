@@ -420,22 +420,18 @@ class PHDReportDashboard(models.Model):
         return get_chart_json(graph_data, graph_label, get_chartjs_setting(chart_type='line'), info_data)
 
     def _compute_kanban_bank_dashboard(self):
-        kanban_bank = []
-        for record in self:
-            if record.type == BANK:
-                account_journals = self.env['account.journal'].search([('type', '=', 'bank')])
-                if account_journals:
-                    for account in account_journals:
-                        cash_per_book = self._format_amount(account.get_balance_per_book(), self.company_id.currency_id)
-                        kanban_bank.append({
-                            'cash_per_book': cash_per_book,
-                            'bank_name': account.name,
-                        })
-                    record.kanban_bank_dashboard = json.dumps(kanban_bank)
-                else:
-                    record.kanban_bank_dashboard = False
-            else:
-                record.kanban_bank_dashboard = False
+        bank_records = self.filtered(lambda record: record.type == BANK)
+        (self - bank_records).kanban_bank_dashboard = False
+        if not bank_records:
+            return
+        # The balances of all the journals are computed in one query
+        account_journals = self.env['account.journal'].search([('type', '=', 'bank')])
+        for record in bank_records:
+            kanban_bank = [{
+                'cash_per_book': self._format_amount(account.balance_per_book, record.company_id.currency_id),
+                'bank_name': account.name,
+            } for account in account_journals]
+            record.kanban_bank_dashboard = json.dumps(kanban_bank) if kanban_bank else False
 
     @api.model
     def phd_report_dashboard_header_render(self, new_user=True):
@@ -444,66 +440,33 @@ class PHDReportDashboard(models.Model):
         }
         date_to = fields.Datetime.now()
         date_from = date_to - relativedelta(years=1)
+        kpi_values = self.env['phd.dashboard.kpi.snapshot']._get_kpi_values(
+            self.env.company, [date_to.date(), date_from.date()])
         #inventory valuation
-        stock_valuation = self._get_stock_valuation(date_to, date_from)
+        stock_valuation = self._get_stock_valuation(date_to, date_from, kpi_values)
         kpi_json['kpi_data'].append(stock_valuation)
         #Current A/R
-        aged_receiable = self._get_aged_receivable(date_to, date_from)
+        aged_receiable = self._get_aged_receivable(date_to, date_from, kpi_values)
         kpi_json['kpi_data'].append(aged_receiable)
         # Current A/P
-        aged_payable = self._get_aged_payable(date_to, date_from)
+        aged_payable = self._get_aged_payable(date_to, date_from, kpi_values)
         kpi_json['kpi_data'].append(aged_payable)
         return kpi_json
 
-    def _get_stock_valuation(self, date_to, date_form):
-        current_value = 0
-        last_value = 0
-        query = '''
-                                    select sum(value) from stock_valuation_layer where account_move_id is not NULL and create_date <= '{date}'
-                                '''.format(date=date_to.astimezone(pytz.utc).strftime(DEFAULT_SERVER_DATETIME_FORMAT))
-        self._cr.execute(query)
-        current_inventory_valuation = self._cr.dictfetchall()
-        if current_inventory_valuation[0].get('sum', None) != None:
-            current_value = current_inventory_valuation[0].get('sum')
-        query = '''
-                                    select sum(value) from stock_valuation_layer where account_move_id is not NULL and create_date <= '{date}'
-                                '''.format(date=date_form.astimezone(pytz.utc).strftime(DEFAULT_SERVER_DATETIME_FORMAT))
-        self._cr.execute(query)
-        last_inventory_valuation = self._cr.dictfetchall()
-        if last_inventory_valuation[0].get('sum', None) != None:
-            last_value = last_inventory_valuation[0].get('sum')
-
+    def _get_stock_valuation(self, date_to, date_form, kpi_values):
+        current_value = kpi_values[('inventory_value', date_to.date())]
+        last_value = kpi_values[('inventory_value', date_form.date())]
         return self._get_data(date_to, date_form, current_value, last_value, label='Current Inventory Value',
                               main_icon='inventory_value')
 
-    def _get_aged_receivable(self, date_to, date_form):
-        current_value = 0
-        last_value = 0
-        results, current_total, amls = self.env['report.account.report_agedpartnerbalance']._get_partner_move_lines(
-            ['receivable'], date_to, 'posted', 30)
-        results, last_total, amls = self.env['report.account.report_agedpartnerbalance']._get_partner_move_lines(
-            'receivable', date_form, 'posted', 30)
-        if current_total:
-            current_value = current_total[5]
-
-        if last_total:
-            last_value = last_total[5]
-
+    def _get_aged_receivable(self, date_to, date_form, kpi_values):
+        current_value = kpi_values[('receivable', date_to.date())]
+        last_value = kpi_values[('receivable', date_form.date())]
         return self._get_data(date_to, date_form, current_value, last_value, label='Current A/R', main_icon='current_ar')
 
-    def _get_aged_payable(self, date_to, date_form):
-        current_value = 0
-        last_value = 0
-        results, current_total, amls = self.env['report.account.report_agedpartnerbalance']._get_partner_move_lines(
-            ['payable'], date_to, 'posted', 30)
-        results, last_total, amls = self.env['report.account.report_agedpartnerbalance']._get_partner_move_lines(
-            'payable', date_form, 'posted', 30)
-        if current_total:
-            current_value = abs(current_total[5])
-
-        if last_total:
-            last_value = abs(last_total[5])
-
+    def _get_aged_payable(self, date_to, date_form, kpi_values):
+        current_value = abs(kpi_values[('payable', date_to.date())])
+        last_value = abs(kpi_values[('payable', date_form.date())])
         return self._get_data(date_to, date_form, current_value, last_value, label='Current A/P', main_icon='current_ap')
 
 
@@ -1 +1,3 @@
+from . import request_payload_mixin
 from . import request_log
+from . import request_log_chunk
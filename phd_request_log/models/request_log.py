@@ -1,3 +1,5 @@
+import json
+
 from odoo import api, models, fields, _
 
 MODEL_METHOD_MAPPING = {
@@ -8,11 +10,13 @@ MODEL_METHOD_MAPPING = {
 
 class RequestLog(models.Model):
     _name = 'request.log'
+    _inherit = 'request.payload.mixin'
     _description = 'Request Log'
     _rec_name = 'create_date'
     _order = 'create_date desc'
 
     status = fields.Selection([
+        ('running', 'Running'),
         ('done', 'Done'),
         ('failed', 'Failed')
     ])
@@ -26,13 +30,75 @@ class RequestLog(models.Model):
                                       readonly=True, help="The record id this is attached to.")
 
     message = fields.Char(string='Message')
+    checkpoint = fields.Char(string='Checkpoint', readonly=True,
+                             help='Last item processed, an interrupted request resumes after it')
     datas = fields.Text(string='Datas')
+    chunk_ids = fields.One2many('request.log.chunk', 'log_id', string='Chunks')
+    chunk_count = fields.Integer(compute='_compute_chunk_count')
+
+    @api.depends('chunk_ids')
+    def _compute_chunk_count(self):
+        for record in self:
+            record.chunk_count = len(record.chunk_ids)
+
+    @api.model
+    def _create_job(self, res_model, method, chunk_vals_list, **log_vals):
+        """
+        Create a log split into chunks, the chunks are processed by the chunk worker
+        :param res_model: model processing the chunks
+        :param method: method of the model called with each chunk
+        :param chunk_vals_list: list of {'name': ..., 'params': JSON serializable dict}
+        :return: the created log
+        """
+        chunk_commands = [(0, 0, {
+            'sequence': sequence,
+            'name': chunk_vals.get('name'),
+            'method': method,
+            'params': json.dumps(chunk_vals.get('params') or {}),
+        }) for sequence, chunk_vals in enumerate(chunk_vals_list)]
+        return self.create(dict(log_vals, res_model=res_model, status='running', chunk_ids=chunk_commands))
+
+    def _update_status_from_chunks(self):
+        for record in self.filtered('chunk_ids'):
+            states = record.chunk_ids.mapped('state')
+            done_count = states.count('done')
+            if done_count == len(states):
+                vals = {'status': 'done', 'is_resolved': True}
+            elif 'failed' in states and not {'pending', 'running'} & set(states):
+                vals = {'status': 'failed', 'is_resolved': False}
+            else:
+                vals = {'status': 'running'}
+            vals['message'] = _('%s/%s chunks done') % (done_count, len(states))
+            record.write(vals)
+
+    @api.model
+    def _update_finished_logs(self):
+        """
+        Update the status of the running logs having no more pending or running chunk
+        """
+        self.env['request.log.chunk'].flush(['log_id', 'state'])
+        self.flush(['status'])
+        self.env.cr.execute("""
+            SELECT log.id FROM request_log log
+            WHERE log.status = 'running'
+                AND EXISTS (SELECT 1 FROM request_log_chunk chunk WHERE chunk.log_id = log.id)
+                AND NOT EXISTS (
+                    SELECT 1 FROM request_log_chunk chunk
+                    WHERE chunk.log_id = log.id AND chunk.state IN ('pending', 'running')
+                )
+        """)
+        self.browse([log_id for log_id, in self.env.cr.fetchall()])._update_status_from_chunks()
 
     def action_open_details(self):
         return True
 
     def run(self):
         self.ensure_one()
+        if self.chunk_ids:
+            # The chunk worker retries the failed chunks, the done ones are kept
+            self.chunk_ids.filtered(lambda chunk: chunk.state == 'failed')._requeue()
+            self.update({'status': 'running', 'is_resolved': False})
+            return
         if hasattr(self.env[self.res_model], MODEL_METHOD_MAPPING[self.res_model]):
             getattr(self.env[self.res_model], MODEL_METHOD_MAPPING[self.res_model])(self.from_date.strftime("%Y-%m-%d"),
                                                                                     self.to_date.strftime("%Y-%m-%d"))
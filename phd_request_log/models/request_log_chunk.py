@@ -0,0 +1,126 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from odoo import api, models, fields, _
+
+_logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 60
+RUNNING_TIMEOUT = 3600
+CLAIM_LIMIT = 50
+DEFAULT_CHUNK_WORKERS = 4
+
+
+class RequestLogChunk(models.Model):
+    _name = 'request.log.chunk'
+    _inherit = 'request.payload.mixin'
+    _description = 'Request Log Chunk'
+    _order = 'log_id, sequence, id'
+
+    log_id = fields.Many2one('request.log', string='Request Log', required=True, ondelete='cascade', index=True)
+    sequence = fields.Integer(string='Sequence', default=10)
+    name = fields.Char(string='Name')
+    method = fields.Char(string='Method', required=True,
+                         help='Method of the resource model of the log processing the chunk')
+    params = fields.Text(string='Parameters', default='{}')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed')
+    ], string='Status', default='pending', required=True, index=True)
+    attempt_count = fields.Integer(string='Attempts', readonly=True)
+    next_attempt_date = fields.Datetime(string='Next Attempt', index=True)
+    checkpoint = fields.Char(string='Checkpoint', help='Last item processed by the chunk')
+    message = fields.Text(string='Message')
+
+    def _get_params(self):
+        self.ensure_one()
+        return json.loads(self.params or '{}')
+
+    def _process(self):
+        """
+        Run the method of the resource model on the chunk, the worker commits the chunk once the method is done
+        and rolls it back if the method fails
+        """
+        self.ensure_one()
+        getattr(self.env[self.log_id.res_model], self.method)(self)
+
+    def _mark_failed(self, message):
+        """
+        Schedule a new attempt with an exponential backoff, the chunk fails after MAX_ATTEMPTS attempts
+        """
+        for chunk in self:
+            attempt_count = chunk.attempt_count + 1
+            vals = {'attempt_count': attempt_count, 'message': message}
+            if attempt_count < MAX_ATTEMPTS:
+                vals.update({
+                    'state': 'pending',
+                    'next_attempt_date': fields.Datetime.now() + timedelta(
+                        seconds=RETRY_BASE_DELAY * 2 ** (attempt_count - 1)),
+                })
+            else:
+                vals['state'] = 'failed'
+            chunk.write(vals)
+
+    def _requeue(self):
+        self.write({'state': 'pending', 'attempt_count': 0, 'next_attempt_date': False})
+
+    @api.model
+    def _run_chunk(self, chunk_id):
+        """
+        Process a chunk in its own cursor, so that chunks run in parallel threads
+        """
+        with api.Environment.manage(), self.pool.cursor() as cr:
+            chunk = self.with_env(self.env(cr=cr)).browse(chunk_id)
+            try:
+                chunk._process()
+                chunk.write({'state': 'done', 'message': False})
+            except Exception as e:
+                cr.rollback()
+                chunk.invalidate_cache()
+                _logger.exception('Request log chunk %s failed: %s' % (chunk_id, e))
+                chunk._mark_failed(str(e))
+
+    @api.model
+    def _claim_pending_chunks(self, limit=CLAIM_LIMIT):
+        """
+        Lock the chunks ready to run and mark them as running, the chunks locked by another worker are skipped
+        """
+        self.flush()
+        self.env.cr.execute("""
+            UPDATE request_log_chunk SET state = 'pending'
+            WHERE state = 'running' AND write_date < (now() at time zone 'UTC') - %s * interval '1 second'
+        """, (RUNNING_TIMEOUT,))
+        self.env.cr.execute("""
+            SELECT id FROM request_log_chunk
+            WHERE state = 'pending' AND (next_attempt_date IS NULL OR next_attempt_date <= now() at time zone 'UTC')
+            ORDER BY next_attempt_date NULLS FIRST, id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (limit,))
+        chunks = self.browse([chunk_id for chunk_id, in self.env.cr.fetchall()])
+        chunks.write({'state': 'running'})
+        self.env.cr.commit()
+        return chunks
+
+    @api.model
+    def _cron_process_chunks(self, limit=CLAIM_LIMIT):
+        """
+        Drain the pending chunks in a thread pool, then update the status of the logs whose chunks are over
+        """
+        chunks = self._claim_pending_chunks(limit)
+        if chunks:
+            max_workers = int(self.env['ir.config_parameter'].sudo().get_param(
+                'phd_request_log.chunk_workers', DEFAULT_CHUNK_WORKERS))
+            with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+                list(executor.map(self._run_chunk, chunks.ids))
+            # The workers committed on their own cursors, a new transaction sees their results
+            self.env.cr.commit()
+            self.invalidate_cache()
+            chunks.mapped('log_id')._update_status_from_chunks()
+        # The logs of the chunks finished by former runs, e.g. the runs which could not see the last chunks done
+        self.env['request.log']._update_finished_logs()
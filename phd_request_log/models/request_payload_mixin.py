@@ -0,0 +1,37 @@
+import base64
+import gzip
+import json
+
+from odoo import api, models, fields, _
+
+
+class RequestPayloadMixin(models.AbstractModel):
+    _name = 'request.payload.mixin'
+    _description = 'Request Payload Mixin'
+
+    payload_attachment_id = fields.Many2one('ir.attachment', string='Payload', readonly=True, copy=False)
+
+    def _set_payload(self, data):
+        """
+        Store the payload as a gzipped JSON attachment, instead of a text column of the record
+        :param data: JSON serializable data
+        """
+        self.ensure_one()
+        content = gzip.compress(json.dumps(data, default=str).encode())
+        vals = {
+            'name': '%s-%s.json.gz' % (self._table, self.id),
+            'datas': base64.b64encode(content),
+            'res_model': self._name,
+            'res_id': self.id,
+            'mimetype': 'application/gzip',
+        }
+        if self.payload_attachment_id:
+            self.payload_attachment_id.sudo().write(vals)
+        else:
+            self.payload_attachment_id = self.env['ir.attachment'].sudo().create(vals)
+
+    def _get_payload(self):
+        self.ensure_one()
+        if not self.payload_attachment_id:
+            return None
+        return json.loads(gzip.decompress(base64.b64decode(self.payload_attachment_id.sudo().datas)))
@@ -0,0 +1 @@
+from . import test_request_log_chunk
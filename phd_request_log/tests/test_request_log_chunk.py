@@ -0,0 +1,105 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests import common, tagged
+from odoo.tools import mute_logger
+
+from ..models.request_log_chunk import MAX_ATTEMPTS, RUNNING_TIMEOUT
+
+
+def _process_test_chunk(self, chunk):
+    params = chunk._get_params()
+    if params.get('fail'):
+        raise ValueError('Chunk %s failed' % chunk.name)
+    chunk.write({'checkpoint': chunk.name})
+
+
+@tagged('post_install', '-at_install')
+class TestRequestLogChunk(common.SavepointCase):
+
+    def setUp(self):
+        super(TestRequestLogChunk, self).setUp()
+        # The workers open their cursors on the test transaction, and the cron commits are kept in it
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+        for patcher in [
+            patch.object(type(self.env['request.log']), '_process_test_chunk', _process_test_chunk, create=True),
+            patch.object(self.cr, 'commit', lambda: None),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.env['request.log.chunk'].search([('state', 'in', ['pending', 'running'])]).write({'state': 'done'})
+
+    def _create_job(self, *chunk_params):
+        return self.env['request.log']._create_job('request.log', '_process_test_chunk', [
+            {'name': 'Chunk %s' % i, 'params': params} for i, params in enumerate(chunk_params)])
+
+    def _set_write_date(self, chunks, write_date):
+        chunks.flush()
+        self.env.cr.execute('UPDATE request_log_chunk SET write_date = %s WHERE id IN %s',
+                            (write_date, tuple(chunks.ids)))
+        chunks.invalidate_cache()
+
+    def test_claim(self):
+        log = self._create_job({}, {}, {}, {})
+        ready, later, stale, fresh = log.chunk_ids
+        later.next_attempt_date = fields.Datetime.now() + timedelta(hours=1)
+        (stale | fresh).write({'state': 'running'})
+        self._set_write_date(stale, fields.Datetime.now() - timedelta(seconds=RUNNING_TIMEOUT + 60))
+
+        chunks = self.env['request.log.chunk']._claim_pending_chunks()
+        self.assertEqual(chunks, ready | stale)
+        chunks.invalidate_cache()
+        self.assertEqual(log.chunk_ids.mapped('state'), ['running', 'pending', 'running', 'running'])
+
+    def test_retry(self):
+        log = self._create_job({'fail': True})
+        chunk = log.chunk_ids
+        with mute_logger('odoo.addons.phd_request_log.models.request_log_chunk'):
+            self.env['request.log.chunk']._run_chunk(chunk.id)
+        chunk.invalidate_cache()
+        self.assertEqual((chunk.state, chunk.attempt_count), ('pending', 1))
+        self.assertIn('Chunk 0 failed', chunk.message)
+        self.assertGreater(chunk.next_attempt_date, fields.Datetime.now())
+
+        chunk._mark_failed('Failed again')
+        delay = chunk.next_attempt_date - fields.Datetime.now()
+        self.assertGreater(delay, timedelta(seconds=60))
+        for attempt in range(MAX_ATTEMPTS - 2):
+            chunk._mark_failed('Failed again')
+        self.assertEqual((chunk.state, chunk.attempt_count), ('failed', MAX_ATTEMPTS))
+
+        log.run()
+        self.assertEqual((chunk.state, chunk.attempt_count, log.status), ('pending', 0, 'running'))
+
+    def test_status_roll_up(self):
+        log = self._create_job({}, {'fail': True})
+        done_chunk, failed_chunk = log.chunk_ids
+        with mute_logger('odoo.addons.phd_request_log.models.request_log_chunk'):
+            self.env['request.log.chunk']._cron_process_chunks()
+        log.invalidate_cache()
+        self.assertEqual(done_chunk.state, 'done')
+        self.assertEqual(done_chunk.checkpoint, 'Chunk 0')
+        self.assertEqual(failed_chunk.state, 'pending')
+        self.assertEqual(log.status, 'running')
+
+        failed_chunk.write({'state': 'failed'})
+        self.env['request.log.chunk']._cron_process_chunks()
+        self.assertEqual((log.status, log.is_resolved), ('failed', False))
+
+        failed_chunk.write({'params': '{}', 'state': 'pending', 'next_attempt_date': False})
+        self.env['request.log.chunk']._cron_process_chunks()
+        log.invalidate_cache()
+        self.assertEqual(log.chunk_ids.mapped('state'), ['done', 'done'])
+        self.assertEqual((log.status, log.is_resolved), ('done', True))
+
+    def test_finished_logs_without_claim(self):
+        """ A log whose chunks were finished by a former run is updated even when no chunk is claimed """
+        log = self._create_job({}, {})
+        log.chunk_ids.flush()
+        self.env.cr.execute("UPDATE request_log_chunk SET state = 'done' WHERE log_id = %s", (log.id,))
+        log.chunk_ids.invalidate_cache()
+        self.env['request.log.chunk']._cron_process_chunks()
+        log.invalidate_cache()
+        self.assertEqual(log.status, 'done')
@@ -1,16 +1,18 @@
 # -*- coding: utf-8 -*-
-import dicttoxml
 import base64
+import logging
 import xmltodict
 
 from odoo import models, fields, api, _
 from datetime import datetime
-from xml.dom.minidom import parseString
 from collections import Counter
 from odoo.exceptions import Warning, ValidationError
 from odoo.osv import expression
+from odoo.tools import split_every
 from ..utils.exceptions import EDITransactionValidationError
-from ..utils.helpers import ensure_list
+from ..utils.helpers import ensure_list, dict_to_xml
+
+_logger = logging.getLogger(__name__)
 
 # Tag name using for parsing EDI Document XML files
 ORDER_TAG = 'Order'
@@ -106,6 +108,9 @@ LINE_PRICE_QTY_CHANGE = 'PQ'
 LINE_PRICE_CHANGE = 'PC'
 LINE_ADD = 'AI'
 
+# Number of EDI 850 files imported together in batch mode
+IMPORT_850_BATCH_SIZE = 50
+
 
 class EDITransaction(models.Model):
     _name = "edi.transaction"
@@ -208,7 +213,7 @@ class EDITransaction(models.Model):
     # SCHEDULED ACTION
     ###################################
     def action_import_sps_850(self):
-        res = self.action_import_edi_transaction(PO)
+        res = self.action_import_edi_850_batch()
         return res
 
     def action_import_edi_860(self):
@@ -231,11 +236,7 @@ class EDITransaction(models.Model):
         has_sync_succeeded = True
         date_now = datetime.now()
         for edi_file in edi_files:
-            edi_xml = edi_file.attachment_id.datas.decode('utf-8')
-            edi_xml = base64.b64decode(edi_xml)
-
-            # Parse EDI transaction from xml to dict
-            edi_dict = xmltodict.parse(edi_xml)
+            edi_dict = self._parse_edi_file(edi_file)
 
             try:
                 # Get vals and model need to sync with Odoo
@@ -250,21 +251,107 @@ class EDITransaction(models.Model):
                     })
             except EDITransactionValidationError as e:
                 has_sync_succeeded = False
-                edi_file.write({'sync_status': 'error'})
-                if edi_file and edi_file.sync_status in 'error':
-                    # Send notify to EDI Files chatter and send email
-                    edi_file_url = edi_file.get_sps_file_url()
-                    body = _(e.name.replace('\n', '<br>')) + \
-                           '<br><br><a style="font-weight:bold" href="%s">View in Odoo</a>' % edi_file_url
-
-                    edi_file.with_context(mail_notify_force_send=True).message_post(body=body,
-                                                                                    subject='Error when import EDI %s %s'
-                                                                                            % (doc_type,
-                                                                                               edi_file.display_name),
-                                                                                    message_type='email',
-                                                                                    subtype='mt_comment')
+                self._notify_edi_file_error(edi_file, doc_type, e)
         return has_sync_succeeded
 
+    def action_import_edi_850_batch(self):
+        """
+        Sync all pending EDI 850 from SPS to Odoo Database in batch: the files of a batch are parsed first,
+        the partners, products and terms they refer to are resolved together and the Sale Orders are created
+        with a single create call
+        :return:
+        :rtype: bool
+        """
+        edi_files = self.env['phd.sps.commerce.file'].search([('sync_status', 'not in', ['done', 'error']),
+                                                              ('document_type', '=', PO)])
+        has_sync_succeeded = True
+        date_now = datetime.now()
+        for edi_files_batch in split_every(IMPORT_850_BATCH_SIZE, edi_files.ids, edi_files.browse):
+            edi_dict_by_file = [(edi_file, self._parse_edi_file(edi_file)) for edi_file in edi_files_batch]
+            lookup = self._prepare_850_lookup([edi_dict for edi_file, edi_dict in edi_dict_by_file])
+
+            order_files = []
+            order_vals_list = []
+            for edi_file, edi_dict in edi_dict_by_file:
+                try:
+                    vals = self._prepare_order_vals_from_edi_850(edi_dict, lookup=lookup)
+                except EDITransactionValidationError as e:
+                    has_sync_succeeded = False
+                    self._notify_edi_file_error(edi_file, PO, e)
+                    continue
+                if vals:
+                    order_files.append(edi_file)
+                    order_vals_list.append(vals)
+
+            if lookup['customer_info_vals']:
+                self.env['product.customerinfo'].create(lookup['customer_info_vals'])
+            created_orders = self._create_850_orders(order_files, order_vals_list)
+            if len(created_orders) < len(order_files):
+                has_sync_succeeded = False
+            for edi_file, order_id in created_orders:
+                edi_file.update({
+                    'sync_status': 'done',
+                    'last_imported': date_now,
+                    'origin': "%s,%s" % (order_id._name, order_id.id)
+                })
+        return has_sync_succeeded
+
+    def _create_850_orders(self, order_files, order_vals_list):
+        """
+        Create the Sale Orders of an EDI 850 batch, one by one if the batch cannot be created at once. A file
+        whose order cannot be created is marked as error and the other orders are still created.
+        :param order_files: EDI 850 files of the orders
+        :type order_files: list(phd.sps.commerce.file)
+        :param order_vals_list:
+        :type order_vals_list: list(dict)
+        :return: (EDI file, created order) of the orders which have been created
+        :rtype: list
+        """
+        if not order_vals_list:
+            return []
+        try:
+            with self.env.cr.savepoint():
+                return list(zip(order_files, self.env['sale.order'].create(order_vals_list)))
+        except Exception:
+            _logger.info('Cannot create the Sale Orders of the EDI 850 batch at once, creating them one by one')
+
+        created_orders = []
+        for edi_file, vals in zip(order_files, order_vals_list):
+            try:
+                with self.env.cr.savepoint():
+                    created_orders.append((edi_file, self.env['sale.order'].create(vals)))
+            except Exception as e:
+                _logger.exception('Cannot create the Sale Order of the EDI file %s' % edi_file.display_name)
+                error = e if isinstance(e, EDITransactionValidationError) else EDITransactionValidationError(str(e))
+                self._notify_edi_file_error(edi_file, PO, error)
+        return created_orders
+
+    def _parse_edi_file(self, edi_file):
+        """
+        Parse EDI transaction from xml to dict
+        :param edi_file:
+        :type edi_file: phd.sps.commerce.file
+        :rtype: dict
+        """
+        edi_xml = edi_file.attachment_id.datas.decode('utf-8')
+        edi_xml = base64.b64decode(edi_xml)
+        return xmltodict.parse(edi_xml)
+
+    def _notify_edi_file_error(self, edi_file, doc_type, error):
+        edi_file.write({'sync_status': 'error'})
+        if edi_file and edi_file.sync_status in 'error':
+            # Send notify to EDI Files chatter and send email
+            edi_file_url = edi_file.get_sps_file_url()
+            body = _(error.name.replace('\n', '<br>')) + \
+                   '<br><br><a style="font-weight:bold" href="%s">View in Odoo</a>' % edi_file_url
+
+            edi_file.with_context(mail_notify_force_send=True).message_post(body=body,
+                                                                            subject='Error when import EDI %s %s'
+                                                                                    % (doc_type,
+                                                                                       edi_file.display_name),
+                                                                            message_type='email',
+                                                                            subtype='mt_comment')
+
     def action_approve_ack(self):
         for ack in self:
             if ack.ack_type == ACK_CHANGE:
@@ -376,6 +463,21 @@ class EDITransaction(models.Model):
                 sps_file_processor = self.env['phd.sps.commerce.file']
                 edi.attachment_id = sps_file_processor.create_edi_file_send_to_sps(fd).attachment_id
 
+    def action_submit_edi_855_bulk(self):
+        """
+        Submit the pending Acknowledgements (all of them if none is selected)
+        and upload their files to SPS over one SFTP session
+        """
+        edi_ids = self or self.search([('type', '=', PO_ACK), ('state', '=', ACK)])
+        edi_ids = edi_ids.filtered(lambda edi: edi.type == PO_ACK and edi.state == ACK)
+        if not edi_ids:
+            return
+        edi_ids.action_submit_edi_855()
+        sps_files = self.env['phd.sps.commerce.file'].search(
+            [('attachment_id', 'in', edi_ids.mapped('attachment_id').ids), ('sync_status', 'not in', ['done'])])
+        if sps_files:
+            sps_files.action_send_edi_to_sps(file_to_sync=sps_files)
+
     ###################################
     # EDI 855 HELPER FUNCTIONS
     ###################################
@@ -393,11 +495,7 @@ class EDITransaction(models.Model):
         edi_855_dict = {'OrderAck': [meta_dict, header_dict] + line_items}
 
         # Convert dictionary to xml
-        xml = dicttoxml.dicttoxml(edi_855_dict, attr_type=False, root=False)
-        xml = xml.decode("utf-8")
-        xml = xml.replace('<item>', '').replace('</item>', '')
-        xml = parseString(xml).toprettyxml()
-        return xml
+        return dict_to_xml(edi_855_dict)
 
     def _prepare_855_edi_header(self):
         order_id = self.order_id
@@ -499,11 +597,7 @@ class EDITransaction(models.Model):
         edi_865_dict = {'OrderChangeAck': [meta_dict, header_dict]}
 
         # Convert dictionary to xml
-        xml = dicttoxml.dicttoxml(edi_865_dict, attr_type=False, root=False)
-        xml = xml.decode("utf-8")
-        xml = xml.replace('<item>', '').replace('</item>', '')
-        xml = parseString(xml).toprettyxml()
-        return xml
+        return dict_to_xml(edi_865_dict)
 
     def _prepare_865_edi_header(self):
         date_now = datetime.now().date()
@@ -537,26 +631,117 @@ class EDITransaction(models.Model):
     ###################################
     # EDI 850 HELPERS FUNCTIONS
     ###################################
-    def _prepare_order_vals_from_edi_850(self, sps_850_xml):
+    def _prepare_850_lookup(self, edi_dicts):
+        """
+        Resolve with a few queries the orders, terms, partners and products referred by EDI 850 documents
+        :param edi_dicts: parsed EDI 850 documents
+        :type edi_dicts: list(dict)
+        :return: lookup tables used by the EDI 850 parsing helpers
+        :rtype: dict
+        """
+        client_order_refs = set()
+        term_names = set()
+        location_numbers = set()
+        address_names = set()
+        default_codes = set()
+        customer_product_codes = set()
+        for edi_dict in edi_dicts:
+            order = edi_dict.get(ORDER_TAG) or {}
+            header = order.get(HEADER_TAG) or {}
+            client_order_refs.add((header.get(ORDER_HEADER_PATH) or {}).get(CLIENT_ORDER_REF))
+            term_names.add((header.get(INCOTERM_PATH) or {}).get(INCOTERM_CODE_PATH))
+            term_names.add((header.get(PAYMENT_TERM_PATH) or {}).get(TERM_DESCRIPTION_PATH))
+            for address in ensure_list(header.get(ADDRESS_PATH)):
+                location_numbers.add(address.get(ADDRESS_LOCATION_NUMBER_PATH))
+                address_names.add(address.get(ADDRESS_NAME_PATH))
+            for item in ensure_list(order.get(LINE_ITEM_TAG)):
+                order_line = item.get(ORDER_LINE_TAG) or {}
+                default_codes.add(order_line.get(DEFAULT_CODE_TAG))
+                customer_product_codes.add(order_line.get(CUSTOMER_PRODUCT_CODE_TAG))
+
+        orders_by_ref = {}
+        for order_id in self.env['sale.order'].search([('client_order_ref', 'in', list(filter(None, client_order_refs))),
+                                                       ('state', 'not in', ['cancel'])]):
+            key = (order_id.client_order_ref, order_id.sps_trading_partner_id)
+            orders_by_ref[key] = orders_by_ref.get(key, self.env['sale.order']) | order_id
+
+        term_id_by_name = {}
+        for term_id in self.env['account.payment.term'].search([('name', 'in', list(filter(None, term_names)))]):
+            term_id_by_name.setdefault(term_id.name, term_id.id)
+
+        # Keep the rank of the partners to pick the same partner as a search on location number or name
+        partner_ids = self.env['res.partner'].search(
+            ['|', ('address_location_number', 'in', list(filter(None, location_numbers))),
+             ('name', 'in', list(filter(None, address_names)))])
+        partner_rank = {partner_id.id: rank for rank, partner_id in enumerate(partner_ids)}
+        partners_by_location_number = {}
+        partners_by_name = {}
+        for partner_id in partner_ids:
+            if partner_id.address_location_number:
+                partners_by_location_number.setdefault(partner_id.address_location_number, partner_id)
+            partners_by_name.setdefault(partner_id.name, partner_id)
+
+        analytic_id_by_partner = {}
+        analytic_ids = self.env['account.analytic.account'].search(
+            [('partner_id', 'in', (partner_ids | partner_ids.mapped('parent_id')).ids)])
+        for analytic_id in analytic_ids:
+            analytic_id_by_partner.setdefault(analytic_id.partner_id.id, analytic_id.id)
+
+        products_by_code = {}
+        for product_id in self.env['product.product'].search([('default_code', 'in',
+                                                               list(filter(None, default_codes)))]):
+            products_by_code[product_id.default_code] = products_by_code.get(
+                product_id.default_code, self.env['product.product']) | product_id
+
+        products_by_customer_code = {}
+        for customer_info in self.env['product.customerinfo'].search(
+                [('product_name', 'in', list(filter(None, customer_product_codes)))]):
+            key = (customer_info.partner_id.id, customer_info.product_name)
+            products_by_customer_code[key] = products_by_customer_code.get(
+                key, self.env['product.product']) | customer_info.product_id
+
+        return {
+            'orders_by_ref': orders_by_ref,
+            'imported_refs': set(),
+            'term_id_by_name': term_id_by_name,
+            'partner_rank': partner_rank,
+            'partners_by_location_number': partners_by_location_number,
+            'partners_by_name': partners_by_name,
+            'analytic_id_by_partner': analytic_id_by_partner,
+            'products_by_code': products_by_code,
+            'products_by_customer_code': products_by_customer_code,
+            'customer_info_vals': [],
+        }
+
+    def _get_850_payment_term_id(self, name, lookup=None):
+        if lookup is None:
+            return self.env['account.payment.term'].search([('name', '=', name)]).id
+        return lookup['term_id_by_name'].get(name, False)
+
+    def _prepare_order_vals_from_edi_850(self, sps_850_xml, lookup=None):
         order = sps_850_xml.get(ORDER_TAG)
         vals = {}
         if order:
             # Parse Header vals
             header = order.get(HEADER_TAG)
             if header:
-                header_vals = self._parse_850_header_vals(header)
+                header_vals = self._parse_850_header_vals(header, lookup=lookup)
                 vals.update(header_vals)
             # Add default analytic account id
             partner_id = self.env['res.partner'].browse(vals.get('partner_id'))
-            analytic_id = self.env['account.analytic.account'].search([('partner_id', '=', partner_id.id)], limit=1)
-            vals.update({'analytic_account_id': analytic_id.id})
+            if lookup is not None and partner_id:
+                analytic_id = lookup['analytic_id_by_partner'].get(partner_id.id, False)
+            else:
+                analytic_id = self.env['account.analytic.account'].search([('partner_id', '=', partner_id.id)],
+                                                                          limit=1).id
+            vals.update({'analytic_account_id': analytic_id})
 
             # Parse Line item vals
             line_items = order.get(LINE_ITEM_TAG)
             if line_items:
                 partner_id = vals.get('partner_id')
                 line_items = ensure_list(line_items)
-                line_vals = self._parse_850_order_line_vals(line_items, partner_id)
+                line_vals = self._parse_850_order_line_vals(line_items, partner_id, lookup=lookup)
                 line_vals = {
                     'order_line': [(0, 0, line_val) for line_val in line_vals]
                 }
@@ -564,22 +749,33 @@ class EDITransaction(models.Model):
 
         return vals
 
-    def _parse_850_order_header_vals(self, order_header):
+    def _parse_850_order_header_vals(self, order_header, lookup=None):
         vals = {}
         sps_trading_partner_id = order_header.get(SPS_TRADING_PARTNER_ID_PATH)
 
         client_order_ref = order_header.get(CLIENT_ORDER_REF)
         division = order_header.get(DIVISION, False)
 
-        order_id = self.env['sale.order'].search([('client_order_ref', '=', client_order_ref),
-                                                  ('sps_trading_partner_id', '=', sps_trading_partner_id),
-                                                  ('state', 'not in', ['cancel'])])
+        if lookup is None:
+            order_id = self.env['sale.order'].search([('client_order_ref', '=', client_order_ref),
+                                                      ('sps_trading_partner_id', '=', sps_trading_partner_id),
+                                                      ('state', 'not in', ['cancel'])])
+        else:
+            order_id = lookup['orders_by_ref'].get((client_order_ref, sps_trading_partner_id))
 
         if order_id:
             validation_error_message = 'The Order <a href="#" data-oe-model="%s" data-oe-id="%s">%s</a> ' \
-                                       'already exists in the system' % (order_id._name, order_id.id, client_order_ref)
+                                       'already exists in the system' % (order_id[0]._name, order_id[0].id,
+                                                                         client_order_ref)
             raise EDITransactionValidationError(_(validation_error_message))
 
+        if lookup is not None:
+            # The same Order can be sent twice in one batch, only the first file creates it
+            if (client_order_ref, sps_trading_partner_id) in lookup['imported_refs']:
+                validation_error_message = "The Order %s already exists in another EDI file" % client_order_ref
+                raise EDITransactionValidationError(_(validation_error_message))
+            lookup['imported_refs'].add((client_order_ref, sps_trading_partner_id))
+
         date_order = order_header.get(SO_ORDER_DATE_PATH)
         vendor_code = order_header.get(VENDOR_CODE_PATH)
         sps_customer_order_number = order_header.get(CUSTOMER_ORDER_NUMBER, False)
@@ -593,23 +789,25 @@ class EDITransaction(models.Model):
         })
         return vals
 
-    def _parse_850_header_vals(self, header):
+    def _parse_850_header_vals(self, header, lookup=None):
         """
         Parse Order information from EDI 850 Header
         :param header:
         :type header: dict
+        :param lookup: lookup tables of the batch import, see _prepare_850_lookup
+        :type lookup: dict
         :return:
         :rtype: dict
         """
         order_header = header.get(ORDER_HEADER_PATH)
         vals = {}
         if order_header:
-            order_header_vals = self._parse_850_order_header_vals(order_header)
+            order_header_vals = self._parse_850_order_header_vals(order_header, lookup=lookup)
             vals.update(order_header_vals)
 
         incoterm_code = header.get(INCOTERM_PATH, {}).get(INCOTERM_CODE_PATH)
         if incoterm_code:
-            incoterm_id = self.env['account.payment.term'].search([('name', '=', incoterm_code)]).id
+            incoterm_id = self._get_850_payment_term_id(incoterm_code, lookup=lookup)
             vals.update({'incoterm': incoterm_id})
 
         packaging_info = header.get(PACKAGING_PATH)
@@ -631,7 +829,7 @@ class EDITransaction(models.Model):
         if addresses:
             # Cast Address to list
             addresses = ensure_list(addresses)
-            address_vals = self._parse_850_address_vals(addresses)
+            address_vals = self._parse_850_address_vals(addresses, lookup=lookup)
             vals.update(address_vals)
 
         # Get the partner to parse the right value of schedule date
@@ -645,18 +843,17 @@ class EDITransaction(models.Model):
             vals.update(date_vals)
 
         payment_term = header.get(PAYMENT_TERM_PATH, {}).get(TERM_DESCRIPTION_PATH)
-        payment_term_vals = self._parse_850_payment_term_vals(payment_term, partner_id)
+        payment_term_vals = self._parse_850_payment_term_vals(payment_term, partner_id, lookup=lookup)
         vals.update(payment_term_vals)
 
         return vals
 
-    def _parse_850_payment_term_vals(self, payment_term, partner_id):
+    def _parse_850_payment_term_vals(self, payment_term, partner_id, lookup=None):
         """
         Get SO payment term from SPS 850 header
         :rtype: dict
         """
-        payment_term_id = self.env['account.payment.term'].search([('name', '=', payment_term)]).id \
-            if payment_term else False
+        payment_term_id = self._get_850_payment_term_id(payment_term, lookup=lookup) if payment_term else False
         # Get the default payment term instead
         if not payment_term_id and partner_id:
             partner_id = self.env['res.partner'].browse(partner_id)
@@ -692,11 +889,13 @@ class EDITransaction(models.Model):
 
         return vals
 
-    def _parse_850_address_vals(self, addresses):
+    def _parse_850_address_vals(self, addresses, lookup=None):
         """
         Parsing Order Address vals
         :param addresses:
         :type addresses: list
+        :param lookup: lookup tables of the batch import, see _prepare_850_lookup
+        :type lookup: dict
         :return:
         :rtype: dict
         """
@@ -717,7 +916,13 @@ class EDITransaction(models.Model):
                 domain = expression.OR([domain, [('name', '=', address_name)]])
 
             partner_id_temp = False
-            if domain:
+            if domain and lookup is not None:
+                partner_id_temp = [lookup['partners_by_location_number'].get(address_location_number),
+                                   lookup['partners_by_name'].get(address_name)]
+                partner_id_temp = sorted(filter(None, partner_id_temp),
+                                         key=lambda partner: lookup['partner_rank'][partner.id])
+                partner_id_temp = partner_id_temp and partner_id_temp[0]
+            elif domain:
                 partner_id_temp = self.env['res.partner'].search(domain)
                 partner_id_temp = partner_id_temp and partner_id_temp[0]
 
@@ -747,7 +952,7 @@ class EDITransaction(models.Model):
         }
         return vals
 
-    def _parse_850_order_line_vals(self, line_items, partner_id):
+    def _parse_850_order_line_vals(self, line_items, partner_id, lookup=None):
         vals = []
         error_messeage_queue = []
         counter = 1
@@ -760,11 +965,18 @@ class EDITransaction(models.Model):
 
                 product_id = False
                 if default_code:
-                    product_id = self.env['product.product'].search([('default_code', '=', default_code)])
+                    if lookup is None:
+                        product_id = self.env['product.product'].search([('default_code', '=', default_code)])
+                    else:
+                        product_id = lookup['products_by_code'].get(default_code, False)
                 if customer_product_code and not product_id:
-                    product_id = self.env['product.customerinfo'].search([('partner_id', '=', partner_id),
-                                                                          ('product_name', '=',
-                                                                           customer_product_code)]).product_id
+                    if lookup is None:
+                        product_id = self.env['product.customerinfo'].search(
+                            [('partner_id', '=', partner_id),
+                             ('product_name', '=', customer_product_code)]).product_id
+                    else:
+                        product_id = lookup['products_by_customer_code'].get((partner_id, customer_product_code),
+                                                                             False)
                 if not product_id:
                     error_messeage_queue.append(_(
                         "Wrong VendorPartNumber %s or BuyerPartnumber %s for line %s, please correct it." % (
@@ -777,11 +989,16 @@ class EDITransaction(models.Model):
                 if customer_product_code:
                     product_customer_infos = product_id.buyer_ids.filtered(lambda rec: rec.partner_id == partner_id)
                     if not product_customer_infos:
-                        product_customer_infos.create({
+                        customer_info_vals = {
                             'product_id': product_id.id,
                             'partner_id': partner_id,
                             'product_name': customer_product_code
-                        })
+                        }
+                        # In batch mode the customer infos are created together with the orders
+                        if lookup is None:
+                            product_customer_infos.create(customer_info_vals)
+                        else:
+                            lookup['customer_info_vals'].append(customer_info_vals)
 
                 price_unit = float(order_line.get(PRICE_UNIT_TAG))
                 product_uom_qty = float(order_line.get(PRODUCT_UOM_QTY_TAG))
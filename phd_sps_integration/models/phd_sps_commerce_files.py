@@ -1,11 +1,12 @@
 from odoo import api, fields, models
 import logging
-import paramiko
 import base64
 import os.path
 from datetime import datetime as dt
 from ast import literal_eval
+from odoo.tools import split_every
 from odoo.addons.phd_sps_integration.models.edi_transaction import PO, PO_CHANGE, PO_PREFIX, PO_CHANGE_PREFIX
+from odoo.addons.phd_sps_integration.utils.sftp import SFTPConnectionPool, SFTPFetcher, DEFAULT_MAX_WORKERS
 
 _logger = logging.getLogger(__name__)
 
@@ -18,6 +19,9 @@ DOC_CODE_LENGTH = 2
 
 DOC_SEND_TO_SPS_TYPE = ['810', '855', '865']
 
+# Number of files downloaded and created in one transaction
+FETCH_CHUNK_SIZE = 100
+
 
 class PHDSPSCommerceFiles(models.Model):
     _name = "phd.sps.commerce.file"
@@ -38,6 +42,10 @@ class PHDSPSCommerceFiles(models.Model):
     attachment_id = fields.Many2one('ir.attachment', string='Attachment', ondelete='cascade')
     unique = fields.Char()
 
+    _sql_constraints = [
+        ('unique_file_uniq', 'unique("unique")', 'The SPS file already exists!'),
+    ]
+
     def get_sps_file_url(self):
         base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
 
@@ -67,15 +75,11 @@ class PHDSPSCommerceFiles(models.Model):
     def _sps_sftp_server(self):
         sftp_config = self._sftp_config()
         is_connection = False
+        ssh = False
         if sftp_config:
-            ip = sftp_config['host']
-            username = sftp_config['username']
-            password = sftp_config['password']
-            port = sftp_config['port']
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
             try:
-                ssh.connect(ip, port, username, password)
+                ssh = SFTPConnectionPool.get_client(sftp_config['host'], sftp_config['port'],
+                                                    sftp_config['username'], sftp_config['password'])
                 is_connection = True
             except Exception as e:
                 _logger.exception('SPS SFTP Server connection failed: %s' % str(e))
@@ -95,47 +99,86 @@ class PHDSPSCommerceFiles(models.Model):
 
     @api.model
     def _fetch_order(self):
+        out_dir = self.env['ir.config_parameter'].sudo().get_param('phd_sps_integration.sftp_out_path', "")
+        if out_dir == "":
+            return
         is_connection, ssh = self._sps_sftp_server()
-        dirs = [
-            {
-                'dir': self.env['ir.config_parameter'].sudo().get_param('phd_sps_integration.sftp_out_path', "")
-            },
-        ]
-        for dir in dirs:
-            if is_connection:
-                if dir['dir'] != "":
-                    sftp = ssh.open_sftp()
-                    if self._change_dir(dir=dir['dir'], sftp=sftp):
-                        today = fields.Datetime.now()
-                        for temp in sftp.listdir_attr():
-                            if os.path.splitext(temp.filename)[1] != '':
-                                doc_type = DOC_TYPE_BY_CODE.get(temp.filename[:DOC_CODE_LENGTH])
-                                unique = dir['dir'] + '/' + temp.filename
-                                file = self.env['phd.sps.commerce.file'].search([('unique', '=', unique)], limit=1)
-                                if not file:
-                                    datetime = fields.datetime.now()
-                                    attachment = self.env['ir.attachment'].create({
-                                        'name': temp.filename,
-                                        'type': 'binary',
-                                        'datas': base64.b64encode(sftp.open(temp.filename).read()),
-                                    })
-
-                                    if attachment:
-                                        values = {
-                                            'name': os.path.splitext(temp.filename)[0],
-                                            'upload_download_time': datetime,
-                                            'last_modify_on_remote': dt.fromtimestamp(temp.st_mtime),
-                                            'sync_status': 'pending',
-                                            'document_type': doc_type,
-                                            'unique': dir['dir'] + '/' + temp.filename,
-                                            'attachment_id': attachment.id,
-                                        }
-                                    sps_file = self.env['phd.sps.commerce.file'].create(values)
-                                    sps_file.message_subscribe(partner_ids=sps_file._get_sps_followers())
-                                if file and (today - dt.fromtimestamp(temp.st_mtime)).days >= 1:
-                                    sftp.remove(unique)
-                            self._cr.commit()
-                    sftp.close()
+        if is_connection:
+            sftp = ssh.open_sftp()
+            try:
+                if self._change_dir(dir=out_dir, sftp=sftp):
+                    self._fetch_files(out_dir, sftp, ssh.open_sftp)
+            finally:
+                sftp.close()
+
+    @api.model
+    def _fetch_files(self, out_dir, sftp, open_sftp):
+        """
+        Download the new files of the SPS out directory and create their EDI files
+        :param out_dir: configured out directory, prefix of the unique key of the files
+        :param sftp: SFTP client, its current directory is the out directory
+        :param open_sftp: callable opening a new SFTP client on the same connection
+        """
+        today = fields.Datetime.now()
+        remote_files = {out_dir + '/' + temp.filename: temp for temp in sftp.listdir_attr()
+                        if os.path.splitext(temp.filename)[1] != ''}
+        known_uniques = self._get_known_uniques(list(remote_files))
+
+        new_files = []
+        for unique, temp in remote_files.items():
+            if unique not in known_uniques:
+                new_files.append(temp)
+            elif (today - dt.fromtimestamp(temp.st_mtime)).days >= 1:
+                sftp.remove(unique)
+
+        max_workers = self.env['ir.config_parameter'].sudo().get_param('phd_sps_integration.sftp_fetch_workers',
+                                                                       DEFAULT_MAX_WORKERS)
+        fetcher = SFTPFetcher(open_sftp, max_workers=max_workers)
+        try:
+            for chunk in split_every(FETCH_CHUNK_SIZE, new_files):
+                contents = fetcher.download(sftp.getcwd(), [temp.filename for temp in chunk])
+                self._create_fetched_files(out_dir, [temp for temp in chunk if temp.filename in contents],
+                                           contents)
+                self._cr.commit()
+        finally:
+            fetcher.close()
+
+    @api.model
+    def _get_known_uniques(self, uniques):
+        if not uniques:
+            return set()
+        self._cr.execute('SELECT "unique" FROM phd_sps_commerce_file WHERE "unique" IN %s', (tuple(uniques),))
+        return {row[0] for row in self._cr.fetchall()}
+
+    @api.model
+    def _create_fetched_files(self, out_dir, remote_files, contents):
+        """
+        Create the attachments and the EDI files of downloaded files in batch
+        :param out_dir: configured out directory
+        :param remote_files: SFTP attributes of the downloaded files
+        :param contents: content of the files by name
+        :return: created EDI files
+        """
+        if not remote_files:
+            return self.browse()
+        attachments = self.env['ir.attachment'].create([{
+            'name': temp.filename,
+            'type': 'binary',
+            'datas': base64.b64encode(contents[temp.filename]),
+        } for temp in remote_files])
+
+        datetime = fields.datetime.now()
+        sps_files = self.create([{
+            'name': os.path.splitext(temp.filename)[0],
+            'upload_download_time': datetime,
+            'last_modify_on_remote': dt.fromtimestamp(temp.st_mtime),
+            'sync_status': 'pending',
+            'document_type': DOC_TYPE_BY_CODE.get(temp.filename[:DOC_CODE_LENGTH]),
+            'unique': out_dir + '/' + temp.filename,
+            'attachment_id': attachment.id,
+        } for temp, attachment in zip(remote_files, attachments)])
+        sps_files.message_subscribe(partner_ids=sps_files._get_sps_followers())
+        return sps_files
 
     def _get_sps_followers(self):
         partner_ids = self.env['ir.config_parameter'].sudo().get_param('phd_sps_integration.sps_message_follower_ids',
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import errno
+import io
+import threading
+import unittest
+
+from odoo.tests import tagged
+
+from ..utils import sftp as sftp_utils
+from ..utils.sftp import SFTPFetcher
+
+
+class FakeSFTPServer(object):
+    """
+    Local stand-in of the SPS server, it serves in memory files and records the channels opened on it
+    """
+
+    def __init__(self, files):
+        self.files = files
+        self.channels = []
+        self.reading_threads = set()
+        self.lock = threading.Lock()
+
+    def open_sftp(self):
+        channel = FakeSFTPClient(self)
+        with self.lock:
+            self.channels.append(channel)
+        return channel
+
+
+class FakeSFTPClient(object):
+
+    def __init__(self, server):
+        self.server = server
+        self.closed = False
+        self.broken = False
+
+    def open(self, path, mode='r'):
+        if self.closed or self.broken:
+            raise EOFError('channel closed')
+        with self.server.lock:
+            self.server.reading_threads.add(threading.get_ident())
+        content = self.server.files.get(path)
+        if content is None:
+            raise IOError(errno.ENOENT, 'No such file', path)
+        if content == 'break':
+            self.broken = True
+            raise EOFError('channel closed')
+        return io.BytesIO(content)
+
+    def close(self):
+        self.closed = True
+
+
+@tagged('post_install', '-at_install')
+class TestSFTPFetcher(unittest.TestCase):
+
+    def setUp(self):
+        super(TestSFTPFetcher, self).setUp()
+        self.server = FakeSFTPServer({'/out/%s.edi' % i: ('file %s' % i).encode() for i in range(20)})
+        self.fetcher = SFTPFetcher(self.server.open_sftp, max_workers=3)
+        self.addCleanup(self.fetcher.close)
+
+    def test_channels_reused_across_batches(self):
+        first = self.fetcher.download('/out/', ['%s.edi' % i for i in range(10)])
+        self.assertEqual(len(first), 10)
+        self.assertEqual(first['3.edi'], b'file 3')
+        channels = list(self.server.channels)
+        self.assertTrue(0 < len(channels) <= 3)
+        threads = set(self.server.reading_threads)
+
+        second = self.fetcher.download('/out', ['%s.edi' % i for i in range(10, 20)])
+        self.assertEqual(len(second), 10)
+        # the second batch runs on the threads and the channels of the first one
+        self.assertLessEqual(len(self.server.channels), 3)
+        self.assertEqual(self.server.channels[:len(channels)], channels)
+        self.assertLessEqual(len(self.server.reading_threads | threads), 3)
+
+        self.fetcher.close()
+        self.assertTrue(all(channel.closed for channel in self.server.channels))
+
+    def test_failed_file_skipped(self):
+        with self.assertLogs(sftp_utils._logger, level='ERROR'):
+            contents = self.fetcher.download('/out', ['1.edi', 'missing.edi', '2.edi'])
+        self.assertEqual(contents, {'1.edi': b'file 1', '2.edi': b'file 2'})
+        # a missing file leaves its channel usable
+        self.assertTrue(all(not channel.closed for channel in self.server.channels))
+
+    def test_broken_channel_replaced(self):
+        self.server.files['/out/broken.edi'] = 'break'
+        self.fetcher = SFTPFetcher(self.server.open_sftp, max_workers=1)
+        self.addCleanup(self.fetcher.close)
+        with self.assertLogs(sftp_utils._logger, level='ERROR'):
+            contents = self.fetcher.download('/out', ['1.edi', 'broken.edi'])
+        self.assertEqual(contents, {'1.edi': b'file 1'})
+        self.assertEqual(len(self.server.channels), 1)
+        self.assertTrue(self.server.channels[0].closed)
+
+        contents = self.fetcher.download('/out', ['2.edi'])
+        self.assertEqual(contents, {'2.edi': b'file 2'})
+        self.assertEqual(len(self.server.channels), 2)
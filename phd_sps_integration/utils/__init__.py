@@ -9,3 +9,4 @@
 ##############################################################################
 from . import exceptions
 from . import helpers
+from . import sftp
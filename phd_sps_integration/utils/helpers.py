@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
+import io
 from typing import List, Optional, Set, Tuple, Union
 
+from lxml import etree
+
 
 def ensure_list(obj):
     """
@@ -13,3 +16,36 @@ def ensure_list(obj):
     """
     list_obj = obj if isinstance(obj, list) else list(obj) if isinstance(obj, (tuple, set)) else (obj and [obj] or [])
     return list_obj
+
+
+def _write_xml_value(xf, value):
+    """
+    Write a value in an incremental xml file: a dict is written as one element per key,
+    a list as its items in sequence and any other value as text
+    """
+    if isinstance(value, dict):
+        for tag, sub_value in value.items():
+            with xf.element(tag):
+                _write_xml_value(xf, sub_value)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _write_xml_value(xf, item)
+    elif isinstance(value, bool):
+        xf.write(str(value).lower())
+    elif value is not None:
+        xf.write(str(value))
+
+
+def dict_to_xml(data):
+    """
+    Stream EDI document data to xml with lxml incremental writer
+    :param data: document data, lists are written without wrapper element
+    :type data: dict
+    :return: xml document
+    :rtype: str
+    """
+    buffer = io.BytesIO()
+    with etree.xmlfile(buffer, encoding='utf-8') as xf:
+        xf.write_declaration()
+        _write_xml_value(xf, data)
+    return buffer.getvalue().decode('utf-8')
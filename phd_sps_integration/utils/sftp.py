@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# Part of Odoo. See LICENSE file for full copyright and licensing details.
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 4
+KEEPALIVE_INTERVAL = 30
+
+
+class SFTPConnectionPool(object):
+    """
+    Keep one SSH connection per server in the worker process, so that the cron runs reuse it
+    instead of doing a new handshake every time.
+    """
+    _clients = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_client(cls, host, port, username, password):
+        """
+        Get an active SSH client for the server, connect a new one if needed
+        :param host:
+        :param port:
+        :param username:
+        :param password:
+        :return: connected SSH client
+        :rtype: paramiko.SSHClient
+        """
+        key = (host, int(port), username)
+        with cls._lock:
+            ssh = cls._clients.get(key)
+            transport = ssh and ssh.get_transport()
+            if transport and transport.is_active():
+                return ssh
+            if ssh:
+                ssh.close()
+            ssh = paramiko.SSHClient()
+            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            ssh.connect(host, int(port), username, password)
+            ssh.get_transport().set_keepalive(KEEPALIVE_INTERVAL)
+            cls._clients[key] = ssh
+            return ssh
+
+    @classmethod
+    def close_all(cls):
+        with cls._lock:
+            for ssh in cls._clients.values():
+                ssh.close()
+            cls._clients.clear()
+
+
+class SFTPFetcher(object):
+    """
+    Download files concurrently over a single SSH connection: the threads of the fetcher share a pool of
+    at most ``max_workers`` SFTP channels opened on the shared transport, the threads and the channels are
+    reused by all the downloads until the fetcher is closed.
+
+    The fetcher only needs a callable returning an SFTP client (``listdir_attr``, ``open``, ``close``),
+    so it can run against a local stand-in of the SPS server.
+    """
+
+    def __init__(self, open_sftp, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        :param open_sftp: callable returning a new SFTP client, e.g. ``ssh.open_sftp``
+        :param max_workers: maximum number of concurrent downloads
+        """
+        self.open_sftp = open_sftp
+        self.max_workers = max(int(max_workers), 1)
+        self._executor = None
+        self._idle_channels = queue.LifoQueue()
+        self._channels = []
+        self._channels_lock = threading.Lock()
+
+    def _acquire_channel(self):
+        try:
+            return self._idle_channels.get_nowait()
+        except queue.Empty:
+            # no more than max_workers downloads run at once, so no more channels are opened
+            sftp = self.open_sftp()
+            with self._channels_lock:
+                self._channels.append(sftp)
+            return sftp
+
+    def _discard_channel(self, sftp):
+        with self._channels_lock:
+            if sftp in self._channels:
+                self._channels.remove(sftp)
+        try:
+            sftp.close()
+        except Exception:
+            pass
+
+    def _read(self, path):
+        sftp = self._acquire_channel()
+        try:
+            with sftp.open(path, 'rb') as remote_file:
+                if hasattr(remote_file, 'prefetch'):
+                    remote_file.prefetch()
+                content = remote_file.read()
+        except IOError:
+            # the file could not be read, the channel is still usable
+            self._idle_channels.put(sftp)
+            raise
+        except Exception:
+            self._discard_channel(sftp)
+            raise
+        self._idle_channels.put(sftp)
+        return content
+
+    def download(self, directory, filenames):
+        """
+        Download the files of a remote directory concurrently
+        :param directory: absolute path of the remote directory
+        :param filenames: names of the files to download
+        :return: content of the downloaded files by name, failed downloads are skipped
+        :rtype: dict
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        futures = {self._executor.submit(self._read, '%s/%s' % (directory.rstrip('/'), filename)): filename
+                   for filename in filenames}
+        contents = {}
+        for future, filename in futures.items():
+            try:
+                contents[filename] = future.result()
+            except Exception as e:
+                _logger.exception('SPS SFTP download of %s failed: %s' % (filename, str(e)))
+        return contents
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._channels_lock:
+            for sftp in self._channels:
+                sftp.close()
+            self._channels = []
+        self._idle_channels = queue.LifoQueue()
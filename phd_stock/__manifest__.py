@@ -40,6 +40,8 @@
 
         'data/forecasted_quantity_report_templates.xml',
 
+        'data/ir_cron_data.xml',
+
         'report/forecasted_quantity_report_view.xml',
 
         'report/report_templates.xml',
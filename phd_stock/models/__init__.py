@@ -8,6 +8,7 @@
 #
 ##############################################################################
 from . import forecasted_quantity
+from . import forecast_ledger
 from . import phd_stock_move
 from . import phd_product_product
 from . import negative_report
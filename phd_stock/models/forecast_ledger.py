@@ -0,0 +1,208 @@
+from odoo import models, fields, api, _
+from odoo.tools import create_index
+
+
+class ForecastLedger(models.Model):
+    _name = 'phd.forecast.ledger'
+    _description = 'Forecast Ledger'
+    _rec_name = 'product_id'
+    _order = 'negative_date, product_id'
+
+    product_id = fields.Many2one('product.product', string='Product', required=True, ondelete='cascade',
+                                 index=True)
+    location_id = fields.Many2one('stock.location', string='Location', required=True, ondelete='cascade',
+                                  index=True)
+    not_in_location = fields.Boolean(string='Not in Location')
+    quantity_on_hand = fields.Float(string='On Hand')
+    forecasted_quantity = fields.Float(string='Forecasted Quantity')
+    negative_quantity = fields.Float(string='Negative Quantity')
+    negative_date = fields.Datetime(string='Negative Date',
+                                    help='First date the forecasted quantity goes below the safety stock, empty '
+                                         'when the quantity on hand is already below it')
+    is_negative = fields.Boolean(string='Is Negative')
+    is_alert_sent = fields.Boolean(string='Alert Sent', copy=False)
+
+    _sql_constraints = [
+        ('product_location_uniq', 'unique(product_id, location_id)',
+         'The forecast ledger can only have one line per product and location!'),
+    ]
+
+    def init(self):
+        create_index(self._cr, 'phd_forecast_ledger_location_negative_index', self._table,
+                     ['location_id', 'is_negative', 'negative_date'])
+
+    @api.model
+    def _get_negative_ledgers(self, location_id):
+        # Do not wait for the cron to show the products changed since its last run
+        product_ids = self.env['phd.forecast.ledger.dirty']._pop_location_dirty_product_ids(location_id)
+        if not self.search_count([('location_id', '=', location_id)]):
+            self.sudo()._refresh_ledger(location_id)
+        elif product_ids:
+            self.sudo()._refresh_ledger(location_id, product_ids)
+        return self.search([('location_id', '=', location_id), ('is_negative', '=', True)])
+
+    @api.model
+    def _prepare_ledger_values(self, data):
+        is_print, last_quantity, last_quantity_for_negative = \
+            self.env['phd.forecasted.quantity']._is_print_or_show_on_view(data)
+        negative_date = False
+        if is_print:
+            safety_stock = data['product'].safety_stock
+            negative_date = next((move_data['date'] for move_data in data['moves']
+                                  if move_data['quantity'] < safety_stock), False)
+        return {
+            'not_in_location': data['not_in_location'],
+            'quantity_on_hand': data['sum'],
+            'forecasted_quantity': last_quantity,
+            'negative_quantity': last_quantity_for_negative,
+            'negative_date': negative_date,
+            'is_negative': is_print,
+        }
+
+    @api.model
+    def _refresh_ledger(self, location_id, product_ids=None):
+        """ Rebuild the ledger lines of a location from the forecasted quantity engine.
+
+        :param location_id: id of the stock.location
+        :param product_ids: only rebuild the lines of these products, all products of the location otherwise
+        """
+        forecast_data = self.env['phd.forecasted.quantity']._get_forecast_data(location_id, product_ids)
+        domain = [('location_id', '=', location_id)]
+        if product_ids:
+            domain.append(('product_id', 'in', list(product_ids)))
+        ledgers = {ledger.product_id.id: ledger for ledger in self.search(domain)}
+
+        vals_list = []
+        for product_id, data in forecast_data.items():
+            vals = self._prepare_ledger_values(data)
+            ledger = ledgers.pop(product_id, False)
+            if not ledger:
+                vals.update({'product_id': product_id, 'location_id': location_id})
+                vals_list.append(vals)
+                continue
+            if not vals['is_negative']:
+                vals['is_alert_sent'] = False
+            changed_vals = {key: value for key, value in vals.items() if ledger[key] != value}
+            if changed_vals:
+                ledger.write(changed_vals)
+        if vals_list:
+            self.create(vals_list)
+        if ledgers:
+            self.browse([ledger.id for ledger in ledgers.values()]).unlink()
+
+    @api.model
+    def _update_from_moves(self, product_ids_by_location):
+        """ Refresh the lines impacted by stock moves, only for the locations already in the ledger.
+
+        :param product_ids_by_location: {location_id: set of product ids}
+        """
+        if not product_ids_by_location:
+            return
+        self.flush(['location_id'])
+        self._cr.execute('SELECT DISTINCT location_id FROM phd_forecast_ledger WHERE location_id IN %s',
+                         (tuple(product_ids_by_location),))
+        for location_id, in self._cr.fetchall():
+            self._refresh_ledger(location_id, product_ids_by_location[location_id])
+
+    @api.model
+    def _cron_refresh_dirty_ledgers(self):
+        """ Refresh the lines marked as dirty since the last run """
+        self._update_from_moves(self.env['phd.forecast.ledger.dirty']._pop_dirty_keys())
+
+    @api.model
+    def _cron_refresh_forecast_ledger(self):
+        locations = self.env['stock.location'].search([('usage', '=', 'internal')])
+        for location in locations:
+            self._refresh_ledger(location.id)
+        self._alert_negative_forecast()
+
+    @api.model
+    def _alert_negative_forecast(self):
+        ledgers = self.search([('is_negative', '=', True), ('is_alert_sent', '=', False)])
+        for ledger in ledgers:
+            message = _('The forecasted quantity of %s in %s goes down to %s on %s.') % (
+                ledger.product_id.display_name, ledger.location_id.display_name, ledger.negative_quantity,
+                ledger.negative_date or _('today'))
+            ledger.product_id.activity_schedule('mail.mail_activity_data_warning', note=message,
+                                                summary=_('Negative Inventory'),
+                                                user_id=ledger.product_id.responsible_id.id or self.env.uid)
+        ledgers.write({'is_alert_sent': True})
+
+
+class ForecastLedgerDirty(models.Model):
+    """ Products whose forecast changed, by internal location. Marking them is insert only, so the moves,
+    manufacturing orders and products being written do not recompute the forecast in their transaction.
+    """
+    _name = 'phd.forecast.ledger.dirty'
+    _description = 'Forecast Ledger Dirty Key'
+    _log_access = False
+
+    product_id = fields.Many2one('product.product', string='Product', required=True, ondelete='cascade')
+    location_id = fields.Many2one('stock.location', string='Location', ondelete='cascade',
+                                  help='Empty when the product changed in every location')
+
+    def init(self):
+        create_index(self._cr, 'phd_forecast_ledger_dirty_location_index', self._table, ['location_id'])
+
+    @api.model
+    def _mark_dirty(self, product_ids_by_location):
+        """
+        :param product_ids_by_location: {location_id: set of product ids}
+        """
+        self.sudo().create([{'product_id': product_id, 'location_id': location_id}
+                            for location_id, product_ids in product_ids_by_location.items()
+                            for product_id in product_ids])
+
+    @api.model
+    def _mark_products_dirty(self, product_ids):
+        self.sudo().create([{'product_id': product_id} for product_id in product_ids])
+
+    @api.model
+    def _pop_location_dirty_product_ids(self, location_id):
+        """ Remove the dirty keys of a location, the products changed in every location stay dirty in the other
+        locations of the ledger.
+
+        :return: list of product ids
+        """
+        self.flush()
+        self.env['phd.forecast.ledger'].flush(['location_id'])
+        self._cr.execute("""
+            WITH dirty AS (
+                DELETE FROM phd_forecast_ledger_dirty WHERE location_id = %(location_id)s OR location_id IS NULL
+                RETURNING product_id, location_id
+            ), other_location_dirty AS (
+                INSERT INTO phd_forecast_ledger_dirty (product_id, location_id)
+                SELECT DISTINCT dirty.product_id, ledger.location_id
+                FROM dirty
+                JOIN (SELECT DISTINCT location_id FROM phd_forecast_ledger
+                      WHERE location_id != %(location_id)s) ledger ON dirty.location_id IS NULL
+            )
+            SELECT DISTINCT product_id FROM dirty
+        """, {'location_id': location_id})
+        product_ids = [product_id for product_id, in self._cr.fetchall()]
+        self.invalidate_cache()
+        return product_ids
+
+    @api.model
+    def _pop_dirty_keys(self):
+        """ Remove the dirty keys, the products changed in every location are expanded to the locations of
+        the ledger.
+
+        :return: {location_id: set of product ids}
+        """
+        self.flush()
+        self.env['phd.forecast.ledger'].flush(['location_id'])
+        self._cr.execute("""
+            WITH dirty AS (
+                DELETE FROM phd_forecast_ledger_dirty RETURNING product_id, location_id
+            )
+            SELECT DISTINCT dirty.product_id, COALESCE(dirty.location_id, ledger.location_id)
+            FROM dirty
+            LEFT JOIN (SELECT DISTINCT location_id FROM phd_forecast_ledger) ledger ON dirty.location_id IS NULL
+        """)
+        product_ids_by_location = {}
+        for product_id, location_id in self._cr.fetchall():
+            if location_id:
+                product_ids_by_location.setdefault(location_id, set()).add(product_id)
+        self.invalidate_cache()
+        return product_ids_by_location
@@ -66,59 +66,23 @@ class ForecastedQuantityReport(models.AbstractModel):
         lines = []
         if self._context.get('default_location_id', False):
             location_id = self._context.get('default_location_id')
+            is_negative_report = self._context.get('is_negative_report', False)
             unfolded_lines = options.get('unfold_lines', False)
-            if not line_id and not options.get('unfold_lines', False):
-                product_results = self._do_query_stock_quant(self._context.get('default_location_id'))
-                product_in_location = []
-                for product in product_results:
-                    product_in_location.append(product['product_id'])
-                    stock_moves = self.env['stock.move'].search(
-                        [('state', 'not in', ['done', 'cancel']), ('product_id.active', '=', True),
-                         ('date_planned_end', '>=', date),
-                         ('product_id', '=', int(product['product_id'])),
-                         '|', ('location_id', '=', location_id), ('location_dest_id', '=', location_id)],
-                        order='date_planned_end asc')
-                    is_print, last_quantity, last_quantity_for_negative = self._is_print_or_show_on_view(product,
-                                                                                                         location_id,
-                                                                                                         stock_moves,
-                                                                                                         float(product[
-                                                                                                                   'sum']))
-                    if self._context.get('is_negative_report', False):
-                        if is_print:
-                            line = self._get_product_title_line(options, product, last_quantity_for_negative, date,
-                                                                False)
-                            if line:
-                                lines.append(line)
-                    else:
-                        line = self._get_product_title_line(options, product, last_quantity, date, False)
-                        if line:
-                            lines.append(line)
-
-                move_out_location = self.env['stock.move'].search(
-                    [('state', 'not in', ['done', 'cancel']), ('product_id.active', '=', True),
-                     ('product_id', 'not in', product_in_location),
-                     '|', ('location_id', '=', location_id), ('location_dest_id', '=', location_id)],
-                    order='date_planned_end asc')
-                for product in move_out_location.product_id:
-                    stock_moves = self.env['stock.move'].search(
-                        [('state', 'not in', ['done', 'cancel']), ('product_id.active', '=', True),
-                         ('product_id', '=', product.id),
-                         '|', ('location_id', '=', location_id), ('location_dest_id', '=', location_id)],
-                        order='date_planned_end asc')
-                    is_print, last_quantity, last_quantity_for_negative = self._is_print_or_show_on_view(
-                        {'product_id': product.id, 'sum': 0}, location_id,
-                        stock_moves, 0)
-                    if self._context.get('is_negative_report', False):
-                        if is_print:
-                            line = self._get_product_title_line(options, {'product_id': product.id, 'sum': 0},
-                                                                last_quantity_for_negative, date, False, True)
-                            if line:
-                                lines.append(line)
-                    else:
-                        line = self._get_product_title_line(options, {'product_id': product.id, 'sum': 0},
-                                                            last_quantity, date, False, True)
-                        if line:
-                            lines.append(line)
+            if not line_id and not options.get('unfold_lines', False) and is_negative_report:
+                # The negative products are read from the forecast ledger kept up to date by the stock moves
+                for ledger in self.env['phd.forecast.ledger']._get_negative_ledgers(location_id):
+                    product = {'product_id': ledger.product_id.id,
+                               'sum': 0 if ledger.not_in_location else ledger.quantity_on_hand}
+                    lines.append(self._get_product_title_line(options, product, ledger.negative_quantity, date,
+                                                              False, ledger.not_in_location,
+                                                              product_info=ledger.product_id))
+            elif not line_id and not options.get('unfold_lines', False):
+                forecast_data = self._get_forecast_data(location_id)
+                for data in forecast_data.values():
+                    product = {'product_id': data['product'].id, 'sum': data['sum']}
+                    is_print, last_quantity, last_quantity_for_negative = self._is_print_or_show_on_view(data)
+                    lines.append(self._get_product_title_line(options, product, last_quantity, date, False,
+                                                              data['not_in_location'], product_info=data['product']))
             else:
                 if unfolded_lines:
                     line_ids = unfolded_lines
@@ -127,49 +91,24 @@ class ForecastedQuantityReport(models.AbstractModel):
                 else:
                     line_ids = []
 
+                forecast_data = self._get_forecast_data(location_id, [int(id.split('_')[1]) for id in line_ids])
                 for id in line_ids:
                     not_in_location = False
                     product = {'product_id': id.split('_')[1], 'sum': id.split('_')[2]}
+                    data = forecast_data.get(int(product['product_id']), {})
                     if len(id.split('_')) == 5 and id.split('_')[3] == 'out':
                         last_quantity = id.split('_')[4]
-                        line = self._get_product_title_line(options, product, last_quantity, date, True, True)
-                        if line:
-                            lines.append(line)
                         not_in_location = True
                     else:
                         last_quantity = id.split('_')[3]
-                        line = self._get_product_title_line(options, product, last_quantity, date, True)
-                        if line:
-                            lines.append(line)
-                    quantity = float(product['sum'])
-                    if len(id.split('_')) == 5 and id.split('_')[3] == 'out':
-                        stock_moves = self.env['stock.move'].search(
-                            [('state', 'not in', ['done', 'cancel']), ('product_id.active', '=', True),
-                             ('product_id', '=', int(product['product_id'])),
-                             '|', ('location_id', '=', location_id), ('location_dest_id', '=', location_id)],
-                            order='date_planned_end asc')
-                    else:
-                        stock_moves = self.env['stock.move'].search(
-                            [('state', 'not in', ['done', 'cancel']), ('product_id.active', '=', True),
-                             ('date_planned_end', '>=', date),
-                             ('product_id', '=', int(product['product_id'])),
-                             '|', ('location_id', '=', location_id), ('location_dest_id', '=', location_id)],
-                            order='date_planned_end asc')
-                    if stock_moves:
-                        for move in stock_moves:
-                            quantity_change = self._get_product_qty_change_result(move, location_id)
-                            quantity += quantity_change
-                            if self._context.get('is_negative_report', False):
-                                if quantity < move.product_id.safety_stock:
-                                    lines.append(
-                                        self._get_aml_move_line(move, product, quantity_change, last_quantity, quantity,
-                                                                not_in_location=not_in_location))
-                            else:
-                                lines.append(
-                                    self._get_aml_move_line(move, product, quantity_change, last_quantity, quantity,
-                                                            not_in_location=not_in_location))
-        # lines = lines.sort(key=get_my_key)
-        return sorted(lines, key=lambda i: (i['product_sku']))
+                    line = self._get_product_title_line(options, product, last_quantity, date, True, not_in_location,
+                                                        product_info=data.get('product'))
+                    if line:
+                        lines.append(line)
+                    if data:
+                        lines += self._get_forecast_move_lines(data, product, last_quantity, is_negative_report,
+                                                               not_in_location=not_in_location)
+        return sorted([line for line in lines if line], key=lambda i: (i['product_sku']))
 
     @api.model
     def _get_forecasted_quantity_lines_report(self, options):
@@ -177,165 +116,168 @@ class ForecastedQuantityReport(models.AbstractModel):
         lines = []
         if options.get('default_location_id', False):
             location_id = options.get('default_location_id', False)
-            if not options.get('filter_accounts', False):
-                product_results = self._do_query_stock_quant(location_id)
-                product_in_location = []
-                for product in product_results:
-                    product_in_location.append(product['product_id'])
-
-                    stock_moves = self.env['stock.move'].search(
-                        [('state', 'not in', ['done', 'cancel']), ('product_id.active', '=', True),
-                         ('date_planned_end', '>=', date),
-                         ('product_id', '=', int(product['product_id'])),
-                         '|', ('location_id', '=', location_id), ('location_dest_id', '=', location_id)],
-                        order='date_planned_end asc')
-                    is_print, last_quantity, last_quantity_for_negative = self._is_print_or_show_on_view(product,
-                                                                                                         location_id,
-                                                                                                         stock_moves,
-                                                                                                         float(product[
-                                                                                                                   'sum']))
-                    if options.get('is_negative_report', False):
+            is_negative_report = options.get('is_negative_report', False)
+            if not options.get('filter_accounts', False) and is_negative_report:
+                # The negative products are read from the forecast ledger, only their moves are projected
+                ledgers = self.env['phd.forecast.ledger']._get_negative_ledgers(location_id)
+                forecast_data = self._get_forecast_data(location_id, ledgers.mapped('product_id').ids) \
+                    if ledgers else {}
+                for ledger in ledgers:
+                    data = forecast_data.get(ledger.product_id.id)
+                    product = {'product_id': ledger.product_id.id,
+                               'sum': 0 if ledger.not_in_location else ledger.quantity_on_hand}
+                    lines.append(self._get_product_title_line(options, product, ledger.negative_quantity, date,
+                                                              False, ledger.not_in_location,
+                                                              product_info=ledger.product_id))
+                    if data:
+                        lines += self._get_forecast_move_lines(data, product, ledger.forecasted_quantity,
+                                                               is_negative_report)
+            elif not options.get('filter_accounts', False):
+                forecast_data = self._get_forecast_data(location_id)
+                for data in forecast_data.values():
+                    product = {'product_id': data['product'].id, 'sum': data['sum']}
+                    is_print, last_quantity, last_quantity_for_negative = self._is_print_or_show_on_view(data)
+                    if is_negative_report:
                         if is_print:
-                            line = self._get_product_title_line(options, product, last_quantity_for_negative, date,
-                                                                False)
-                            if line:
-                                lines.append(line)
+                            lines.append(self._get_product_title_line(options, product, last_quantity_for_negative,
+                                                                      date, False, data['not_in_location'],
+                                                                      product_info=data['product']))
                     else:
-                        line = self._get_product_title_line(options, product, last_quantity, date, False)
-                        if line:
-                            lines.append(line)
-
-                    quantity = float(product['sum'])
-                    if stock_moves:
-                        for move in stock_moves:
-                            quantity_change = self._get_product_qty_change_result(move, location_id)
-                            quantity += quantity_change
-                            if options.get('is_negative_report', False):
-                                if quantity < move.product_id.safety_stock:
-                                    lines.append(self._get_aml_move_line(move, product, quantity_change, last_quantity,
-                                                                         quantity))
-                            else:
-                                lines.append(
-                                    self._get_aml_move_line(move, product, quantity_change, last_quantity, quantity))
-
-                move_out_location = self.env['stock.move'].search(
-                    [('state', 'not in', ['done', 'cancel']), ('product_id.active', '=', True),
-                     ('product_id', 'not in', product_in_location),
-                     '|', ('location_id', '=', location_id), ('location_dest_id', '=', location_id)],
-                    order='date_planned_end asc')
-                for product in move_out_location.product_id:
-                    stock_moves = self.env['stock.move'].search(
-                        [('state', 'not in', ['done', 'cancel']), ('product_id.active', '=', True),
-                         ('product_id', '=', product.id),
-                         '|', ('location_id', '=', location_id), ('location_dest_id', '=', location_id)],
-                        order='date_planned_end asc')
-                    is_print, last_quantity, last_quantity_for_negative = self._is_print_or_show_on_view(
-                        {'product_id': product.id, 'sum': 0}, location_id,
-                        stock_moves, 0)
-                    if options.get('is_negative_report', False):
-                        if is_print:
-                            line = self._get_product_title_line(options, {'product_id': product.id, 'sum': 0},
-                                                                last_quantity_for_negative, date, False,
-                                                                True)
-                            if line:
-                                lines.append(line)
-                    else:
-                        line = self._get_product_title_line(options, {'product_id': product.id, 'sum': 0},
-                                                            last_quantity, date, False, True)
-                        if line:
-                            lines.append(line)
-
-                    quantity = 0
-                    if stock_moves:
-                        for move in stock_moves:
-                            quantity_change = self._get_product_qty_change_result(move, location_id)
-                            quantity += quantity_change
-                            if options.get('is_negative_report', False):
-                                if quantity < move.product_id.safety_stock:
-                                    lines.append(
-                                        self._get_aml_move_line(move, {'product_id': product.id, 'sum': 0},
-                                                                quantity_change, last_quantity,
-                                                                quantity))
-                            else:
-                                lines.append(
-                                    self._get_aml_move_line(move, {'product_id': product.id, 'sum': 0}, quantity_change,
-                                                            last_quantity, quantity))
+                        lines.append(self._get_product_title_line(options, product, last_quantity, date, False,
+                                                                  data['not_in_location'],
+                                                                  product_info=data['product']))
+                    lines += self._get_forecast_move_lines(data, product, last_quantity, is_negative_report)
             else:
                 line_ids = options.get('filter_accounts', False)
+                forecast_data = self._get_forecast_data(location_id, [int(line.split('_')[1]) for line in line_ids])
                 for line in line_ids:
                     product = {'product_id': line.split('_')[1], 'sum': line.split('_')[2]}
-                    if len(line.split('_')) == 5 and line.split('_')[3] == 'out':
-                        stock_moves = self.env['stock.move'].search(
-                            [('state', 'not in', ['done', 'cancel']), ('product_id.active', '=', True),
-                             ('product_id', '=', int(product['product_id'])),
-                             '|', ('location_id', '=', location_id), ('location_dest_id', '=', location_id)],
-                            order='date_planned_end asc')
-                    else:
-                        stock_moves = self.env['stock.move'].search(
-                            [('state', 'not in', ['done', 'cancel']), ('product_id.active', '=', True),
-                             ('date_planned_end', '>=', date),
-                             ('product_id', '=', int(product['product_id'])),
-                             '|', ('location_id', '=', location_id), ('location_dest_id', '=', location_id)],
-                            order='date_planned_end asc')
-                    is_print, last_quantity, last_quantity_for_negative = self._is_print_or_show_on_view(
-                        {'product_id': int(product['product_id']), 'sum': float(product['sum'])}, location_id,
-                        stock_moves, float(product['sum']))
-                    if options.get('is_negative_report', False):
+                    data = forecast_data.get(int(product['product_id']))
+                    if not data:
+                        continue
+                    is_print, last_quantity, last_quantity_for_negative = self._is_print_or_show_on_view(data)
+                    if is_negative_report:
                         if is_print:
-                            lines.append(
-                                self._get_product_title_line(options, product, last_quantity_for_negative, date, True))
+                            lines.append(self._get_product_title_line(options, product, last_quantity_for_negative,
+                                                                      date, True, product_info=data['product']))
                     else:
-                        lines.append(
-                            self._get_product_title_line(options, product, last_quantity, date, True))
-
-                    quantity = float(product['sum'])
-                    if stock_moves:
-                        for move in stock_moves:
-                            quantity_change = self._get_product_qty_change_result(move, location_id)
-                            quantity += quantity_change
-                            if options.get('is_negative_report', False):
-                                if quantity < move.product_id.safety_stock:
-                                    lines.append(self._get_aml_move_line(move, product, quantity_change, last_quantity,
-                                                                         quantity))
-                            else:
-                                lines.append(
-                                    self._get_aml_move_line(move, product, quantity_change, last_quantity, quantity))
-        return sorted(lines, key=lambda i: (i['product_sku']))
+                        lines.append(self._get_product_title_line(options, product, last_quantity, date, True,
+                                                                  product_info=data['product']))
+                    lines += self._get_forecast_move_lines(data, product, last_quantity, is_negative_report)
+        return sorted([line for line in lines if line], key=lambda i: (i['product_sku']))
+
+    @api.model
+    def _get_forecast_data(self, location_id, product_ids=None):
+        """ Project the balance of the active products of a location in a single query.
+
+        The running quantity after each open move is computed by the database with
+        SUM() OVER (PARTITION BY product ORDER BY date_planned_end) on top of the quantity on hand.
+        Products on hand only take the moves planned from today, products which are not on hand take
+        all of their open moves.
+
+        :param location_id: id of the stock.location
+        :param product_ids: restrict the projection to these products, used when unfolding lines
+        :return: {product_id: {'product': product.product record, 'sum': quantity on hand,
+                               'not_in_location': boolean,
+                               'moves': [{'move': stock.move record, 'date': datetime,
+                                          'quantity_change': float, 'quantity': float}]}}
+        """
+        self.env['stock.move'].flush()
+        self.env['stock.quant'].flush()
+        params = {
+            'location_id': location_id,
+            'date': fields.Date.today(),
+            'product_ids': tuple(product_ids or []),
+        }
+        quant_product_clause = 'AND product_id IN %(product_ids)s' if product_ids else ''
+        move_product_clause = 'AND sm.product_id IN %(product_ids)s' if product_ids else ''
+        query = '''
+            WITH quant AS (
+                SELECT product_id, SUM(quantity) AS sum
+                FROM stock_quant
+                WHERE location_id = %(location_id)s {quant_product_clause}
+                GROUP BY product_id
+            ),
+            move AS (
+                SELECT sm.id, sm.product_id, sm.date_planned_end,
+                       CASE WHEN sm.location_id = %(location_id)s THEN -sm.product_uom_qty
+                            WHEN sm.location_dest_id = %(location_id)s THEN sm.product_uom_qty
+                            ELSE 0 END AS quantity_change
+                FROM stock_move sm
+                LEFT JOIN quant ON quant.product_id = sm.product_id
+                WHERE sm.state NOT IN ('done', 'cancel')
+                    AND (sm.location_id = %(location_id)s OR sm.location_dest_id = %(location_id)s)
+                    AND (quant.product_id IS NULL OR sm.date_planned_end >= %(date)s)
+                    {move_product_clause}
+            )
+            SELECT pp.id AS product_id,
+                   quant.product_id IS NULL AS not_in_location,
+                   COALESCE(quant.sum, 0) AS sum,
+                   move.id AS move_id,
+                   move.date_planned_end,
+                   move.quantity_change,
+                   COALESCE(quant.sum, 0) + SUM(move.quantity_change) OVER (
+                       PARTITION BY move.product_id ORDER BY move.date_planned_end, move.id) AS quantity
+            FROM quant
+            FULL OUTER JOIN move ON move.product_id = quant.product_id
+            JOIN product_product pp ON pp.id = COALESCE(move.product_id, quant.product_id)
+            WHERE pp.active
+            ORDER BY pp.id, move.date_planned_end, move.id
+        '''.format(quant_product_clause=quant_product_clause, move_product_clause=move_product_clause)
+        self._cr.execute(query, params)
+        rows = self._cr.dictfetchall()
+
+        # Browse everything at once so that the report lines share the same prefetch
+        products = {product.id: product for product in
+                    self.env['product.product'].browse({row['product_id'] for row in rows})}
+        moves = {move.id: move for move in
+                 self.env['stock.move'].browse([row['move_id'] for row in rows if row['move_id']])}
+        result = {}
+        for row in rows:
+            data = result.setdefault(row['product_id'], {
+                'product': products[row['product_id']],
+                'sum': 0 if row['not_in_location'] else row['sum'],
+                'not_in_location': row['not_in_location'],
+                'moves': [],
+            })
+            if row['move_id']:
+                data['moves'].append({
+                    'move': moves[row['move_id']],
+                    'date': row['date_planned_end'],
+                    'quantity_change': row['quantity_change'],
+                    'quantity': row['quantity'],
+                })
+        return result
 
     @api.model
-    def _is_print_or_show_on_view(self, product, location_id, stock_moves, quantity):
-        safety_stock = 0
+    def _get_forecast_move_lines(self, data, product, last_quantity, is_negative_report, not_in_location=False):
+        lines = []
+        for move_data in data['moves']:
+            if not is_negative_report or move_data['quantity'] < data['product'].safety_stock:
+                lines.append(self._get_aml_move_line(move_data['move'], product, move_data['quantity_change'],
+                                                     last_quantity, move_data['quantity'],
+                                                     not_in_location=not_in_location))
+        return lines
+
+    @api.model
+    def _is_print_or_show_on_view(self, data):
+        safety_stock = data['product'].safety_stock
         is_print = False
         last_quantity = 0
         last_quantity_for_negative = 0
-        if stock_moves:
-            for move in stock_moves:
-                quantity_change = self._get_product_qty_change_result(move, location_id)
-                quantity += quantity_change
-                if quantity < move.product_id.safety_stock:
-                    safety_stock = move.product_id.safety_stock
+        if data['moves']:
+            for move_data in data['moves']:
+                if move_data['quantity'] < safety_stock:
                     is_print = True
-                    last_quantity_for_negative = quantity
-            last_quantity = quantity
-        else:
-            if product.get('product_id', False):
-                product_product = self.env['product.product'].search([('id', '=', int(product['product_id']))], limit=1)
-                if product_product:
-                    safety_stock = product_product.safety_stock
+                    last_quantity_for_negative = move_data['quantity']
+            last_quantity = data['moves'][-1]['quantity']
+            if not is_print:
+                safety_stock = 0
         if not is_print:
-            if float_compare(float(product['sum']), safety_stock, precision_digits=0) == -1:
+            if float_compare(float(data['sum']), safety_stock, precision_digits=0) == -1:
                 is_print = True
         return is_print, last_quantity, last_quantity_for_negative
 
-    @api.model
-    def _get_product_qty_change_result(self, move, location):
-        if move.location_id.id == location:
-            return - move.product_uom_qty
-        elif move.location_dest_id.id == location:
-            return move.product_uom_qty
-        else:
-            return 0
-
     @api.model
     def _get_aml_move_line(self, move, product, quantity_change, last_quantity, quantity, not_in_location=False):
         # mrp_order = self.env['mrp.production'].search([('name','=',move.origin)],limit=1)
@@ -409,8 +351,10 @@ class ForecastedQuantityReport(models.AbstractModel):
         return self._cr.dictfetchall()
 
     @api.model
-    def _get_product_title_line(self, options, product, last_quantity, date, unfolded, not_in_location=False):
-        product_info = self.env['product.product'].search([('id', '=', product['product_id'])])
+    def _get_product_title_line(self, options, product, last_quantity, date, unfolded, not_in_location=False,
+                                product_info=None):
+        if product_info is None:
+            product_info = self.env['product.product'].search([('id', '=', product['product_id'])])
         if product_info:
             if product_info.default_code:
                 name = '[%s] %s' % (product_info.default_code, product_info.name)
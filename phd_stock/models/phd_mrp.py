@@ -12,4 +12,13 @@ class PHDMrpOrder(models.Model):
 
     purchase_id = fields.Many2one('purchase.order',
                                   string="Purchase Order",
-                                  copy=False)
\ No newline at end of file
+                                  copy=False)
+
+    def write(self, vals):
+        res = super(PHDMrpOrder, self).write(vals)
+        if 'date_planned_finished' in vals:
+            # The moves linked to the orders are forecasted on their planned end date
+            moves = self.env['stock.move'].search([('mo_id', 'in', self.ids),
+                                                   ('state', 'not in', ('done', 'cancel'))])
+            self.env['phd.forecast.ledger.dirty']._mark_dirty(moves._get_forecast_ledger_keys())
+        return res
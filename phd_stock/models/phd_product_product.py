@@ -19,6 +19,12 @@ class PHDProductProduct(models.Model):
     safety_stock = fields.Float(String='Safety Stock', default=0)
     qty_reserved = fields.Float('Quantity Reserved', compute='_compute_qty_reserved', store=False)
 
+    def write(self, vals):
+        res = super(PHDProductProduct, self).write(vals)
+        if 'safety_stock' in vals:
+            self.env['phd.forecast.ledger.dirty']._mark_products_dirty(self.ids)
+        return res
+
     def _compute_qty_reserved(self):
         for record in self:
             record.qty_reserved = 0
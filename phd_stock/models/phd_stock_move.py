@@ -7,6 +7,9 @@ from odoo.exceptions import UserError
 BOM_SUBCONTRACT_TYPE = 'subcontract'
 PRODUCT_CONSUMABLE_TYPE = 'consu'
 LOCATION_PRODUCTION_USAGE = 'production'
+LOCATION_INTERNAL_USAGE = 'internal'
+FORECAST_LEDGER_FIELDS = {'state', 'product_id', 'product_uom_qty', 'location_id', 'location_dest_id',
+                          'date_expected', 'purchase_line_id'}
 
 
 class PHDStockMove(models.Model):
@@ -41,6 +44,37 @@ class PHDStockMove(models.Model):
     is_warehouse_report = fields.Boolean(compute='_compute_is_warehouse_report')
     transaction_type = fields.Char(string='Transaction Type', compute='_compute_transaction_type')
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        moves = super(PHDStockMove, self).create(vals_list)
+        self.env['phd.forecast.ledger.dirty']._mark_dirty(moves._get_forecast_ledger_keys())
+        return moves
+
+    def write(self, vals):
+        if not FORECAST_LEDGER_FIELDS.intersection(vals):
+            return super(PHDStockMove, self).write(vals)
+        ledger_keys = self._get_forecast_ledger_keys()
+        res = super(PHDStockMove, self).write(vals)
+        for location_id, product_ids in self._get_forecast_ledger_keys().items():
+            ledger_keys.setdefault(location_id, set()).update(product_ids)
+        self.env['phd.forecast.ledger.dirty']._mark_dirty(ledger_keys)
+        return res
+
+    def unlink(self):
+        ledger_keys = self._get_forecast_ledger_keys()
+        res = super(PHDStockMove, self).unlink()
+        self.env['phd.forecast.ledger.dirty']._mark_dirty(ledger_keys)
+        return res
+
+    def _get_forecast_ledger_keys(self):
+        """ Products impacted by the moves, grouped by internal location """
+        ledger_keys = {}
+        for move in self:
+            for location in move.location_id | move.location_dest_id:
+                if location.usage == LOCATION_INTERNAL_USAGE:
+                    ledger_keys.setdefault(location.id, set()).add(move.product_id.id)
+        return ledger_keys
+
     @api.depends('date_expected','mo_id.date_planned_finished')
     def _compute_date_planned_end(self):
         for record in self:
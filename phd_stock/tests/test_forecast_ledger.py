@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, time, timedelta
+
+from odoo import fields
+from odoo.tests import common, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestForecastLedger(common.SavepointCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestForecastLedger, cls).setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True))
+        cls.Ledger = cls.env['phd.forecast.ledger']
+        cls.Dirty = cls.env['phd.forecast.ledger.dirty']
+        cls.stock_location = cls.env.ref('stock.stock_location_stock')
+        cls.other_location = cls.env['stock.location'].create({
+            'name': 'Ledger Shelf',
+            'usage': 'internal',
+            'location_id': cls.stock_location.location_id.id,
+        })
+        cls.customer_location = cls.env.ref('stock.stock_location_customers')
+        cls.product = cls.env['product.product'].create({
+            'name': 'Ledger Product',
+            'type': 'product',
+        })
+        cls.env['stock.quant']._update_available_quantity(cls.product, cls.stock_location, 10)
+        cls.env['stock.quant']._update_available_quantity(cls.product, cls.other_location, 1)
+        cls.move_date = datetime.combine(fields.Date.today() + timedelta(days=3), time(12, 0))
+        cls.move = cls.env['stock.move'].create({
+            'name': 'Ledger Delivery',
+            'product_id': cls.product.id,
+            'product_uom': cls.product.uom_id.id,
+            'product_uom_qty': 15,
+            'location_id': cls.stock_location.id,
+            'location_dest_id': cls.customer_location.id,
+            'date_expected': cls.move_date,
+        })
+
+    def _get_ledger(self, location):
+        return self.Ledger.search([('product_id', '=', self.product.id), ('location_id', '=', location.id)])
+
+    def _get_dirty_keys(self):
+        return {(dirty.product_id, dirty.location_id) for dirty in self.Dirty.search([
+            ('product_id', '=', self.product.id)])}
+
+    def test_negative_ledger(self):
+        ledgers = self.Ledger._get_negative_ledgers(self.stock_location.id)
+        ledger = self._get_ledger(self.stock_location)
+        self.assertIn(ledger, ledgers)
+        self.assertEqual((ledger.quantity_on_hand, ledger.negative_quantity), (10, -5))
+        self.assertEqual(ledger.negative_date, self.move_date)
+        self.assertFalse(any(location == self.stock_location for product, location in self._get_dirty_keys()),
+                         'The keys of the refreshed location are removed')
+
+    def test_move_marks_dirty(self):
+        self.Ledger._get_negative_ledgers(self.stock_location.id)
+        self.move.product_uom_qty = 8
+        self.assertIn((self.product, self.stock_location), self._get_dirty_keys())
+        # The ledger is refreshed and the keys are removed before the negative products are shown
+        ledgers = self.Ledger._get_negative_ledgers(self.stock_location.id)
+        self.assertNotIn(self._get_ledger(self.stock_location), ledgers)
+        self.assertFalse(self._get_ledger(self.stock_location).is_negative)
+        self.assertNotIn((self.product, self.stock_location), self._get_dirty_keys())
+
+    def test_cron_refresh_dirty(self):
+        self.Ledger._get_negative_ledgers(self.stock_location.id)
+        new_date = self.move_date + timedelta(days=2)
+        self.move.date_expected = new_date
+        self.assertIn((self.product, self.stock_location), self._get_dirty_keys())
+        self.Ledger._cron_refresh_dirty_ledgers()
+        self.assertFalse(self._get_dirty_keys())
+        self.assertEqual(self._get_ledger(self.stock_location).negative_date, new_date)
+
+    def test_safety_stock_marks_every_location(self):
+        self.Ledger._refresh_ledger(self.stock_location.id)
+        self.Ledger._refresh_ledger(self.other_location.id)
+        self.Dirty._pop_dirty_keys()
+        self.assertFalse(self._get_ledger(self.other_location).is_negative)
+
+        self.product.safety_stock = 5
+        self.assertEqual(self._get_dirty_keys(), {(self.product, self.Dirty.location_id)})
+        # Refreshing a location leaves the product dirty in the other locations of the ledger
+        self.Ledger._get_negative_ledgers(self.stock_location.id)
+        dirty_keys = self._get_dirty_keys()
+        self.assertIn((self.product, self.other_location), dirty_keys)
+        self.assertFalse({location for product, location in dirty_keys} & {self.stock_location, self.Dirty.location_id})
+
+        self.Ledger._cron_refresh_dirty_ledgers()
+        self.assertFalse(self._get_dirty_keys())
+        ledger = self._get_ledger(self.other_location)
+        self.assertTrue(ledger.is_negative)
+        self.assertFalse(ledger.negative_date, 'The quantity on hand is already below the safety stock')
@@ -15,10 +15,14 @@
     """,
     'author': 'Novobi LLC',
     'website': 'http://www.novobi.com',
-    'depends': ['web', 'phd_export_pdf', 'partner_autocomplete'],
+    'depends': ['web', 'mail', 'phd_export_pdf', 'partner_autocomplete'],
     'description': """ """,
     'data': [
+        'security/ir.model.access.csv',
+        'security/report_job_security.xml',
+        'data/ir_cron_data.xml',
         'views/assets.xml',
+        'views/report_job_views.xml',
     ],
     'qweb': [
         "static/src/xml/*.xml",
@@ -1,105 +1,147 @@
+import io
 import json
 import operator
 import logging
-from odoo.tools import html_escape
-from odoo import http, tools
+
+import xlsxwriter
+from odoo.exceptions import UserError
+from odoo.tools import html_escape, pycompat
+from odoo import http, tools, _
 from odoo.http import content_disposition, request, serialize_exception as _serialize_exception
 from odoo.addons.web.controllers.main import ReportController
 from odoo.addons.web.controllers.main import DataSet
 from odoo.addons.web.controllers.main import ExcelExport
 from odoo.addons.web.controllers.main import ExportFormat
+from odoo.addons.web.controllers.main import ExportXlsxWriter
 from odoo.addons.web.controllers.main import serialize_exception
 from odoo.addons.web.controllers.main import GroupsTreeNode
 import json
-from odoo.tools import DEFAULT_SERVER_DATETIME_FORMAT
+from odoo.tools import DEFAULT_SERVER_DATETIME_FORMAT, split_every
+from odoo.tools.pdf import merge_pdf
 _logger = logging.getLogger(__name__)
 
+READ_CHUNK_SIZE = 1000
+# Number of records rendered in one part of a grouped PDF, the parts are merged afterwards
+PDF_PART_RECORDS = 2000
+
 class PHDExport(ReportController):
-    def _infinity_loop(self,data, model_name, domain, fields, grouped_by, level, export_fields,orderbyLine, orderbyGroup, expand=True):
-        if len(grouped_by) > 0:
-            groups = request.env[model_name].web_read_group(domain=domain, fields=fields,orderby=orderbyGroup, groupby=grouped_by, expand=expand)['groups']
-            if groups:
-                for x in range(0, len(groups)):
-                    group_for_query = []
-                    group_for_query.extend(grouped_by)
-                    group_for_query.pop(0)
-
-                    data.append(
-                        {'group_name': 'Undefined' if not groups[x][grouped_by[0]] else groups[x][
-                            grouped_by[0]] if isinstance(groups[x][grouped_by[0]], str)
-                        else groups[x][grouped_by[0]][1]._value, 'level': level, 'group_data': groups[x]})
-                    if groups[x].get('__data', False):
-                        records = DataSet.do_search_read(self=self,model=model_name, fields=fields, offset=0, limit=9999999999999, domain=groups[x].get('__domain', None), sort=orderbyLine)
-                        data.append({'records': records.get('records', False), 'belong_level': level})
-                    # for y in range(1, len(grouped_by)):
-                    if len(grouped_by) >= 2:
-                        self._infinity_loop(level=level + 1, data=data, model_name=model_name, domain=groups[x]['__domain'],
-                                            fields=fields,
-                                            grouped_by=group_for_query, export_fields=export_fields, orderbyLine=orderbyLine, orderbyGroup=orderbyGroup)
-
-                    if level == 1:
-                        has_sum = False
-                        has_avg = False
-                        # Total Line
-                        total_line = {
-                            'total_title': 'Total %s' % (
-                                'Undefined' if not groups[x][grouped_by[0]] else groups[x][grouped_by[0]] if isinstance(
-                                    groups[x][grouped_by[0]], str)
-                                else groups[x][grouped_by[0]][1]._value),
-                        }
-                        avg_line = {
-                            'avg_title': 'Avg %s' % (
-                                'Undefined' if not groups[x][grouped_by[0]] else groups[x][grouped_by[0]] if isinstance(
-                                    groups[x][grouped_by[0]], str)
-                                else groups[x][grouped_by[0]][1]._value),
-                        }
-                        for field in export_fields:
-                            records = False
-                            total = 0
-                            if field.get('sum', False) or field.get('avg', False):
-                                records = data[-1].get('records', False)
-                                if records:
-                                    total = sum(record[field['name']] for record in records)
-                            if field.get('sum', False):
-                                has_sum = True
-                                widget = field.get('widget', False)
-                                is_createtine = False
-                                if not widget:
-                                    try:
-                                        attr_sum = json.loads(field.get('sum'))
-                                        widget = attr_sum.get('widget', False)
-                                        is_createtine = attr_sum.get('is_createtine_in_dollar', False)
-                                    except ValueError:
-                                        widget = False
-                                if is_createtine:
-                                    createtine = request.env['product.product'].search([('is_creatine','=', True)], limit=1)
-                                    if createtine:
-                                        total_createtine_in_dollar = total * createtine.standard_price
-                                        is_createtine.update({'total_createtine_in_dollar': total_createtine_in_dollar})
-                                        total_line.update({field['name']: {'total': total,
-                                                                           'widget': widget,
-                                                                           'is_createtine': is_createtine}})
-                                else:
-                                    total_line.update({field['name']: {'total': total,
-                                                                   'widget': widget}})
-                            if field.get('avg',False):
-                                has_avg = True
-                                avg = 0
-                                if records and len(records) > 0:
-                                    avg = total / len(records)
-                                widget = field.get('widget', False)
-                                if not widget:
-                                    try:
-                                        attr_avg = json.loads(field.get('avg'))
-                                        widget = attr_avg.get('widget', False)
-                                    except ValueError:
-                                        widget = False
-                                avg_line.update({field['name']: {'total': round(avg,2),
-                                                                   'widget': widget}})
-                        if has_sum:
-                            data.append(total_line)
-                        if has_avg:
-                            data.append(avg_line)
+    def _get_group_name(self, group, groupby):
+        value = group[groupby]
+        if not value:
+            return 'Undefined'
+        return value if isinstance(value, str) else value[1]._value
+
+    def _iter_group_records(self, env, model_name, domain, fields, orderbyLine, totals):
+        """
+        Read the records of a leaf group by chunks of READ_CHUNK_SIZE, the cache is cleared after every chunk
+        so that the memory does not grow with the number of records
+        :param totals: running sums of the fields which are not aggregated by read_group, updated in place
+        """
+        Model = env[model_name]
+        record_ids = Model.search(domain, order=orderbyLine).ids
+        for ids in split_every(READ_CHUNK_SIZE, record_ids, list):
+            records = Model.browse(ids).read(fields)
+            Model.invalidate_cache(ids=ids)
+            for field_name in totals:
+                totals[field_name] += sum(record[field_name] or 0 for record in records)
+            yield records
+
+    def _iter_group_lines(self, env, model_name, domain, fields, grouped_by, level, export_fields, orderbyLine,
+                          orderbyGroup, totals=None):
+        """
+        Generate the lines of the grouped report: group headers, chunks of records of the leaf groups and the
+        total/average lines of the first level groups
+        """
+        Model = env[model_name]
+        groupby = grouped_by[0]
+        groups = Model.read_group(domain, fields, [groupby], orderby=orderbyGroup, lazy=False)
+        for group in groups:
+            group_name = self._get_group_name(group, groupby)
+            yield {'group_name': group_name, 'level': level, 'group_data': group}
+            if level == 1:
+                # read_group only sums the stored fields, the other ones are summed while reading the records
+                totals = {field['name']: 0 for field in export_fields
+                          if (field.get('sum', False) or field.get('avg', False))
+                          and not (field['name'] in group and Model._fields[field['name']].group_operator == 'sum')}
+            if len(grouped_by) == 1:
+                for records in self._iter_group_records(env, model_name, group['__domain'], fields, orderbyLine, totals):
+                    yield {'records': records, 'belong_level': level}
+            else:
+                yield from self._iter_group_lines(env, model_name, group['__domain'], fields, grouped_by[1:],
+                                                  level + 1, export_fields, orderbyLine, orderbyGroup, totals)
+            if level == 1:
+                yield from self._get_group_total_lines(env, group, group_name, export_fields, totals)
+
+    def _get_group_total_lines(self, env, group, group_name, export_fields, totals):
+        has_sum = False
+        has_avg = False
+        total_line = {'total_title': 'Total %s' % group_name}
+        avg_line = {'avg_title': 'Avg %s' % group_name}
+        for field in export_fields:
+            if not field.get('sum', False) and not field.get('avg', False):
+                continue
+            total = totals[field['name']] if field['name'] in totals else group.get(field['name']) or 0
+            if field.get('sum', False):
+                has_sum = True
+                widget = field.get('widget', False)
+                is_createtine = False
+                if not widget:
+                    try:
+                        attr_sum = json.loads(field.get('sum'))
+                        widget = attr_sum.get('widget', False)
+                        is_createtine = attr_sum.get('is_createtine_in_dollar', False)
+                    except ValueError:
+                        widget = False
+                if is_createtine:
+                    createtine = env['product.product'].search([('is_creatine', '=', True)], limit=1)
+                    if createtine:
+                        total_createtine_in_dollar = total * createtine.standard_price
+                        is_createtine.update({'total_createtine_in_dollar': total_createtine_in_dollar})
+                        total_line.update({field['name']: {'total': total,
+                                                           'widget': widget,
+                                                           'is_createtine': is_createtine}})
+                else:
+                    total_line.update({field['name']: {'total': total,
+                                                       'widget': widget}})
+            if field.get('avg', False):
+                has_avg = True
+                avg = total / group['__count'] if group['__count'] else 0
+                widget = field.get('widget', False)
+                if not widget:
+                    try:
+                        attr_avg = json.loads(field.get('avg'))
+                        widget = attr_avg.get('widget', False)
+                    except ValueError:
+                        widget = False
+                avg_line.update({field['name']: {'total': round(avg, 2),
+                                                 'widget': widget}})
+        if has_sum:
+            yield total_line
+        if has_avg:
+            yield avg_line
+
+    def _render_grouped_pdf(self, report, docids, lines):
+        """
+        Render the grouped lines by parts of PDF_PART_RECORDS records and merge the parts, the next lines are
+        only read once the previous part is rendered
+        :return: content of the PDF
+        """
+        pdfs = []
+        part_lines = []
+        part_records = 0
+        for line in lines:
+            part_lines.append(line)
+            part_records += len(line.get('records') or [])
+            if part_records >= PDF_PART_RECORDS:
+                pdfs.append(self._render_pdf_part(report, docids, part_lines))
+                part_lines = []
+                part_records = 0
+        if part_lines or not pdfs:
+            pdfs.append(self._render_pdf_part(report, docids, part_lines))
+        return pdfs[0] if len(pdfs) == 1 else merge_pdf(pdfs)
+
+    def _render_pdf_part(self, report, docids, lines):
+        return report.with_context(data_after_grouping=lines).render_qweb_pdf(docids)[0]
 
     def _get_date_ranges(self,field, domain):
         list_date = []
@@ -115,87 +157,100 @@ class PHDExport(ReportController):
                 return date_ranges
         return False
 
-    @http.route(['/report/download/pdf'], type='http', auth="user")
-    def report_download_pdf(self, data, token, context=None):
-        requestcontent = json.loads(data)
+    def phd_render_pdf(self, env, requestcontent, context=None):
+        """
+        Render the PDF export of a list view
+        :param env: environment of the user exporting the list
+        :param requestcontent: list sent by the export button (type, domain, model, report, fields, groupby,
+            date range field, line order, location, group order)
+        :param context: JSON user context of the web client
+        :return: content and filename of the PDF, None when there is nothing to print
+        :rtype: tuple
+        """
         type, domain, model_name, report_id, defaultExportFields, grouped_by, orderbyLine, orderbyGroup = requestcontent[0], requestcontent[1] , requestcontent[2], requestcontent[3], requestcontent[4], requestcontent[5], requestcontent[7], requestcontent[9]
-        try:
-            report = request.env['ir.actions.report']._get_report_from_name(report_id)
-            Context = dict(request.context)
-            Context.update({
-                'domain': domain,
-                # 'default_export_fields': defaultExportFields,
-                'currency': request.env['res.users'].browse(request._uid).company_id.currency_id,
-                'grouped_by': grouped_by,
-                'default_location_id': requestcontent[8],
-                'hasattr':hasattr,
-            })
-            request.context = Context
-            if len(requestcontent) > 7 and requestcontent[6]:
-                date_ranges = self._get_date_ranges(requestcontent[6],domain)
-                if date_ranges:
-                    Context.update({
-                        'date_ranges': date_ranges
-                    })
-            if report:
-                Context.update({
-                    'report_title': report.name,
-                })
-            if len(grouped_by) > 0:
-                data_after_grouping = []
-                level = 1
-                fields = [field['name'] for field in defaultExportFields]
-                self._infinity_loop(level=level,
-                                    data=data_after_grouping,
-                                    model_name=model_name,
-                                    domain=domain,
-                                    fields=fields,
-                                    grouped_by=grouped_by, export_fields=defaultExportFields, orderbyLine=orderbyLine, orderbyGroup=orderbyGroup)
-                if len(data_after_grouping) > 0:
-                    Context.update({
-                        'default_export_fields': defaultExportFields,
-                        'data_after_grouping': data_after_grouping,
-                    })
-            else:
-                for i in range(0, len(defaultExportFields)):
-                    if defaultExportFields[i].get('sum', False) and defaultExportFields[i].get('avg', False):
-                        try:
-                            attr_sum = json.loads(defaultExportFields[i].get('sum', False))
-                            attr_avg = json.loads(defaultExportFields[i].get('avg', False))
-                            if attr_sum.get('is_createtine_in_dollar', False):
-                                createtine = request.env['product.product'].search([('is_creatine','=', True)], limit=1)
-                                if createtine:
-                                    defaultExportFields[i].update({
-                                        'is_createtine': {
-                                            'standard_price': createtine.standard_price,
-                                            'widget': attr_sum.get('is_createtine_in_dollar').get('widget', False),
-                                            'help': attr_sum.get('is_createtine_in_dollar').get('help', False),
-                                        }
-                                    })
-                            defaultExportFields[i].update({'sum': attr_sum.get('help',''),
-                                                           'avg': attr_avg.get('help',''),
-                                                           'sum_widget': attr_sum.get('widget', False),
-                                                           'avg_widget': attr_avg.get('widget', False),
-                                                        })
-                        except ValueError:
-                            defaultExportFields[i].update(
-                                {'sum': '', 'avg': ''})
+        report = env['ir.actions.report']._get_report_from_name(report_id)
+        Context = dict(env.context)
+        if context:
+            Context.update(json.loads(context))
+        Context.update({
+            'domain': domain,
+            # 'default_export_fields': defaultExportFields,
+            'currency': env.user.company_id.currency_id,
+            'grouped_by': grouped_by,
+            'default_location_id': requestcontent[8],
+            'hasattr':hasattr,
+        })
+        if len(requestcontent) > 7 and requestcontent[6]:
+            date_ranges = self._get_date_ranges(requestcontent[6],domain)
+            if date_ranges:
                 Context.update({
-                    'default_export_fields': defaultExportFields,
+                    'date_ranges': date_ranges
                 })
-            request.context = Context
-            if type in ['qweb-pdf', 'qweb-text']:
-                converter = 'pdf'
-                extension = 'pdf'
-                docids = str(request.env[model_name].search(domain, order=orderbyLine).ids)[1:-1]
-                if docids:
-                    response = self.report_routes(report_id, docids=docids, converter=converter, context=context)
-                    filename = "%s.%s" % (report.name, extension)
-                    response.headers.add('Content-Disposition', content_disposition(filename))
-                    response.set_cookie('fileToken', token)
-                    return response
-            else:
+        if report:
+            Context.update({
+                'report_title': report.name,
+            })
+        if len(grouped_by) > 0:
+            Context.update({
+                'default_export_fields': defaultExportFields,
+            })
+        else:
+            for i in range(0, len(defaultExportFields)):
+                if defaultExportFields[i].get('sum', False) and defaultExportFields[i].get('avg', False):
+                    try:
+                        attr_sum = json.loads(defaultExportFields[i].get('sum', False))
+                        attr_avg = json.loads(defaultExportFields[i].get('avg', False))
+                        if attr_sum.get('is_createtine_in_dollar', False):
+                            createtine = env['product.product'].search([('is_creatine','=', True)], limit=1)
+                            if createtine:
+                                defaultExportFields[i].update({
+                                    'is_createtine': {
+                                        'standard_price': createtine.standard_price,
+                                        'widget': attr_sum.get('is_createtine_in_dollar').get('widget', False),
+                                        'help': attr_sum.get('is_createtine_in_dollar').get('help', False),
+                                    }
+                                })
+                        defaultExportFields[i].update({'sum': attr_sum.get('help',''),
+                                                       'avg': attr_avg.get('help',''),
+                                                       'sum_widget': attr_sum.get('widget', False),
+                                                       'avg_widget': attr_avg.get('widget', False),
+                                                    })
+                    except ValueError:
+                        defaultExportFields[i].update(
+                            {'sum': '', 'avg': ''})
+            Context.update({
+                'default_export_fields': defaultExportFields,
+            })
+        env = env(context=Context)
+        report = report.with_env(env)
+        if type not in ['qweb-pdf', 'qweb-text']:
+            return None
+        filename = "%s.pdf" % report.name
+        if len(grouped_by) > 0:
+            # The grouped template reads its lines from the context, any record of the domain is enough
+            docids = env[model_name].search(domain, limit=1).ids
+            if not docids:
+                return None
+            fields = [field['name'] for field in defaultExportFields]
+            lines = self._iter_group_lines(env, model_name=model_name, domain=domain, fields=fields,
+                                           grouped_by=grouped_by, level=1, export_fields=defaultExportFields,
+                                           orderbyLine=orderbyLine, orderbyGroup=orderbyGroup)
+            return self._render_grouped_pdf(report, docids, lines), filename
+        docids = env[model_name].search(domain, order=orderbyLine).ids
+        if not docids:
+            return None
+        return report.render_qweb_pdf(docids)[0], filename
+
+    @http.route(['/report/download/pdf'], type='http', auth="user")
+    def report_download_pdf(self, data, token, context=None):
+        try:
+            result = self.phd_render_pdf(request.env, json.loads(data), context)
+            if not result:
                 return
+            pdf, filename = result
+            pdfhttpheaders = [('Content-Type', 'application/pdf'), ('Content-Length', len(pdf)),
+                              ('Content-Disposition', content_disposition(filename))]
+            return request.make_response(pdf, headers=pdfhttpheaders, cookies={'fileToken': token})
         except Exception as e:
             se = _serialize_exception(e)
             error = {
@@ -205,6 +260,14 @@ class PHDExport(ReportController):
             }
             return request.make_response(html_escape(json.dumps(error)))
 
+    @http.route(['/report/download/pdf/async'], type='json', auth="user")
+    def report_download_pdf_async(self, data, context=None):
+        """
+        Queue the PDF export, the file is rendered by the report job cron and the user is notified when it is ready
+        :return: id of the report job
+        """
+        return request.env['phd.report.job'].enqueue('pdf', data, context)
+
 class PHDGroupsTreeNode(GroupsTreeNode):
     def phd_insert_leaf(self, group):
         """
@@ -232,8 +295,21 @@ class PHDGroupsTreeNode(GroupsTreeNode):
 class PHDExportFormat(ExportFormat):
 
     def PHDbase(self, data, token):
+        response_data, filename = PHDExportFormat.phd_export_content(self, request.env, json.loads(data))
+        return request.make_response(response_data,
+            headers=[('Content-Disposition',
+                            content_disposition(filename)),
+                     ('Content-Type', self.content_type)],
+            cookies={'fileToken': token})
 
-        params = json.loads(data)
+    def phd_export_content(self, env, params):
+        """
+        Build the export file of a list view
+        :param env: environment of the user exporting the list
+        :param params: export parameters sent by the export dialog
+        :return: content and filename of the file
+        :rtype: tuple
+        """
         model, fields, ids, domain, import_compat = \
             operator.itemgetter('model', 'fields', 'ids', 'domain', 'import_compat')(params)
 
@@ -261,7 +337,7 @@ class PHDExportFormat(ExportFormat):
                 else:
                     columns_headers.append(val['label'].strip())
 
-        Model = request.env[model].with_context(**params.get('context', {}))
+        Model = env[model].with_context(**params.get('context', {}))
         groupby = params.get('groupby')
         if not import_compat and groupby:
             groupby_type = [Model._fields[x.split(':')[0]].type for x in groupby]
@@ -282,16 +358,62 @@ class PHDExportFormat(ExportFormat):
             if not Model._is_an_ordinary_table():
                 fields = [field for field in fields if field['name'] != 'id']
 
-            export_data = records.phd_export_data(field_names).get('datas',[])
-            response_data = self.from_data(columns_headers, export_data)
-        return request.make_response(response_data,
-            headers=[('Content-Disposition',
-                            content_disposition(self.filename(model))),
-                     ('Content-Type', self.content_type)],
-            cookies={'fileToken': token})
+            export_batches = records.phd_iter_export_data(field_names)
+            response_data = self.phd_from_data(columns_headers, export_batches, len(records))
+        return response_data, self.filename(model)
+
+class PHDExportXlsxWriter(ExportXlsxWriter):
+    """
+    Write the sheet in constant memory mode: every row is flushed to a temporary file when the next one is
+    written, so the rows must be written in order
+    """
+    def __init__(self, field_names, row_count=0):
+        self.field_names = field_names
+        self.output = io.BytesIO()
+        self.workbook = xlsxwriter.Workbook(self.output, {'constant_memory': True})
+        self.base_style = self.workbook.add_format({'text_wrap': True})
+        self.header_style = self.workbook.add_format({'bold': True})
+        self.header_bold_style = self.workbook.add_format({'text_wrap': True, 'bold': True, 'bg_color': '#e9ecef'})
+        self.date_style = self.workbook.add_format({'text_wrap': True, 'num_format': 'yyyy-mm-dd'})
+        self.datetime_style = self.workbook.add_format({'text_wrap': True, 'num_format': 'yyyy-mm-dd hh:mm:ss'})
+        self.worksheet = self.workbook.add_worksheet()
+        self.value = False
+
+        if row_count > self.worksheet.xls_rowmax:
+            raise UserError(_('There are too many rows (%s rows, limit: %s) to export as Excel 2007-2013 (.xlsx) '
+                              'format. Consider splitting the export.') % (row_count, self.worksheet.xls_rowmax))
+
 
 class PHDExcelExport(ExcelExport):
+
+    def phd_from_data(self, fields, batches, row_count):
+        """
+        Write the batches of rows to the sheet as they are generated
+        :param fields: column headers
+        :param batches: iterable of lists of rows
+        :param row_count: number of exported records, to check the sheet limit before exporting
+        :return: content of the XLSX file
+        """
+        with PHDExportXlsxWriter(fields, row_count) as xlsx_writer:
+            row_index = 0
+            for rows in batches:
+                for row in rows:
+                    row_index += 1
+                    for cell_index, cell_value in enumerate(row):
+                        if isinstance(cell_value, (list, tuple)):
+                            cell_value = pycompat.to_text(cell_value)
+                        xlsx_writer.write_cell(row_index, cell_index, cell_value)
+        return xlsx_writer.value
+
     @http.route('/phd/web/export/xlsx', type='http', auth="user")
     @serialize_exception
     def phd_index(self, data, token):
-        return PHDExportFormat.PHDbase(self, data, token)
\ No newline at end of file
+        return PHDExportFormat.PHDbase(self, data, token)
+
+    @http.route('/phd/web/export/xlsx/async', type='json', auth="user")
+    def phd_index_async(self, data):
+        """
+        Queue the export, the file is built by the report job cron and the user is notified when it is ready
+        :return: id of the report job
+        """
+        return request.env['phd.report.job'].enqueue('xlsx', data)
\ No newline at end of file
@@ -4,8 +4,11 @@ from odoo.models import fix_import_export_id_paths
 import datetime
 from odoo import fields as fl
 import re
+from odoo.tools import split_every
 from odoo.tools.misc import formatLang
 
+EXPORT_BATCH_SIZE = 1000
+
 def format_value(self, amount, currency=False, blank_if_zero=False):
     currency_id = currency or self.env.company.currency_id
     if currency_id.is_zero(amount):
@@ -29,6 +32,9 @@ class BaseModel(models.AbstractModel):
                 used when recursing, avoid using when calling from outside
             :return: list of lists of corresponding values
         """
+        if _is_toplevel_call and self._phd_is_columnar_export(fields):
+            return [line for lines in self._phd_iter_export_rows(fields) for line in lines]
+
         import_compatible = self.env.context.get('import_compat', True)
         lines = []
 
@@ -105,7 +111,14 @@ class BaseModel(models.AbstractModel):
                             current[i] = False
 
         # if any xid should be exported, only do so at toplevel
-        if _is_toplevel_call and any(f[-1] == 'id' for f in fields):
+        if _is_toplevel_call:
+            self._phd_export_xids(fields, lines)
+
+        return lines
+
+    def _phd_export_xids(self, fields, lines):
+        """ Replace the (model, id) cells of ``lines`` by the xids of the records, in place """
+        if any(f[-1] == 'id' for f in fields):
             bymodels = collections.defaultdict(set)
             xidmap = collections.defaultdict(list)
             # collect all the tuples in "lines" (along with their coordinates)
@@ -121,7 +134,95 @@ class BaseModel(models.AbstractModel):
                         lines[i][j] = xid
             assert not xidmap, "failed to export xids for %s" % ', '.join('{}:{}' % it for it in xidmap.items())
 
-        return lines
+    def _phd_is_columnar_export(self, fields):
+        """ The columnar export follows many2one fields only, x2many fields add lines to the export and
+            reference fields point to several models, they go through the record by record export
+        """
+        for path in fields:
+            model = self
+            for name in path:
+                if name in ('id', '.id'):
+                    break
+                field = model._fields.get(name)
+                if not field or field.type in ('one2many', 'many2many', 'reference'):
+                    return False
+                if field.type != 'many2one':
+                    break
+                model = self.env[field.comodel_name]
+        return True
+
+    def _phd_export_columns(self, fields, _is_toplevel_call=True):
+        """ Export fields of the records in ``self`` column by column: the fields of the records are read
+            at once and the many2one paths are exported on the related records of all the records
+
+            :param fields: list of lists of fields to traverse, without x2many fields
+            :param _is_toplevel_call: datetime fields are exported as dates at toplevel only, the related
+                ones keep their type like in the record by record export
+            :return: list of columns, each one a list of values in the order of ``self``
+        """
+        columns = [[''] * len(self) for path in fields]
+        names = []
+        subpaths = collections.defaultdict(list)
+        for i, path in enumerate(fields):
+            if not path:
+                continue
+            name = path[0]
+            if name == '.id':
+                columns[i] = [str(record_id) for record_id in self.ids]
+                continue
+            if name == 'id':
+                columns[i] = [(self._name, record_id) for record_id in self.ids]
+                continue
+            if name not in names:
+                names.append(name)
+            if self._fields[name].type == 'many2one':
+                # use 'display_name' where no subfield is exported
+                subpaths[name].append((i, path[1:] or ['display_name']))
+        if not names:
+            return columns
+
+        # read skips the records that no longer exist, key the rows by id to keep the columns aligned
+        rows = {row['id']: row for row in self.read(names, load='_classic_write')}
+        for name in names:
+            field = self._fields[name]
+            values = [rows[record_id][name] if record_id in rows else False for record_id in self.ids]
+            if field.type == 'many2one':
+                related = self.env[field.comodel_name].browse(list(set(filter(None, values))))
+                positions = {record_id: position for position, record_id in enumerate(related.ids)}
+                related_columns = related._phd_export_columns([subpath for i, subpath in subpaths[name]],
+                                                              _is_toplevel_call=False)
+                for (i, subpath), related_column in zip(subpaths[name], related_columns):
+                    column = [related_column[positions[value]] if value else '' for value in values]
+                    columns[i] = [cell if cell or isinstance(cell, bool) else '' for cell in column]
+                primary_index = subpaths[name][0][0]
+                columns[primary_index] = [cell if value else False
+                                          for cell, value in zip(columns[primary_index], values)]
+                continue
+            if field.type == 'datetime' and _is_toplevel_call:
+                column = [fl.Date.convert_to_export(fl.Date, value.date() if isinstance(value, datetime.datetime)
+                                                    else value, record) for value, record in zip(values, self)]
+            else:
+                column = [field.convert_to_export(value, record) for value, record in zip(values, self)]
+            for i, path in enumerate(fields):
+                if path and path[0] == name:
+                    columns[i] = column
+        return columns
+
+    def _phd_iter_export_rows(self, fields):
+        """ Export the records by batches of EXPORT_BATCH_SIZE, every field path being resolved for the
+            whole batch at once, the cache is cleared after every batch
+
+            :return: generator of lists of lines, one list per batch
+        """
+        for ids in split_every(EXPORT_BATCH_SIZE, self.ids, list):
+            # records deleted since the ids were fetched are left out of the export
+            batch = self.browse(ids).exists()
+            if not batch:
+                continue
+            lines = [list(line) for line in zip(*batch._phd_export_columns(fields))]
+            self._phd_export_xids(fields, lines)
+            self.invalidate_cache()
+            yield lines
 
     def phd_export_data(self, fields_to_export):
         """ Export fields for selected objects
@@ -135,3 +236,16 @@ class BaseModel(models.AbstractModel):
 
         fields_to_export = [fix_import_export_id_paths(f) for f in fields_to_export]
         return {'datas': self._phd_export_rows(fields_to_export)}
+
+    def phd_iter_export_data(self, fields_to_export):
+        """ Same as phd_export_data, but the lines are generated by batches of records so that they can be
+            written as they come
+
+            :param fields_to_export: list of fields
+            :return: generator of lists of lines
+        """
+        fields_to_export = [fix_import_export_id_paths(f) for f in fields_to_export]
+        if self._phd_is_columnar_export(fields_to_export):
+            yield from self._phd_iter_export_rows(fields_to_export)
+        else:
+            yield self._phd_export_rows(fields_to_export)
@@ -0,0 +1,146 @@
+import base64
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from odoo import api, fields, models, _
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_WORKERS = 2
+# A job still running after this delay is considered lost (e.g. killed worker) and queued again
+RUNNING_TIMEOUT = 3600
+
+
+class PHDReportJob(models.Model):
+    _name = 'phd.report.job'
+    _description = 'Report Job'
+    _order = 'create_date desc'
+
+    name = fields.Char(string='Name', readonly=True)
+    user_id = fields.Many2one('res.users', string='User', required=True, readonly=True, index=True,
+                              default=lambda self: self.env.user)
+    job_type = fields.Selection([
+        ('pdf', 'PDF'),
+        ('xlsx', 'Excel')
+    ], string='Type', required=True, readonly=True)
+    data = fields.Text(string='Export Parameters', readonly=True)
+    context = fields.Text(string='Context', readonly=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed')
+    ], string='Status', default='pending', required=True, readonly=True, index=True)
+    attachment_id = fields.Many2one('ir.attachment', string='File', readonly=True, ondelete='set null')
+    date_done = fields.Datetime(string='Done On', readonly=True)
+    message = fields.Text(string='Message', readonly=True)
+
+    @api.model
+    def enqueue(self, job_type, data, context=None):
+        """
+        Queue an export of a list view
+        :param job_type: 'pdf' or 'xlsx'
+        :param data: JSON parameters of the export, as sent to the synchronous route
+        :param context: JSON user context of the web client, for the PDF export
+        :return: id of the job
+        """
+        if job_type == 'pdf':
+            name = self.env['ir.actions.report']._get_report_from_name(json.loads(data)[3]).name
+        else:
+            name = self.env['ir.model']._get(json.loads(data)['model']).name
+        job = self.create({
+            'name': name,
+            'job_type': job_type,
+            'data': data,
+            'context': context,
+        })
+        return job.id
+
+    def _build_file(self):
+        """
+        Build the export file with the access rights of the user who queued it
+        :return: content and filename of the file, None when there is nothing to export
+        """
+        from odoo.addons.phd_tools.controller.main import PHDExport, PHDExportFormat, PHDExcelExport
+
+        self.ensure_one()
+        env = self.env(user=self.user_id.id)
+        if self.job_type == 'pdf':
+            return PHDExport().phd_render_pdf(env, json.loads(self.data), self.context)
+        return PHDExportFormat.phd_export_content(PHDExcelExport(), env, json.loads(self.data))
+
+    def _notify_user(self):
+        self.ensure_one()
+        self.env['bus.bus'].sendone((self._cr.dbname, 'res.partner', self.user_id.partner_id.id), {
+            'type': 'phd_report_job',
+            'job_id': self.id,
+            'name': self.name,
+            'state': self.state,
+            'attachment_id': self.attachment_id.id,
+            'message': self.message or '',
+        })
+
+    @api.model
+    def _run_job(self, job_id):
+        """
+        Build the file of a job in its own cursor, so that jobs run in parallel threads
+        """
+        with api.Environment.manage(), self.pool.cursor() as cr:
+            job = self.with_env(self.env(cr=cr)).browse(job_id)
+            try:
+                result = job._build_file()
+                vals = {'state': 'done', 'date_done': fields.Datetime.now(), 'message': False}
+                if result:
+                    content, filename = result
+                    vals['attachment_id'] = job.env['ir.attachment'].create({
+                        'name': filename,
+                        'datas': base64.b64encode(content),
+                        'res_model': job._name,
+                        'res_id': job.id,
+                    }).id
+                else:
+                    vals['message'] = _('There is nothing to export.')
+                job.write(vals)
+            except Exception as e:
+                cr.rollback()
+                job.invalidate_cache()
+                _logger.exception('Report job %s failed: %s' % (job_id, e))
+                job.write({'state': 'failed', 'date_done': fields.Datetime.now(), 'message': str(e)})
+            job._notify_user()
+
+    @api.model
+    def _claim_pending_jobs(self, max_workers):
+        """
+        Lock the oldest pending jobs, without going over the maximum number of jobs running at the same time
+        """
+        self.flush()
+        self.env.cr.execute("""
+            UPDATE phd_report_job SET state = 'pending'
+            WHERE state = 'running' AND write_date < (now() at time zone 'UTC') - %s * interval '1 second'
+        """, (RUNNING_TIMEOUT,))
+        self.env.cr.execute("SELECT count(*) FROM phd_report_job WHERE state = 'running'")
+        limit = max_workers - self.env.cr.fetchone()[0]
+        if limit <= 0:
+            return self.browse()
+        self.env.cr.execute("""
+            SELECT id FROM phd_report_job
+            WHERE state = 'pending'
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (limit,))
+        jobs = self.browse([job_id for job_id, in self.env.cr.fetchall()])
+        jobs.write({'state': 'running'})
+        self.env.cr.commit()
+        return jobs
+
+    @api.model
+    def _cron_process_jobs(self):
+        max_workers = max(int(self.env['ir.config_parameter'].sudo().get_param(
+            'phd_tools.report_job_workers', DEFAULT_JOB_WORKERS)), 1)
+        jobs = self._claim_pending_jobs(max_workers)
+        if not jobs:
+            return
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(self._run_job, jobs.ids))
@@ -23,9 +23,10 @@ odoo.define('phd_tools.web.DataExport', function (require) {
                 }
 
                 framework.blockUI();
-                this.getSession().get_file({
-                    url: '/phd/web/export/' + exportFormat,
-                    data: {
+                // The file is built by a background job, the user is notified when it is ready
+                this._rpc({
+                    route: '/phd/web/export/' + exportFormat + '/async',
+                    params: {
                         data: JSON.stringify({
                             model: this.record.model,
                             fields: exportedFields,
@@ -36,9 +37,9 @@ odoo.define('phd_tools.web.DataExport', function (require) {
                             import_compat: this.isCompatibleMode,
                         })
                     },
-                    complete: framework.unblockUI,
-                    error: (error) => this.call('crash_manager', 'rpc_error', error),
-                });
+                }).then(() => {
+                    this.do_notify(_t('Export'), _t('The export is being generated, you will be notified when it is ready.'));
+                }).finally(framework.unblockUI);
             },
         });
 
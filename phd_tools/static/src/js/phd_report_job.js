@@ -0,0 +1,43 @@
+odoo.define('phd_tools.ReportJob', function (require) {
+"use strict";
+
+    var core = require('web.core');
+    var WebClient = require('web.WebClient');
+
+    var _t = core._t;
+
+    WebClient.include({
+        start: function () {
+            this.call('bus_service', 'onNotification', this, this._onReportJobNotification);
+            return this._super.apply(this, arguments);
+        },
+
+        _onReportJobNotification: function (notifications) {
+            var self = this;
+            _.each(notifications, function (notification) {
+                var message = notification[1];
+                if (!message || message.type !== 'phd_report_job') {
+                    return;
+                }
+                if (message.state === 'done' && message.attachment_id) {
+                    self.call('notification', 'notify', {
+                        title: _t('Report Ready'),
+                        message: _.str.sprintf(_t('%s is ready to download.'), message.name),
+                        sticky: true,
+                        buttons: [{
+                            text: _t('Download'),
+                            primary: true,
+                            click: function () {
+                                window.location = '/web/content/' + message.attachment_id + '?download=true';
+                            },
+                        }],
+                    });
+                } else if (message.state === 'done') {
+                    self.do_notify(message.name, message.message);
+                } else {
+                    self.do_warn(_.str.sprintf(_t('%s failed'), message.name), message.message, true);
+                }
+            });
+        },
+    });
+});